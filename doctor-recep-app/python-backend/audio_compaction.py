@@ -0,0 +1,148 @@
+"""
+Doctor Reception System - Audio Compaction
+Energy-based voice activity detection on decoded 16-bit mono PCM: removes long
+silent stretches before upload and picks quiet cut points for splitting long
+recordings into chunks.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+def frame_levels_db(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """RMS level of each full frame in dBFS"""
+    frames = samples[: len(samples) // frame_size * frame_size].reshape(-1, frame_size).astype(np.float64)
+    rms = np.sqrt(np.mean(frames * frames, axis=1)) / 32768.0
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _run_lengths(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Start index, length and value of each run of equal values"""
+    boundaries = np.flatnonzero(np.diff(mask.astype(np.int8))) + 1
+    starts = np.concatenate(([0], boundaries))
+    lengths = np.diff(np.concatenate((starts, [len(mask)])))
+    return starts, lengths, mask[starts]
+
+
+def compact_pcm(
+    pcm: bytes,
+    sample_rate: int,
+    threshold_db: float = -45.0,
+    noise_margin_db: float = 8.0,
+    min_silence_ms: int = 700,
+    padding_ms: int = 200,
+    frame_ms: int = 30,
+    min_speech_ms: int = 300,
+    min_keep_ratio: float = 0.1,
+) -> tuple[bytes, dict]:
+    """Remove silences longer than ``min_silence_ms`` from s16le mono PCM.
+
+    A frame counts as speech when its level is above both ``threshold_db`` and the
+    estimated noise floor (10th percentile of frame levels) plus ``noise_margin_db``,
+    so steady background hum in a clinic is treated as silence. ``padding_ms`` of
+    audio is kept on each side of speech so word onsets and tails survive, and
+    shorter pauses are left untouched.
+
+    Audio without one speech run of ``min_speech_ms``, or that would keep less than
+    ``min_keep_ratio`` of its duration, is returned unchanged: a uniform level (a
+    steady tone, or a recording that is quiet throughout) looks like silence to
+    this detector, and sending a near-empty clip would lose the consultation.
+
+    Returns (compacted_pcm, stats) where stats has original/compacted seconds and
+    the compression ratio (original / compacted duration), plus ``skipped`` with
+    the reason when the audio was left unchanged.
+    """
+    samples = np.frombuffer(pcm[: len(pcm) // 2 * 2], dtype="<i2")
+    frame_size = max(sample_rate * frame_ms // 1000, 1)
+    levels = frame_levels_db(samples, frame_size)
+    original_seconds = len(samples) / sample_rate
+
+    if len(levels) == 0:
+        return pcm, _stats(original_seconds, original_seconds)
+
+    noise_floor = float(np.percentile(levels, 10))
+    speech = levels > max(threshold_db, noise_floor + noise_margin_db)
+    starts, lengths, values = _run_lengths(speech)
+    if not np.any(lengths[values] >= max(min_speech_ms // frame_ms, 1)):
+        return pcm, _stats(original_seconds, original_seconds, skipped="no speech detected")
+
+    # Widen speech by the padding so the kept audio does not clip words.
+    padding_frames = padding_ms // frame_ms
+    if padding_frames:
+        kernel = np.ones(2 * padding_frames + 1, dtype=np.int32)
+        speech = np.convolve(speech.astype(np.int32), kernel, mode="same") > 0
+
+    # Only silent runs long enough to matter are removed.
+    keep = np.ones(len(levels), dtype=bool)
+    starts, lengths, values = _run_lengths(speech)
+    min_silence_frames = max(min_silence_ms // frame_ms, 1)
+    for start, length, is_speech in zip(starts, lengths, values):
+        if not is_speech and length >= min_silence_frames:
+            keep[start:start + length] = False
+
+    if keep.all():
+        return pcm, _stats(original_seconds, original_seconds)
+    if keep.mean() < min_keep_ratio:
+        return pcm, _stats(original_seconds, original_seconds, skipped=f"would keep {keep.mean():.0%}")
+
+    sample_mask = np.repeat(keep, frame_size)
+    tail = samples[len(sample_mask):]  # partial last frame is always kept
+    compacted = np.concatenate((samples[: len(sample_mask)][sample_mask], tail))
+    return compacted.astype("<i2").tobytes(), _stats(original_seconds, len(compacted) / sample_rate)
+
+
+def _stats(original_seconds: float, compacted_seconds: float, skipped: Optional[str] = None) -> dict:
+    stats = {
+        "original_seconds": round(original_seconds, 2),
+        "compacted_seconds": round(compacted_seconds, 2),
+        "compression_ratio": round(original_seconds / compacted_seconds, 2) if compacted_seconds else 1.0,
+    }
+    if skipped:
+        stats["skipped"] = skipped
+    return stats
+
+
+def plan_chunks(
+    pcm: bytes,
+    sample_rate: int,
+    chunk_seconds: float,
+    overlap_seconds: float,
+    search_seconds: float,
+    frame_ms: int = 30,
+) -> list[tuple[int, int]]:
+    """Split s16le mono PCM into roughly ``chunk_seconds`` long chunks cut at pauses.
+
+    Each cut goes at the quietest point (level smoothed over ~300 ms) within
+    ``search_seconds`` of the nominal boundary, so words are not split, and every
+    chunk is widened by ``overlap_seconds`` on both sides. A remainder shorter than
+    half a chunk is folded into the last chunk. Returns (start_sample, end_sample) pairs.
+    """
+    total_samples = len(pcm) // 2
+    frame_size = max(sample_rate * frame_ms // 1000, 1)
+    chunk_frames = max(int(chunk_seconds * 1000 / frame_ms), 1)
+    if total_samples < chunk_frames * frame_size * 1.5:
+        return [(0, total_samples)]
+
+    samples = np.frombuffer(pcm[: total_samples * 2], dtype="<i2")
+    levels = frame_levels_db(samples, frame_size)
+    window = max(300 // frame_ms, 1)
+    smoothed = np.convolve(levels, np.ones(window) / window, mode="same")
+    search_frames = int(search_seconds * 1000 / frame_ms)
+
+    cuts = []
+    position = 0
+    while len(levels) - position >= chunk_frames * 1.5:
+        nominal = position + chunk_frames
+        low = max(nominal - search_frames, position + 1)
+        high = min(nominal + search_frames, len(levels) - 1)
+        cut = low + int(np.argmin(smoothed[low:high + 1]))
+        cuts.append(cut)
+        position = cut
+
+    boundaries = [0] + [cut * frame_size for cut in cuts] + [total_samples]
+    overlap = int(overlap_seconds * sample_rate)
+    return [
+        (max(start - overlap, 0), min(end + overlap, total_samples))
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
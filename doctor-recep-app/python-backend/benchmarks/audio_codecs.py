@@ -0,0 +1,96 @@
+"""
+Audio codec benchmark for the conversion stage.
+
+Transcodes sample recordings to every codec in AUDIO_CODECS and reports payload
+bytes (raw and base64-inlined), conversion time and, with --with-model, Gemini
+end-to-end latency plus a summary-similarity score against the WAV baseline as a
+rough quality check.
+
+Usage:
+    python benchmarks/audio_codecs.py [audio files...] [--runs 3] [--with-model]
+"""
+
+import os
+import sys
+import time
+import base64
+import asyncio
+import argparse
+import difflib
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+DEFAULT_SAMPLES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "example", "recording_1748372480414.webm"),
+]
+
+
+async def benchmark_file(path: str, runs: int, with_model: bool, client) -> list[dict]:
+    with open(path, "rb") as f:
+        source = f.read()
+    rows = []
+    baseline_summary = None
+    for codec in main.AUDIO_CODECS:
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            data, mime_type = await main.convert_audio(source, codec=codec)
+            timings.append((time.perf_counter() - started) * 1000)
+        row = {
+            "file": os.path.basename(path),
+            "codec": codec,
+            "mime_type": mime_type,
+            "source_bytes": len(source),
+            "payload_bytes": len(data),
+            "inline_bytes": len(base64.b64encode(data)),
+            "convert_ms": statistics.median(timings),
+        }
+        if with_model:
+            prompt = main.generate_prompt(main.TemplateConfig(), "doctor")
+            started = time.perf_counter()
+            response = await client.aio.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=[prompt, main.types.Part.from_bytes(data=data, mime_type=mime_type)],
+            )
+            row["model_ms"] = (time.perf_counter() - started) * 1000
+            summary = response.text or ""
+            if baseline_summary is None:
+                baseline_summary = summary
+            row["similarity_to_wav"] = difflib.SequenceMatcher(None, baseline_summary, summary).ratio()
+        rows.append(row)
+    return rows
+
+
+def print_table(rows: list[dict]):
+    columns = ["file", "codec", "mime_type", "source_bytes", "payload_bytes", "inline_bytes", "convert_ms", "model_ms", "similarity_to_wav"]
+    columns = [c for c in columns if any(c in row for row in rows)]
+    print("\t".join(columns))
+    for row in rows:
+        values = []
+        for column in columns:
+            value = row.get(column, "")
+            values.append(f"{value:.1f}" if isinstance(value, float) and column.endswith("_ms") else
+                          f"{value:.3f}" if isinstance(value, float) else str(value))
+        print("\t".join(values))
+
+
+async def run(args):
+    client = None
+    if args.with_model:
+        client = main.genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+    rows = []
+    for path in args.files or DEFAULT_SAMPLES:
+        rows.extend(await benchmark_file(path, args.runs, args.with_model, client))
+    await main.conversion_executor.shutdown()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="audio files to benchmark (defaults to the example recording)")
+    parser.add_argument("--runs", type=int, default=3, help="conversions per codec; the median is reported")
+    parser.add_argument("--with-model", action="store_true", help="also call Gemini (needs GEMINI_API_KEY)")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,144 @@
+"""
+Cold-start benchmark for the production entry point (serve.py).
+
+Starts the server several times per configuration against the fake storage and
+Gemini from fake_services.py and reports, from the moment the process is
+launched: time to the first 200 from /health, time until every worker reports
+the startup warm-up finished, and the latency of the first summary request.
+The import, startup and warm-up steps each worker reported under "startup" in
+/health are averaged alongside. The "eager" configuration (LAZY_IMPORTS=false,
+WARMUP_ON_STARTUP=false) is how the app started before.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 3] [--workers 1] [--media-dir ../../example]
+        [--gemini-latency-ms 200] [--env KEY=VALUE ...]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeGemini, FakeMediaServer, FaultProfile  # noqa: E402
+from load_test import AUDIO_EXTENSIONS, BACKEND_DIR, EXAMPLE_DIR, IMAGE_EXTENSIONS, _free_port, consultation_mix, send_request  # noqa: E402
+
+CONFIGURATIONS = {
+    "eager": {"LAZY_IMPORTS": "false", "WARMUP_ON_STARTUP": "false"},
+    "lazy_no_warmup": {"LAZY_IMPORTS": "true", "WARMUP_ON_STARTUP": "false"},
+    "lazy_warmup": {"LAZY_IMPORTS": "true", "WARMUP_ON_STARTUP": "true"},
+}
+REPORTED_STEPS = ("app_import", "startup_hooks", "warmup")
+
+
+def start_server(port: int, workers: int, gemini_url: str, configuration: dict, extra_env: list[str]) -> subprocess.Popen:
+    env = {
+        **os.environ, **configuration,
+        "GEMINI_API_KEY": "cold-start", "GEMINI_BASE_URL": gemini_url,
+        "PORT": str(port), "HOST": "127.0.0.1", "WEB_CONCURRENCY": str(workers), "LOG_LEVEL": "WARNING",
+    }
+    for item in extra_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env)
+
+
+async def measure(args, name: str, body: dict, gemini_url: str) -> dict:
+    """One cold start: seconds from launch to healthy, to warm and to the first summary"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = start_server(port, args.workers, gemini_url, CONFIGURATIONS[name], args.env)
+    result = {}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            warm_pids: set = set()
+            steps: dict[str, list[float]] = {}
+            while time.perf_counter() - started < 120:
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with code {process.returncode}")
+                try:
+                    response = await client.get("/health")
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.02)
+                    continue
+                result.setdefault("healthy_s", time.perf_counter() - started)
+                startup = response.json().get("startup", {})
+                # Without warm-up nothing more happens until a request arrives
+                if CONFIGURATIONS[name]["WARMUP_ON_STARTUP"] != "true":
+                    break
+                if startup.get("warm") and startup["pid"] not in warm_pids:
+                    warm_pids.add(startup["pid"])
+                    for step in REPORTED_STEPS:
+                        steps.setdefault(step, []).append(startup.get(step, 0.0))
+                if len(warm_pids) >= args.workers:
+                    result["warm_s"] = time.perf_counter() - started
+                    break
+                await asyncio.sleep(0.02)
+            latency, outcome = await send_request(client, "summary", body)
+            result["first_request_s"] = latency
+            result["first_request_outcome"] = outcome
+            if not steps:
+                startup = (await client.get("/health")).json().get("startup", {})
+                steps = {step: [startup.get(step, 0.0)] for step in REPORTED_STEPS}
+            result.update({step: statistics.mean(values) for step, values in steps.items()})
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+async def run(args):
+    rng = random.Random(1)
+    names = sorted(os.listdir(args.media_dir))
+    audio = [n for n in names if n.lower().endswith(AUDIO_EXTENSIONS)]
+    images = [n for n in names if n.lower().endswith(IMAGE_EXTENSIONS)]
+    if not audio:
+        raise SystemExit(f"no audio files in {args.media_dir}")
+    media = FakeMediaServer(args.media_dir, FaultProfile())
+    gemini = FakeGemini(FaultProfile(args.gemini_latency_ms))
+    media_url, gemini_url = media.start(), gemini.start()
+    rows = []
+    try:
+        for name in CONFIGURATIONS:
+            runs = []
+            for index in range(args.runs):
+                body = consultation_mix(rng, index, f"{media_url}/{name}", audio, images, reuse=False)
+                runs.append(await measure(args, name, body, gemini_url))
+            row = {"configuration": name}
+            for key in ("healthy_s", "warm_s", "first_request_s", *REPORTED_STEPS):
+                values = [r[key] for r in runs if key in r]
+                row[key] = statistics.median(values) if values else None
+            row["ok"] = sum(r["first_request_outcome"] == "ok" for r in runs)
+            rows.append(row)
+            print(f"{name}: healthy {row['healthy_s']:.2f}s, first request {row['first_request_s']:.2f}s", file=sys.stderr)
+    finally:
+        media.stop()
+        gemini.stop()
+    print_table(rows)
+
+
+def print_table(rows: list[dict]):
+    columns = ["configuration", "healthy_s", "warm_s", "first_request_s", *REPORTED_STEPS, "ok"]
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("-" if row[c] is None else f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per configuration (medians are reported)")
+    parser.add_argument("--workers", type=int, default=1, help="WEB_CONCURRENCY for serve.py")
+    parser.add_argument("--media-dir", default=EXAMPLE_DIR)
+    parser.add_argument("--gemini-latency-ms", type=float, default=200)
+    parser.add_argument("--env", action="append", default=[], help="extra server environment, KEY=VALUE")
+    asyncio.run(run(parser.parse_args()))
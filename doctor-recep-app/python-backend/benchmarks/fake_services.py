@@ -0,0 +1,257 @@
+"""
+Local stand-ins for media storage and the Gemini API, used by the load test.
+
+FakeMediaServer serves the files of one directory under any path that ends in
+their name (``/r12/a0/recording.webm``), with an ETag per path, so every request
+can use its own URLs and miss the media cache; it honours Range/If-Range and can
+cut connections mid-body to exercise resumed downloads. FakeGemini answers
+``models/*:generateContent`` and ``:streamGenerateContent`` the way the REST API
+does. Both add configurable latency and inject 503s (and, for Gemini, 429s with
+Retry-After) at configurable rates.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import mimetypes
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# Content types storage sends for browser recordings and phone uploads
+CONTENT_TYPES = {".webm": "audio/webm", ".m4a": "audio/mp4", ".mp3": "audio/mpeg", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+
+class FaultProfile:
+    """Latency and error injection for one fake service"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        drop_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "errors_injected": 0, "throttled": 0, "dropped": 0}
+
+    def sleep(self, extra_ms: float = 0):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(self.latency_ms + jitter + extra_ms, 0) / 1000)
+
+    def outcome(self) -> Optional[int]:
+        """Status code to fail this request with, or None to serve it"""
+        with self._lock:
+            self.counts["requests"] += 1
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self.counts["throttled"] += 1
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.counts["errors_injected"] += 1
+                return 503
+        return None
+
+    def drop(self) -> bool:
+        """Whether to cut this response off halfway through the body"""
+        with self._lock:
+            if self._random.random() < self.drop_rate:
+                self.counts["dropped"] += 1
+                return True
+        return False
+
+
+class _Server:
+    handler_class: type = BaseHTTPRequestHandler
+
+    def __init__(self, faults: FaultProfile, port: int = 0):
+        self.faults = faults
+        handler = type("Handler", (self.handler_class,), {"service": self})
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_error_status(self, status: int, retry_after: Optional[int] = None):
+        body = json.dumps({"error": {"code": status, "message": "injected by fake service", "status": "UNAVAILABLE"}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _MediaHandler(_QuietHandler):
+    def _byte_range(self, size: int, etag: str) -> Optional[tuple[int, int]]:
+        """(first, last) byte requested, or None to send the whole object"""
+        requested = self.headers.get("Range", "")
+        if_range = self.headers.get("If-Range")
+        if not requested.startswith("bytes=") or (if_range is not None and if_range != etag):
+            return None
+        first, _, last = requested[len("bytes="):].partition("-")
+        return int(first), min(int(last) if last else size - 1, size - 1)
+
+    def _serve(self, with_body: bool):
+        name = os.path.basename(self.path.split("?", 1)[0])
+        data = self.service.files.get(name)
+        if data is None:
+            self.send_error_status(404)
+            return
+        if with_body:
+            status = self.service.faults.outcome()
+            self.service.faults.sleep()
+            if status is not None:
+                self.send_error_status(503)
+                return
+        etag = '"%s"' % hashlib.md5(self.path.encode()).hexdigest()
+        byte_range = self._byte_range(len(data), etag)
+        if byte_range is not None and byte_range[0] >= len(data):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(data)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        first, last = byte_range or (0, len(data) - 1)
+        extension = os.path.splitext(name)[1].lower()
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(extension) or mimetypes.guess_type(name)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        if with_body:
+            body = data[first:last + 1]
+            if self.service.faults.drop():
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            chunk_seconds = 64 * 1024 / self.service.bytes_per_second if self.service.bytes_per_second else 0
+            for offset in range(0, len(body), 64 * 1024):
+                self.wfile.write(body[offset:offset + 64 * 1024])
+                if chunk_seconds:
+                    time.sleep(chunk_seconds)
+
+    def do_GET(self):
+        try:
+            self._serve(with_body=True)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading (size limit, or the range fetch replaced this stream)
+
+    def do_HEAD(self):
+        self._serve(with_body=False)
+
+
+class FakeMediaServer(_Server):
+    """Serves every file in ``directory`` by name under any path prefix.
+
+    ``bytes_per_second`` caps each connection's throughput (0 = unlimited), like a
+    slow storage link where parallel range requests pay off.
+    """
+    handler_class = _MediaHandler
+
+    def __init__(self, directory: str, faults: FaultProfile, port: int = 0, bytes_per_second: float = 0):
+        super().__init__(faults, port)
+        self.bytes_per_second = bytes_per_second
+        self.files = {}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    self.files[name] = f.read()
+
+
+FAKE_SUMMARY = (
+    "Chief Complaint: Fever and sore throat for three days.\n"
+    "History: No known allergies. Paracetamol taken at home.\n"
+    "Examination: Throat congested, temperature 38.2 C.\n"
+    "Diagnosis: Acute pharyngitis.\n"
+    "Treatment Plan: Tab. Azithromycin 500 mg once daily for 3 days; warm saline gargles.\n"
+    "Follow-up: Review after 3 days if fever persists."
+)
+
+
+class _GeminiHandler(_QuietHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        faults = self.service.faults
+        if ":generateContent" not in self.path and ":streamGenerateContent" not in self.path:
+            self.send_error_status(404)
+            return
+        status = faults.outcome()
+        # Larger prompts take longer, roughly like the real model's prefill
+        faults.sleep(extra_ms=self.service.latency_per_mb_ms * len(body) / (1024 * 1024))
+        if status is not None:
+            self.send_error_status(status, retry_after=faults.retry_after if status == 429 else None)
+            return
+        with self.service.lock:
+            self.service.bytes_received += len(body)
+        if ":streamGenerateContent" in self.path:
+            self._stream()
+        else:
+            self._respond(json.dumps(self._chunk(FAKE_SUMMARY)).encode(), "application/json")
+
+    def _chunk(self, text: str) -> dict:
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": 1000, "candidatesTokenCount": len(text) // 4},
+        }
+
+    def _respond(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        lines = FAKE_SUMMARY.split("\n")
+        events = b"".join(f"data: {json.dumps(self._chunk(line + chr(10)))}\r\n\r\n".encode() for line in lines)
+        self._respond(events, "text/event-stream")
+
+
+class FakeGemini(_Server):
+    """Answers generateContent/streamGenerateContent with a canned summary"""
+    handler_class = _GeminiHandler
+
+    def __init__(self, faults: FaultProfile, latency_per_mb_ms: float = 0, port: int = 0):
+        super().__init__(faults, port)
+        self.latency_per_mb_ms = latency_per_mb_ms
+        self.lock = threading.Lock()
+        self.bytes_received = 0
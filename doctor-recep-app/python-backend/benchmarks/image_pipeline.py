@@ -0,0 +1,98 @@
+"""
+Image conversion micro-benchmark.
+
+Runs the sample images through the image conversion stage in several output
+configurations and reports ms/image (median) and output bytes, alongside the
+previous pipeline (full decode, LANCZOS resize, PNG with optimize=True) as a
+baseline. Conversions run in-process so only PIL time is measured.
+
+Usage:
+    python benchmarks/image_pipeline.py [image files...] [--runs 10] [--max-size 1024]
+"""
+
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from PIL import Image  # noqa: E402
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "example")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def legacy_png(file_bytes: bytes, max_size: int) -> tuple[bytes, str]:
+    """The conversion this pipeline replaced"""
+    img = Image.open(io.BytesIO(file_bytes))
+    if img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+    width, height = img.size
+    if width > max_size or height > max_size:
+        ratio = min(max_size / width, max_size / height)
+        img = img.resize((int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format="PNG", optimize=True)
+    return output.getvalue(), "image/png"
+
+
+def variants(max_size: int) -> dict:
+    convert = main._convert_image_blocking
+    return {
+        "legacy_png_optimize": lambda data: legacy_png(data, max_size),
+        "png": lambda data: convert(data, max_size, "png", 0, 0),
+        "jpeg_q85_full_decode": lambda data: convert(data, max_size, "jpeg", 85, 0, fast_decode=False),
+        "jpeg_q85": lambda data: convert(data, max_size, "jpeg", 85, 0),
+        "webp_q80": lambda data: convert(data, max_size, "webp", 80, 0),
+        "configured": lambda data: convert(
+            data, max_size, main.IMAGE_OUTPUT_FORMAT, main.IMAGE_OUTPUT_QUALITY, main.IMAGE_PASSTHROUGH_MAX_BYTES
+        ),
+    }
+
+
+def benchmark_file(path: str, runs: int, max_size: int) -> list[dict]:
+    with open(path, "rb") as f:
+        source = f.read()
+    rows = []
+    for name, convert in variants(max_size).items():
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            data, mime_type = convert(source)
+            timings.append((time.perf_counter() - started) * 1000)
+        width, height = Image.open(io.BytesIO(data)).size
+        rows.append({
+            "file": os.path.basename(path),
+            "variant": name,
+            "mime_type": mime_type,
+            "size": f"{width}x{height}",
+            "source_bytes": len(source),
+            "output_bytes": len(data),
+            "ms_per_image": statistics.median(timings),
+        })
+    return rows
+
+
+def print_table(rows: list[dict]):
+    columns = ["file", "variant", "mime_type", "size", "source_bytes", "output_bytes", "ms_per_image"]
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join(f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="images to benchmark (defaults to the images in example/)")
+    parser.add_argument("--runs", type=int, default=10, help="conversions per variant; the median is reported")
+    parser.add_argument("--max-size", type=int, default=main.IMAGE_MAX_SIZE, help="longest side after resizing")
+    args = parser.parse_args()
+    files = args.files or sorted(p for p in glob.glob(os.path.join(EXAMPLE_DIR, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+    rows = []
+    for path in files:
+        rows.extend(benchmark_file(path, args.runs, args.max_size))
+    print_table(rows)
@@ -0,0 +1,345 @@
+"""
+Load test for the summary API against local stand-ins for storage and Gemini.
+
+Starts the fake media server and fake Gemini from fake_services.py, launches
+main.app under uvicorn in a subprocess pointed at them (GEMINI_BASE_URL), and
+drives consultation mixes of 1-5 audio files and 0-4 images at each concurrency
+level. For every level it reports request latency p50/p95/p99, req/s, server
+CPU seconds and utilisation, peak RSS, and the mean time per pipeline stage taken
+from the /metrics histograms.
+
+CPU covers the server process and every descendant (process-pool workers and
+reaped ffmpeg processes). Peak RSS is the high-water mark of the server and its
+pool workers, reset at the start of each level; short-lived ffmpeg processes
+are not included. Both read /proc, so they are only reported on Linux.
+
+Every request uses its own media URLs, so the media cache always misses; pass
+--reuse-media to measure the cached path instead.
+
+Usage:
+    python benchmarks/load_test.py [--concurrency 1,2,4,8] [--requests 40] [--endpoint summary|stream]
+        [--media-dir ../../example] [--media-latency-ms 20] [--media-error-rate 0]
+        [--media-drop-rate 0] [--media-bandwidth-mbps 0]
+        [--gemini-latency-ms 1500] [--gemini-jitter-ms 300] [--gemini-error-rate 0] [--gemini-429-rate 0]
+        [--reuse-media] [--seed 1] [--env KEY=VALUE ...] [--json results.json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeGemini, FakeMediaServer, FaultProfile  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EXAMPLE_DIR = os.path.join(BACKEND_DIR, "..", "..", "example")
+AUDIO_EXTENSIONS = (".webm", ".m4a", ".mp3", ".wav", ".ogg")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+STAGE_METRIC = re.compile(r'^doctor_recep_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# Process accounting (/proc)
+
+def _stat_fields(pid: int) -> Optional[list[str]]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # comm may contain spaces; the fields after it are space separated
+            return f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+
+
+def process_tree(root: int) -> list[int]:
+    """The root pid and all its live descendants"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            fields = _stat_fields(int(entry))
+            if fields:
+                parents.setdefault(int(fields[1]), []).append(int(entry))
+    tree, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(parents.get(pid, []))
+    return tree
+
+
+def cpu_seconds(root: int) -> Optional[float]:
+    """utime+stime of the tree, including children it has already reaped"""
+    if not os.path.isdir(f"/proc/{root}"):
+        return None
+    total = 0
+    for pid in process_tree(root):
+        fields = _stat_fields(pid)
+        if fields:
+            total += sum(int(value) for value in fields[11:15])  # utime, stime, cutime, cstime
+    return total / CLOCK_TICKS
+
+
+def reset_peak_rss(root: int) -> bool:
+    reset = True
+    for pid in process_tree(root):
+        try:
+            with open(f"/proc/{pid}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            reset = False
+    return reset
+
+
+def peak_rss_mb(root: int) -> Optional[float]:
+    total_kb = 0
+    for pid in process_tree(root):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1) if total_kb else None
+
+
+# Workload
+
+def consultation_mix(rng: random.Random, index: int, media_url: str, audio: list[str], images: list[str], reuse: bool) -> dict:
+    """One request body: 1-5 audio files and 0-4 images with per-request URLs"""
+    prefix = f"{media_url}/{'shared' if reuse else f'r{index}'}"
+    audio_urls = [f"{prefix}/a{i}/{rng.choice(audio)}" for i in range(rng.randint(1, 5))]
+    image_urls = [f"{prefix}/i{i}/{rng.choice(images)}" for i in range(rng.randint(0, 4))] if images else []
+    return {
+        "primary_audio_url": audio_urls[0],
+        "additional_audio_urls": audio_urls[1:],
+        "image_urls": image_urls,
+        "submitted_by": "doctor",
+    }
+
+
+async def send_request(client: httpx.AsyncClient, endpoint: str, body: dict) -> tuple[float, str]:
+    """Returns (latency seconds, outcome) where outcome is "ok" or an HTTP status"""
+    started = time.perf_counter()
+    try:
+        if endpoint == "stream":
+            outcome = "ok"
+            async with client.stream("POST", "/api/generate-summary/stream", json=body) as response:
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: ") and event == "error":
+                        outcome = str(json.loads(line[6:]).get("status_code"))
+                if response.status_code != 200:
+                    outcome = str(response.status_code)
+        else:
+            response = await client.post("/api/generate-summary", json=body)
+            outcome = "ok" if response.status_code == 200 else str(response.status_code)
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    return time.perf_counter() - started, outcome
+
+
+async def scrape_stages(client: httpx.AsyncClient) -> dict:
+    """stage -> [sum seconds, count] from the Prometheus endpoint"""
+    stages: dict[str, list[float]] = {}
+    for line in (await client.get("/metrics")).text.splitlines():
+        match = STAGE_METRIC.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            stages.setdefault(stage, [0.0, 0.0])[0 if kind == "sum" else 1] = float(value)
+    return stages
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+async def run_level(client: httpx.AsyncClient, args, concurrency: int, bodies: list[dict], server_pid: Optional[int]) -> dict:
+    rss_reset = reset_peak_rss(server_pid) if server_pid else False
+    cpu_before = cpu_seconds(server_pid) if server_pid else None
+    stages_before = await scrape_stages(client)
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            results.append(await send_request(client, args.endpoint, queue.get_nowait()))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    cpu_after = cpu_seconds(server_pid) if server_pid else None
+    stages_after = await scrape_stages(client)
+
+    latencies = sorted(latency for latency, _ in results)
+    outcomes: dict[str, int] = {}
+    for _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    cpu = round(cpu_after - cpu_before, 2) if cpu_before is not None and cpu_after is not None else None
+    stages = {}
+    for stage, (total, count) in stages_after.items():
+        before_total, before_count = stages_before.get(stage, [0.0, 0.0])
+        if count > before_count:
+            stages[stage] = {
+                "count": int(count - before_count),
+                "mean_ms": round((total - before_total) / (count - before_count) * 1000, 1),
+            }
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": outcomes.get("ok", 0),
+        "outcomes": outcomes,
+        "req_per_s": round(len(results) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "cpu_seconds": cpu,
+        "cpu_utilisation": round(cpu / elapsed, 2) if cpu is not None else None,
+        "peak_rss_mb": peak_rss_mb(server_pid) if server_pid else None,
+        "peak_rss_reset": rss_reset,
+        "stages": stages,
+    }
+
+
+# Server under test
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, gemini_url: str, extra_env: list[str]) -> subprocess.Popen:
+    env = {**os.environ, "GEMINI_API_KEY": "load-test", "GEMINI_BASE_URL": gemini_url}
+    for item in extra_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become healthy")
+
+
+def print_report(levels: list[dict]):
+    columns = ["concurrency", "requests", "ok", "req_per_s", "p50_ms", "p95_ms", "p99_ms", "cpu_seconds", "cpu_utilisation", "peak_rss_mb"]
+    print("\t".join(columns + ["errors"]))
+    for level in levels:
+        errors = ",".join(f"{k}:{v}" for k, v in level["outcomes"].items() if k != "ok") or "-"
+        print("\t".join(str(level[c]) if level[c] is not None else "n/a" for c in columns) + "\t" + errors)
+    print()
+    stages = sorted({stage for level in levels for stage in level["stages"]})
+    print("\t".join(["stage (mean ms)"] + [f"c={level['concurrency']}" for level in levels]))
+    for stage in stages:
+        print("\t".join([stage] + [str(level["stages"].get(stage, {}).get("mean_ms", "-")) for level in levels]))
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    names = sorted(os.listdir(args.media_dir))
+    audio = [n for n in names if n.lower().endswith(AUDIO_EXTENSIONS)]
+    images = [n for n in names if n.lower().endswith(IMAGE_EXTENSIONS)]
+    if not audio:
+        raise SystemExit(f"no audio files in {args.media_dir}")
+
+    media = FakeMediaServer(
+        args.media_dir, FaultProfile(
+            args.media_latency_ms, args.media_latency_ms / 2, args.media_error_rate,
+            drop_rate=args.media_drop_rate, seed=args.seed,
+        ),
+        bytes_per_second=args.media_bandwidth_mbps * 1024 * 1024 / 8,
+    )
+    gemini = FakeGemini(
+        FaultProfile(args.gemini_latency_ms, args.gemini_jitter_ms, args.gemini_error_rate, args.gemini_429_rate, seed=args.seed),
+        latency_per_mb_ms=args.gemini_latency_per_mb_ms,
+    )
+    media_url, gemini_url = media.start(), gemini.start()
+    port = _free_port()
+    process = start_app(port, gemini_url, args.env)
+    levels = []
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout, limits=limits) as client:
+            await wait_until_healthy(client, process)
+            index = 0
+            # Warm-up: first ffmpeg launch, pool fork, Gemini connection
+            for _ in range(2):
+                await send_request(client, args.endpoint, consultation_mix(rng, index, media_url, audio, images, args.reuse_media))
+                index += 1
+            for concurrency in args.concurrency:
+                bodies = []
+                for _ in range(args.requests):
+                    bodies.append(consultation_mix(rng, index, media_url, audio, images, args.reuse_media))
+                    index += 1
+                level = await run_level(client, args, concurrency, bodies, process.pid)
+                levels.append(level)
+                print(f"c={concurrency}: {level['req_per_s']} req/s, p95 {level['p95_ms']} ms, ok {level['ok']}/{level['requests']}", file=sys.stderr)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        media.stop()
+        gemini.stop()
+
+    print_report(levels)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "args": {k: v for k, v in vars(args).items() if k != "json"},
+                "levels": levels,
+                "fake_media": media.faults.counts,
+                "fake_gemini": {**gemini.faults.counts, "bytes_received": gemini.bytes_received},
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 2, 4, 8], help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="requests per concurrency level")
+    parser.add_argument("--endpoint", choices=["summary", "stream"], default="summary")
+    parser.add_argument("--media-dir", default=EXAMPLE_DIR, help="audio and images to serve (defaults to example/)")
+    parser.add_argument("--media-latency-ms", type=float, default=20, help="storage time to first byte")
+    parser.add_argument("--media-error-rate", type=float, default=0.0, help="fraction of downloads answered with 503")
+    parser.add_argument("--media-bandwidth-mbps", type=float, default=0, help="per-connection storage throughput cap (0 = unlimited)")
+    parser.add_argument("--media-drop-rate", type=float, default=0.0, help="fraction of downloads cut off halfway (resumed with Range)")
+    parser.add_argument("--gemini-latency-ms", type=float, default=1500)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=300)
+    parser.add_argument("--gemini-latency-per-mb-ms", type=float, default=200, help="extra latency per MB of request body")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--reuse-media", action="store_true", help="share media URLs across requests (media cache hits)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per request")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for the server")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,149 @@
+"""
+Logging overhead micro-benchmark.
+
+Emits the log lines of one summary request (the pipeline's INFO lines, the
+per-part content structure and the file error summary) through several logging
+setups and reports the time spent on the calling thread per request, i.e. the
+time the event loop would be blocked, plus how long the listener took to drain.
+The previous setup (logging.basicConfig text to stdout, per-part lines at INFO)
+is the baseline. Output goes to a sink that can simulate a slow stdout pipe.
+
+Usage:
+    python benchmarks/logging_overhead.py [--requests 2000] [--parts 8] [--sink-latency-ms 0]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from google.genai import types  # noqa: E402
+
+import main  # noqa: E402
+from structured_logging import configure_logging, reset_request_id, set_request_id  # noqa: E402
+
+LEGACY_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class Sink:
+    """Discards output, optionally sleeping on each flush like a slow stdout pipe"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.bytes = 0
+
+    def write(self, text: str):
+        self.bytes += len(text)
+
+    def flush(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def sample_contents(parts: int) -> list:
+    contents = ["x" * 4000]
+    for index in range(parts):
+        mime_type = "audio/ogg" if index % 2 == 0 else "image/jpeg"
+        contents.append(types.Part.from_bytes(data=b"\0" * 64, mime_type=mime_type))
+    return contents
+
+
+def legacy_structure_logging(logger: logging.Logger, contents: list):
+    """The per-part logging this replaced: one f-string INFO line per part, always formatted"""
+    for idx, item in enumerate(contents):
+        if isinstance(item, str):
+            logger.info(f"gemini_contents[{idx}] type: str (prompt) length: {len(item)}")
+        elif item.inline_data:
+            logger.info(f"gemini_contents[{idx}] type: Part, mime_type: {item.inline_data.mime_type}")
+
+
+def one_request(logger: logging.Logger, contents: list, legacy: bool):
+    parts = len(contents) - 1
+    url = "https://storage.example.com/consultations/1234/recording-0.webm"
+    logger.info(f"🎯 Processing consultation with {main.GEMINI_MODEL}...", extra={"stage": "request"})
+    logger.info(f"🎵 Preparing {parts // 2} audio file task(s)...", extra={"stage": "file"})
+    logger.info(f"🚀 Launching processing for {parts} files concurrently...", extra={"stage": "request"})
+    for index in range(parts):
+        logger.info(f"📤 Processing additional_audio_{index} audio file: {url}", extra={"stage": "file"})
+        logger.info(f"📥 Streamed file: {url} (MIME: audio/webm, Size: 482113 bytes)", extra={"stage": "download"})
+        logger.info(f"✅ Additional audio {index} audio processed successfully (MIME: audio/ogg, Size: 91211 bytes)", extra={"stage": "file"})
+    logger.info(f"📊 Total files successfully processed for Gemini: {parts}", extra={"stage": "file"})
+    if legacy:
+        legacy_structure_logging(logger, contents)
+    else:
+        main.build_gemini_contents(contents)
+    logger.info(f"🤖 Generating summary with {main.GEMINI_MODEL}...", extra={"stage": "request"})
+    logger.info("✅ Summary generated successfully (1843 characters)", extra={"stage": "request"})
+
+
+def legacy_setup(sink: Sink):
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(LEGACY_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    return None
+
+
+def variants() -> dict:
+    return {
+        "legacy_basicconfig_text": (legacy_setup, True),
+        "queue_text": (lambda sink: configure_logging("INFO", "text", stream=sink), False),
+        "queue_json": (lambda sink: configure_logging("INFO", "json", stream=sink), False),
+        "queue_json_sampled_10pct": (
+            lambda sink: configure_logging("INFO", "json", {"download": 0.1, "file": 0.1}, stream=sink), False,
+        ),
+        "queue_json_debug": (lambda sink: configure_logging("DEBUG", "json", stream=sink), False),
+    }
+
+
+def benchmark(name: str, setup, legacy: bool, requests: int, contents: list, latency_ms: float) -> dict:
+    sink = Sink(latency_ms)
+    listener = setup(sink)
+    logger = logging.getLogger("main")
+    timings = []
+    for index in range(requests):
+        token = set_request_id(f"bench-{index}")
+        started = time.perf_counter()
+        one_request(logger, contents, legacy)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+        reset_request_id(token)
+    drain_started = time.perf_counter()
+    if listener is not None:
+        listener.stop()
+    drain_ms = (time.perf_counter() - drain_started) * 1000
+    return {
+        "variant": name,
+        "us_per_request_p50": statistics.median(timings),
+        "us_per_request_p99": statistics.quantiles(timings, n=100)[98],
+        "drain_ms": drain_ms,
+        "bytes_per_request": sink.bytes // requests,
+    }
+
+
+def print_table(rows: list[dict]):
+    columns = ["variant", "us_per_request_p50", "us_per_request_p99", "drain_ms", "bytes_per_request"]
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join(f"{row[c]:.1f}" if isinstance(row[c], float) else str(row[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="simulated requests per variant")
+    parser.add_argument("--parts", type=int, default=8, help="media parts per request")
+    parser.add_argument("--sink-latency-ms", type=float, default=0, help="delay per flushed line, to mimic a slow stdout")
+    args = parser.parse_args()
+    main.log_listener.stop()
+    contents = sample_contents(args.parts)
+    rows = [
+        benchmark(name, setup, legacy, args.requests, contents, args.sink_latency_ms)
+        for name, (setup, legacy) in variants().items()
+    ]
+    print_table(rows)
@@ -0,0 +1,157 @@
+"""
+Silence removal benchmark for the audio conversion stage.
+
+Converts sample recordings with and without silence removal and reports audio
+duration before/after, payload bytes (raw and base64-inlined), conversion time
+and, with --with-model, Gemini end-to-end latency plus a summary-similarity score
+against the untrimmed audio as a rough quality check.
+
+Consultation recordings from the PWA have long pauses between exchanges; the
+example recording is short and mostly speech, so pass real consultations (or use
+--pad-silence to splice silence into the samples) to see a meaningful reduction.
+--edge-cases adds a steady tone and the first sample attenuated to below the
+silence threshold; both must come back at (nearly) their original duration.
+
+Usage:
+    python benchmarks/silence_removal.py [audio files...] [--runs 3] [--codec opus] [--pad-silence 5] [--edge-cases] [--with-model]
+"""
+
+import os
+import sys
+import time
+import base64
+import asyncio
+import argparse
+import difflib
+import statistics
+import subprocess
+import tempfile
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+DEFAULT_SAMPLES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "example", "recording_1748372480414.webm"),
+]
+
+
+def pad_with_silence(path: str, seconds: float) -> bytes:
+    """The recording twice with ``seconds`` of silence between and after, as WebM/Opus"""
+    with tempfile.NamedTemporaryFile(suffix=".webm") as out:
+        subprocess.run(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                "-i", path, "-f", "lavfi", "-t", str(seconds), "-i", "anullsrc=r=48000:cl=mono",
+                "-filter_complex", "[0:a]asplit[a][b];[1:a]asplit[s1][s2];[a][s1][b][s2]concat=n=4:v=0:a=1",
+                "-c:a", "libopus", out.name,
+            ],
+            check=True,
+        )
+        return out.read()
+
+
+def edge_cases(path: str) -> list[tuple[str, bytes]]:
+    """(name, WebM/Opus bytes) for audio a level-based VAD can mistake for silence"""
+    cases = {
+        "steady_tone_5s": ["-f", "lavfi", "-i", "sine=frequency=440:duration=5"],
+        "quiet_recording_-50dB": ["-i", path, "-af", "volume=-50dB"],
+    }
+    sources = []
+    for name, inputs in cases.items():
+        with tempfile.NamedTemporaryFile(suffix=".webm") as out:
+            subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *inputs, "-c:a", "libopus", out.name], check=True
+            )
+            sources.append((name, out.read()))
+    return sources
+
+
+async def convert(source: bytes, codec: str, remove_silence: bool) -> tuple[bytes, str, dict]:
+    main.start_request_timings()
+    with main.file_scope("sample"):
+        data, mime_type = await main.convert_audio(source, codec=codec, remove_silence=remove_silence)
+    return data, mime_type, main.request_file_details("audio_compaction").get("sample", {})
+
+
+async def benchmark_file(path: str, args, client, source: Optional[bytes] = None) -> list[dict]:
+    if source is None and args.pad_silence:
+        source = pad_with_silence(path, args.pad_silence)
+    elif source is None:
+        with open(path, "rb") as f:
+            source = f.read()
+    rows = []
+    baseline_summary = None
+    for remove_silence in (False, True):
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            data, mime_type, compaction = await convert(source, args.codec, remove_silence)
+            timings.append((time.perf_counter() - started) * 1000)
+        row = {
+            "file": os.path.basename(path),
+            "silence_removal": "on" if remove_silence else "off",
+            "audio_seconds": compaction.get("compacted_seconds"),
+            "compression_ratio": compaction.get("compression_ratio", 1.0),
+            "payload_bytes": len(data),
+            "inline_bytes": len(base64.b64encode(data)),
+            "convert_ms": statistics.median(timings),
+        }
+        if client is not None:
+            prompt = main.generate_prompt(main.TemplateConfig(), "doctor")
+            started = time.perf_counter()
+            response = await client.aio.models.generate_content(
+                model=main.GEMINI_MODEL,
+                contents=[prompt, main.types.Part.from_bytes(data=data, mime_type=mime_type)],
+            )
+            row["model_ms"] = (time.perf_counter() - started) * 1000
+            summary = response.text or ""
+            if baseline_summary is None:
+                baseline_summary = summary
+            row["similarity_to_untrimmed"] = difflib.SequenceMatcher(None, baseline_summary, summary).ratio()
+        rows.append(row)
+    # The untrimmed row's duration is the original duration measured by the trimmed run.
+    rows[0]["audio_seconds"] = compaction.get("original_seconds", "")
+    rows[1]["skipped"] = compaction.get("skipped", "")
+    return rows
+
+
+def print_table(rows: list[dict]):
+    columns = ["file", "silence_removal", "audio_seconds", "compression_ratio", "payload_bytes", "inline_bytes",
+               "convert_ms", "model_ms", "similarity_to_untrimmed", "skipped"]
+    columns = [c for c in columns if any(c in row for row in rows)]
+    print("\t".join(columns))
+    for row in rows:
+        values = []
+        for column in columns:
+            value = row.get(column, "")
+            values.append(f"{value:.1f}" if isinstance(value, float) and column.endswith("_ms") else
+                          f"{value:.3f}" if isinstance(value, float) and column.startswith("similarity") else str(value))
+        print("\t".join(values))
+
+
+async def run(args):
+    client = None
+    if args.with_model:
+        client = main.genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+    rows = []
+    paths = args.files or DEFAULT_SAMPLES
+    for path in paths:
+        rows.extend(await benchmark_file(path, args, client))
+    if args.edge_cases:
+        for name, source in edge_cases(paths[0]):
+            rows.extend(await benchmark_file(name, args, client, source))
+    await main.conversion_executor.shutdown()
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="audio files to benchmark (defaults to the example recording)")
+    parser.add_argument("--runs", type=int, default=3, help="conversions per setting; the median is reported")
+    parser.add_argument("--codec", default=main.AUDIO_OUTPUT_CODEC, choices=sorted(main.AUDIO_CODECS), help="output codec")
+    parser.add_argument("--pad-silence", type=float, default=0, help="splice this many seconds of silence into each sample")
+    parser.add_argument("--edge-cases", action="store_true", help="also run a steady tone and a recording quiet throughout")
+    parser.add_argument("--with-model", action="store_true", help="also call Gemini (needs GEMINI_API_KEY)")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,41 @@
+"""
+Doctor Reception System - Request Deadlines
+A per-request time budget carried in a context variable, so downloads, ffmpeg
+and Gemini calls started on behalf of a request (including in tasks it spawns)
+can cap their own timeouts to what is left of it.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    """The request ran out of time before its work finished"""
+
+
+def start_deadline(seconds: Optional[float]) -> Optional[float]:
+    """Give the current request (and tasks it spawns) ``seconds`` to finish; None means no deadline"""
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    _deadline.set(deadline)
+    return deadline
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current request's deadline (never negative), or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def cap_timeout(timeout: float) -> float:
+    """``timeout`` shortened to the time left before the request deadline"""
+    left = time_left()
+    return timeout if left is None else min(timeout, left)
+
+
+def deadline_exceeded() -> bool:
+    return time_left() == 0.0
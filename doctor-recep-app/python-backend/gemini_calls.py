@@ -0,0 +1,316 @@
+"""
+Doctor Reception System - Resilient Gemini Calls
+Rate-limited Gemini requests with jittered exponential retry under an overall
+deadline, fallback models and optional hedged requests.
+"""
+
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Optional
+
+from deadlines import cap_timeout
+from rate_limit import AdaptiveTokenBucket
+from startup import lazy_module
+
+# Imported on first use so workers can start (and answer /health) before the SDK loads
+requests = lazy_module("requests")
+genai_errors = lazy_module("google.genai.errors")
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# The model name is unknown or not available to this key: try the next model. A 403
+# (bad or revoked API key, API disabled) is a configuration error that no other
+# model or retry fixes, so it is raised straight away like any non-retryable error.
+FALLBACK_STATUS_CODES = {404}
+
+# Outcomes of a failed attempt
+RETRY, NEXT_MODEL, GIVE_UP = "retry", "next_model", "give_up"
+
+
+class GeminiUnavailableError(Exception):
+    """Gemini could not be reached within the retry budget"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "code", None) if isinstance(error, genai_errors.APIError) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, requests.ConnectionError, requests.Timeout)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+class GeminiRequest:
+    """Contents and config for one logical Gemini call.
+
+    Subclasses can build them per model (e.g. a cached-content reference only
+    exists for the model it was created for) and react to failed attempts.
+    """
+
+    def __init__(self, contents, config=None):
+        self.contents = contents
+        self.config = config
+
+    async def prepare(self, client, model: str) -> tuple[Any, Any]:
+        """(contents, config) for an attempt on ``model``"""
+        return self.contents, self.config
+
+    async def on_failure(self, model: str, error: Exception) -> bool:
+        """Return True to retry ``model`` straight away with freshly prepared contents"""
+        return False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        if len(self._samples) < max(min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class GeminiCaller:
+    """Makes Gemini calls shared by all requests on the instance.
+
+    Every attempt takes a token from the adaptive limiter. Retryable failures
+    (429, 5xx, timeouts, connection errors) are retried with full-jitter
+    exponential backoff up to ``max_attempts`` per model, then the next model in
+    ``models`` is tried, all within ``deadline`` seconds (or what is left of the
+    request deadline, if shorter). With ``hedge`` enabled a second identical
+    request is sent when an attempt runs past the observed ``hedge_percentile``
+    latency and a token is free; the first response wins.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        limiter: AdaptiveTokenBucket,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        deadline: float,
+        attempt_timeout: float,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+    ):
+        self.models = models
+        self.limiter = limiter
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self._stats = {
+            "calls": 0, "attempts": 0, "retries": 0, "rate_limited": 0, "fallbacks": 0,
+            "hedged": 0, "hedge_wins": 0, "failures": 0,
+        }
+
+    @property
+    def model(self) -> str:
+        return self.models[0]
+
+    def _plan(self):
+        for model in self.models:
+            for attempt in range(self.max_attempts):
+                yield model, attempt
+
+    async def _acquire(self, deadline: float) -> bool:
+        """Take a limiter token, giving up when the deadline passes first"""
+        try:
+            await asyncio.wait_for(self.limiter.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _handle_failure(self, error: Exception, model: str, attempt: int, deadline: float) -> str:
+        """Back off before the next attempt and say what to do next; raises if the error is not retryable"""
+        code = _status_code(error)
+        retry_after = _retry_after(error)
+        if code == 429:
+            self._stats["rate_limited"] += 1
+            self.limiter.on_throttled(retry_after)
+        if code in FALLBACK_STATUS_CODES:
+            logger.warning(f"⚠️ Gemini model {model} unavailable ({code}), trying fallback")
+            return NEXT_MODEL
+        if not is_retryable(error):
+            raise error
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = max(delay, retry_after or 0)
+        logger.warning(f"⚠️ Gemini call to {model} failed (attempt {attempt + 1}): {str(error) or type(error).__name__}; retrying in {delay:.2f}s")
+        if time.monotonic() + delay >= deadline:
+            return GIVE_UP
+        self._stats["retries"] += 1
+        await asyncio.sleep(delay)
+        return RETRY
+
+    async def _single_request(self, client, model: str, contents, config):
+        started = time.monotonic()
+        response = await client.aio.models.generate_content(model=model, contents=contents, config=config)
+        self.latency.record(time.monotonic() - started)
+        return response
+
+    async def _attempt(self, client, model: str, contents, config, timeout: float):
+        """One attempt, hedged with a duplicate request once it runs past the latency percentile"""
+        started = time.monotonic()
+        primary = asyncio.create_task(self._single_request(client, model, contents, config))
+        tasks = {primary}
+        try:
+            hedge_after = self.latency.percentile(self.hedge_percentile, self.hedge_min_samples) if self.hedge else None
+            if hedge_after is not None and hedge_after < timeout:
+                await asyncio.wait(tasks, timeout=hedge_after)
+                if not primary.done() and self.limiter.try_acquire():
+                    self._stats["hedged"] += 1
+                    tasks.add(asyncio.create_task(self._single_request(client, model, contents, config)))
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = timeout - (time.monotonic() - started)
+                done, _ = await asyncio.wait(tasks, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The SDK call runs in a worker thread that cannot be interrupted; its result is dropped.
+            for task in tasks:
+                task.cancel()
+
+    def _give_up(self, last_error: Optional[Exception]) -> Exception:
+        self._stats["failures"] += 1
+        if _status_code(last_error) in FALLBACK_STATUS_CODES:
+            # No configured model exists: not a transient outage, so do not ask clients to retry
+            return last_error
+        retry_after = max(int(self.limiter.stats()["paused_seconds"]), 1)
+        return GeminiUnavailableError(f"Gemini unavailable after retries: {str(last_error) or type(last_error).__name__}", retry_after)
+
+    async def generate_content(self, client, contents, config=None) -> tuple[Any, str]:
+        """Returns (response, model that produced it).
+
+        ``contents`` may be a GeminiRequest, in which case ``config`` is ignored.
+        """
+        request = contents if isinstance(contents, GeminiRequest) else GeminiRequest(contents, config)
+        self._stats["calls"] += 1
+        deadline = time.monotonic() + cap_timeout(self.deadline)
+        last_error: Optional[Exception] = None
+        skip_model = None
+        for model, attempt in self._plan():
+            if model == skip_model:
+                continue
+            attempt_contents, attempt_config = await request.prepare(client, model)
+            if not await self._acquire(deadline):
+                break
+            self._stats["attempts"] += 1
+            try:
+                timeout = min(self.attempt_timeout, deadline - time.monotonic())
+                response = await self._attempt(client, model, attempt_contents, attempt_config, timeout)
+            except Exception as e:
+                last_error = e
+                if await request.on_failure(model, e):
+                    continue
+                outcome = await self._handle_failure(e, model, attempt, deadline)
+                if outcome == GIVE_UP:
+                    break
+                if outcome == NEXT_MODEL:
+                    skip_model = model
+                continue
+            self.limiter.on_success()
+            if model != self.model:
+                self._stats["fallbacks"] += 1
+            return response, model
+        raise self._give_up(last_error)
+
+    async def stream(self, client, contents, open_stream: Callable[..., AsyncIterator[str]]) -> AsyncIterator[tuple[str, str]]:
+        """Yield (model, text) chunks from ``open_stream(client, contents, model, config)``.
+
+        Failures before the first chunk are retried like ``generate_content``; once
+        text has been sent to the caller the stream cannot be replayed, so later
+        failures are raised. The wait for the first chunk and the gap between chunks
+        are each bounded by ``attempt_timeout`` and the deadline, so a stalled stream
+        raises ``TimeoutError`` (retried if nothing was sent yet). Streaming calls
+        are not hedged. ``contents`` may be a GeminiRequest.
+        """
+        request = contents if isinstance(contents, GeminiRequest) else GeminiRequest(contents)
+        self._stats["calls"] += 1
+        deadline = time.monotonic() + cap_timeout(self.deadline)
+        last_error: Optional[Exception] = None
+        skip_model = None
+        for model, attempt in self._plan():
+            if model == skip_model:
+                continue
+            attempt_contents, attempt_config = await request.prepare(client, model)
+            if not await self._acquire(deadline):
+                break
+            self._stats["attempts"] += 1
+            started_output = False
+            try:
+                async with aclosing(open_stream(client, attempt_contents, model, attempt_config)) as chunks:
+                    while True:
+                        try:
+                            async with asyncio.timeout(max(min(self.attempt_timeout, deadline - time.monotonic()), 0)):
+                                text = await anext(chunks)
+                        except StopAsyncIteration:
+                            break
+                        started_output = True
+                        yield model, text
+            except Exception as e:
+                if started_output:
+                    raise
+                last_error = e
+                if await request.on_failure(model, e):
+                    continue
+                outcome = await self._handle_failure(e, model, attempt, deadline)
+                if outcome == GIVE_UP:
+                    break
+                if outcome == NEXT_MODEL:
+                    skip_model = model
+                continue
+            self.limiter.on_success()
+            if model != self.model:
+                self._stats["fallbacks"] += 1
+            return
+        raise self._give_up(last_error)
+
+    def stats(self) -> dict:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "models": self.models,
+            **self._stats,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedging": self.hedge,
+            "limiter": self.limiter.stats(),
+        }
@@ -0,0 +1,439 @@
+"""
+Doctor Reception System - Summary Job Queue
+Submit/poll job API for summary generation with a local worker pool and a
+pluggable queue backend (in-memory or SQLite).
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+from typing import Any, Awaitable, Callable, Optional
+
+from structured_logging import set_request_id
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED)
+
+
+def new_job(request: dict, idempotency_key: Optional[str]) -> dict:
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "idempotency_key": idempotency_key,
+        "request": request,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class JobQueueBackend:
+    """Storage and hand-off for jobs. Subclasses implement the async methods below."""
+    name = "base"
+    lease_seconds = 0.0  # running jobs are leased (and renewed) only by backends shared between processes
+
+    async def enqueue(self, job: dict) -> None:
+        raise NotImplementedError
+
+    async def enqueue_once(self, job: dict) -> tuple[dict, bool]:
+        """Enqueue unless an unfailed job with the same idempotency key exists. Returns (job, created)."""
+        if job["idempotency_key"]:
+            existing = await self.find_by_idempotency_key(job["idempotency_key"])
+            if existing is not None and existing["status"] != FAILED:
+                return existing, False
+        await self.enqueue(job)
+        return job, True
+
+    async def dequeue(self) -> dict:
+        """Wait for the next queued job, mark it running and return it"""
+        raise NotImplementedError
+
+    async def renew(self, job_id: str) -> None:
+        """Extend the lease on a running job (backends shared between processes)"""
+        return None
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        raise NotImplementedError
+
+    async def find_by_idempotency_key(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def purge(self, older_than: float) -> int:
+        """Delete finished jobs last updated before the given timestamp"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
+
+
+class InMemoryJobQueue(JobQueueBackend):
+    """Single-process backend; jobs are lost on restart"""
+    name = "memory"
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._keys: dict[str, str] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def enqueue(self, job: dict) -> None:
+        self._jobs[job["id"]] = job
+        if job["idempotency_key"]:
+            self._keys[job["idempotency_key"]] = job["id"]
+        await self._queue.put(job["id"])
+
+    async def dequeue(self) -> dict:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == QUEUED:
+                job.update(status=RUNNING, updated_at=time.time())
+                return dict(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields, updated_at=time.time())
+
+    async def find_by_idempotency_key(self, key: str) -> Optional[dict]:
+        job_id = self._keys.get(key)
+        return await self.get(job_id) if job_id else None
+
+    async def purge(self, older_than: float) -> int:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in TERMINAL_STATUSES and job["updated_at"] < older_than
+        ]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job["idempotency_key"] and self._keys.get(job["idempotency_key"]) == job_id:
+                del self._keys[job["idempotency_key"]]
+        return len(expired)
+
+
+class SQLiteJobQueue(JobQueueBackend):
+    """SQLite-backed queue that survives restarts and can be shared by workers on one host.
+
+    Stands in for a Redis-style broker: workers claim jobs with an atomic UPDATE
+    and poll for new work, woken immediately for jobs enqueued in this process.
+    A claimed job is leased for ``lease_seconds`` and the lease is renewed while
+    it runs; a job whose lease expired (its process crashed or was killed) is
+    claimed again by the next worker that polls. Idempotency keys are unique, so
+    processes sharing the file cannot both create a job for the same key.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str, poll_interval: float, lease_seconds: float = 60):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = asyncio.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                idempotency_key TEXT,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        if "lease_expires_at" not in {column[1] for column in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        self._conn.execute("DROP INDEX IF EXISTS jobs_idempotency_key")
+        # Files written before keys were unique may hold duplicates; keep the key on the newest job only
+        self._conn.execute(
+            """
+            UPDATE jobs SET idempotency_key = NULL
+            WHERE idempotency_key IS NOT NULL AND rowid NOT IN (
+                SELECT MAX(rowid) FROM jobs WHERE idempotency_key IS NOT NULL GROUP BY idempotency_key
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency_key_unique ON jobs (idempotency_key) WHERE idempotency_key IS NOT NULL"
+        )
+
+    async def _run(self, func, *args):
+        # One connection, so serialise access and keep the blocking calls off the event loop.
+        async with self._lock:
+            call = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                # The thread cannot be interrupted; keep the lock until it finishes so
+                # close() (or the next call) never uses the connection concurrently.
+                await asyncio.wait({call})
+                raise
+
+    _COLUMNS = "id, status, idempotency_key, request, result, error, created_at, updated_at"
+
+    @staticmethod
+    def _row_to_job(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job_id, status, key, request, result, error, created_at, updated_at = row
+        return {
+            "id": job_id,
+            "status": status,
+            "idempotency_key": key,
+            "request": json.loads(request),
+            "result": json.loads(result) if result else None,
+            "error": json.loads(error) if error else None,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def _insert(self, job: dict, on_conflict: str = ""):
+        return self._conn.execute(
+            f"INSERT INTO jobs ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) {on_conflict} RETURNING {self._COLUMNS}",
+            (job["id"], job["status"], job["idempotency_key"], json.dumps(job["request"]),
+             None, None, job["created_at"], job["updated_at"]),
+        ).fetchone()
+
+    async def enqueue(self, job: dict) -> None:
+        await self._run(self._insert, job)
+        self._wakeup.set()
+
+    def _insert_once(self, job: dict) -> tuple[dict, bool]:
+        key = job["idempotency_key"]
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A failed job does not block a retry: release its key so the new job can take it
+            self._conn.execute("UPDATE jobs SET idempotency_key = NULL WHERE idempotency_key = ? AND status = ?", (key, FAILED))
+            row = self._insert(job, "ON CONFLICT DO NOTHING")
+            if row is None:
+                row = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE idempotency_key = ?", (key,)).fetchone()
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return self._row_to_job(row), row[0] == job["id"]
+
+    async def enqueue_once(self, job: dict) -> tuple[dict, bool]:
+        if not job["idempotency_key"]:
+            await self.enqueue(job)
+            return job, True
+        stored, created = await self._run(self._insert_once, job)
+        if created:
+            self._wakeup.set()
+        return stored, created
+
+    def _claim_next(self) -> Optional[dict]:
+        now = time.time()
+        candidate = self._conn.execute(
+            """
+            SELECT id, status FROM jobs
+            WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+            ORDER BY created_at LIMIT 1
+            """,
+            (QUEUED, RUNNING, now),
+        ).fetchone()
+        if candidate is None:
+            return None
+        job_id, status = candidate
+        # Re-checked in the UPDATE so only one process wins the job
+        row = self._conn.execute(
+            f"""
+            UPDATE jobs SET status = ?, updated_at = ?, lease_expires_at = ?
+            WHERE id = ? AND (status = ? OR (status = ? AND lease_expires_at < ?))
+            RETURNING {self._COLUMNS}
+            """,
+            (RUNNING, now, now + self.lease_seconds, job_id, QUEUED, RUNNING, now),
+        ).fetchone()
+        if row is not None and status == RUNNING:
+            logger.warning(f"♻️ Job {job_id} was left running by a worker that stopped renewing it, running it again")
+        return self._row_to_job(row)
+
+    async def dequeue(self) -> dict:
+        while True:
+            job = await self._run(self._claim_next)
+            if job is not None:
+                return job
+            self._wakeup.clear()
+            # asyncio.timeout rather than wait_for: on 3.11 wait_for can swallow a
+            # cancellation that lands as the event fires, and stop() would never return.
+            try:
+                async with asyncio.timeout(self.poll_interval):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    async def renew(self, job_id: str) -> None:
+        await self._run(
+            self._conn.execute,
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ?",
+            (time.time() + self.lease_seconds, job_id, RUNNING),
+        )
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        row = await self._run(lambda: self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        return self._row_to_job(row)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        for column in ("request", "result", "error"):
+            if column in fields and fields[column] is not None:
+                fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        await self._run(
+            self._conn.execute,
+            f"UPDATE jobs SET {assignments} WHERE id = ?",
+            (*fields.values(), job_id),
+        )
+
+    async def find_by_idempotency_key(self, key: str) -> Optional[dict]:
+        row = await self._run(lambda: self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE idempotency_key = ? ORDER BY created_at DESC LIMIT 1", (key,)
+        ).fetchone())
+        return self._row_to_job(row)
+
+    async def purge(self, older_than: float) -> int:
+        cursor = await self._run(
+            self._conn.execute,
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (*TERMINAL_STATUSES, older_than),
+        )
+        return cursor.rowcount
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+
+
+def build_job_queue(backend: str, sqlite_path: str, poll_interval: float, lease_seconds: float = 60) -> JobQueueBackend:
+    """Create the backend selected by JOB_QUEUE_BACKEND (memory or sqlite)"""
+    backend = (backend or "memory").lower()
+    if backend == "sqlite":
+        return SQLiteJobQueue(sqlite_path, poll_interval, lease_seconds)
+    if backend != "memory":
+        logger.warning(f"⚠️ Unknown JOB_QUEUE_BACKEND '{backend}', using in-memory queue")
+    return InMemoryJobQueue()
+
+
+class JobManager:
+    """Runs queued summary jobs on a fixed number of local workers.
+
+    ``handler`` receives the stored request dict and returns a JSON-serialisable
+    result. Exceptions are recorded on the job with their ``status_code`` and
+    ``detail`` when present (e.g. FastAPI's HTTPException), 500 otherwise.
+    """
+    def __init__(
+        self,
+        backend: JobQueueBackend,
+        handler: Callable[[dict], Awaitable[dict]],
+        concurrency: int,
+        result_ttl: float,
+        poll_interval: float,
+    ):
+        self.backend = backend
+        self.handler = handler
+        self.concurrency = max(concurrency, 1)
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._workers: list[asyncio.Task] = []
+        self._finished: dict[str, asyncio.Event] = {}
+        self._stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0, "running": 0}
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker(n)) for n in range(self.concurrency)]
+            logger.info(f"✅ Job workers started ({self.concurrency} x {self.backend.name} queue)")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.backend.close()
+
+    async def submit(self, request: dict, idempotency_key: Optional[str] = None) -> tuple[dict, bool]:
+        """Queue a job. Returns (job, created); an existing unfailed job with the same key is returned as-is."""
+        await self.backend.purge(time.time() - self.result_ttl)
+        job, created = await self.backend.enqueue_once(new_job(request, idempotency_key))
+        self._stats["submitted" if created else "deduplicated"] += 1
+        return job, created
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.backend.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Long-poll: return the job once it finishes or the timeout passes"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.backend.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in TERMINAL_STATUSES or remaining <= 0:
+                if job is None or job["status"] in TERMINAL_STATUSES:
+                    self._finished.pop(job_id, None)
+                return job
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                # Woken at once by local workers; polling covers workers in other processes.
+                async with asyncio.timeout(min(remaining, self.poll_interval)):
+                    await event.wait()
+            except TimeoutError:
+                pass
+
+    async def _worker(self, worker_number: int):
+        while True:
+            job = await self.backend.dequeue()
+            self._stats["running"] += 1
+            set_request_id(job["id"])
+            logger.info(f"🛠️ Worker {worker_number} running job {job['id']}")
+            heartbeat = asyncio.create_task(self._renew_lease(job["id"]))
+            try:
+                result = await self.handler(job["request"])
+                await self.backend.update(job["id"], status=SUCCEEDED, result=result)
+                self._stats["succeeded"] += 1
+            except asyncio.CancelledError:
+                await self.backend.update(job["id"], status=QUEUED)
+                raise
+            except Exception as e:
+                error = {"status_code": getattr(e, "status_code", 500), "detail": getattr(e, "detail", str(e))}
+                logger.error(f"❌ Job {job['id']} failed: {error['detail']}")
+                await self.backend.update(job["id"], status=FAILED, error=error)
+                self._stats["failed"] += 1
+            finally:
+                heartbeat.cancel()
+                self._stats["running"] -= 1
+                event = self._finished.pop(job["id"], None)
+                if event is not None:
+                    event.set()
+
+    async def _renew_lease(self, job_id: str):
+        interval = self.backend.lease_seconds / 3
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.backend.renew(job_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not renew the lease on job {job_id}: {e}")
+
+    def stats(self) -> dict:
+        return {"backend": self.backend.name, "workers": len(self._workers), **self._stats}
@@ -3,37 +3,273 @@ Doctor Reception System - Python Backend
 Using FastAPI and Google Gemini 2.5 Flash Preview with Base64 Inline Data
 """
 
+from __future__ import annotations
+
+import time
+_IMPORT_STARTED = time.perf_counter()  # app import time is reported under "startup" in /health
+
 import os
 import logging
 import mimetypes
 import asyncio
-from typing import List, Optional, Tuple, Any # Added Any for gather results
-from fastapi import FastAPI, HTTPException
+import json
+import threading
+import struct
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager, contextmanager, nullcontext
+from typing import AsyncIterator, List, Optional, Tuple, Any # Added Any for gather results
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import httpx
 import tempfile
 # import aiofiles # Removed as it's not used
 from datetime import datetime
 from urllib.parse import urlparse
-import ffmpeg
 import io
-from PIL import Image
-from google import genai
-from google.genai import types # Correctly placed at top level
+from media_cache import CachedMedia, build_media_cache, media_cache_key
+from jobs import JobManager, build_job_queue
+from rate_limit import AdaptiveTokenBucket, TokenBucket
+from gemini_calls import GeminiCaller, GeminiUnavailableError
+from prompt_cache import PromptCache
+from deadlines import DeadlineExceededError, cap_timeout, deadline_exceeded, start_deadline, time_left
+from metrics import (
+    AUDIO_COMPACTION_RATIO, BYTES_DOWNLOADED, BYTES_SENT_TO_MODEL, FILE_TASKS_CANCELLED, SUMMARY_REQUESTS,
+    copy_file_timings, file_scope, record_file_detail, render_metrics, request_file_details, stage_timer,
+    start_request_timings, stats_collector, timing_breakdown,
+)
+from resumable_download import Download, DownloadIntegrityError, DownloadTooLargeError, ResumableBody, fetch_object
+from structured_logging import RequestIdMiddleware, configure_logging, get_request_id, parse_sample_rates, set_request_id
+from startup import available_cpus, lazy_module, load_modules, process_age, record_step, startup_timings, timed_step
+
+# Load environment variables from a .env file (local development). Deployments set
+# real environment variables, so python-dotenv is only imported when there is one.
+def _find_dotenv() -> Optional[str]:
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+DOTENV_PATH = _find_dotenv()
+if DOTENV_PATH:
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
 
-# Load environment variables
-load_dotenv()
+# Heavy modules are imported on first use, or by the startup warm-up, so a worker
+# imports the app and answers /health without waiting for them. LAZY_IMPORTS=false
+# imports them up front (to compare cold starts).
+LAZY_IMPORTS = os.getenv("LAZY_IMPORTS", "true").lower() in ("1", "true", "yes")
+genai = lazy_module("google.genai", LAZY_IMPORTS)
+types = lazy_module("google.genai.types", LAZY_IMPORTS)
+ffmpeg = lazy_module("ffmpeg", LAZY_IMPORTS)
+Image = lazy_module("PIL.Image", LAZY_IMPORTS)
+ImageOps = lazy_module("PIL.ImageOps", LAZY_IMPORTS)
+requests = lazy_module("requests", LAZY_IMPORTS)
+audio_compaction = lazy_module("audio_compaction", LAZY_IMPORTS)  # NumPy
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Records are written by a background thread (never on the event loop), tagged with
+# the request id, as JSON lines by default. LOG_SAMPLE_RATES keeps a fraction of the
+# INFO lines of busy stages, e.g. "download=0.1,file=0.1"; warnings are always kept.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json or text
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+log_listener = configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES)
 logger = logging.getLogger(__name__)
 
+# Worker processes serving this instance (set by serve.py). Budgets that are
+# instance-wide (Gemini and batch rate limits, CPU pools, the memory cache) are
+# divided between them so N workers do not use N times the configured amount.
+SERVER_WORKERS = max(int(os.getenv("SERVER_WORKERS", "1")), 1)
+INSTANCE_CPUS = available_cpus()
+
+def per_worker(value):
+    """This worker's share of an instance-wide budget; 0 (disabled) stays 0"""
+    if value <= 0 or SERVER_WORKERS == 1:
+        return value
+    if isinstance(value, int):
+        return max(value // SERVER_WORKERS, 1)
+    return value / SERVER_WORKERS
+
+# Models used for summary generation. Fallbacks are tried in order once retries
+# on the primary model are exhausted or it is unavailable to this key.
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_FALLBACK_MODELS = [m.strip() for m in os.getenv("GEMINI_FALLBACK_MODELS", "gemini-2.0-flash-lite").split(",") if m.strip()]
+
+# Gemini client configuration
+# Alternative API endpoint, e.g. a proxy or the local stand-in used by benchmarks/load_test.py
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+GEMINI_HTTP_POOL_SIZE = int(os.getenv("GEMINI_HTTP_POOL_SIZE", "32"))
+# The SDK runs its blocking HTTP calls through asyncio.to_thread, so the default
+# executor size caps concurrent Gemini calls (the stock default is cpu_count + 4).
+BLOCKING_IO_THREADS = int(os.getenv("BLOCKING_IO_THREADS", "64"))
+
+# Gemini rate limiting and retries (shared by all requests on the instance)
+GEMINI_RATE_PER_MINUTE = per_worker(float(os.getenv("GEMINI_RATE_PER_MINUTE", "600")))  # ceiling; halved on each 429, 0 disables
+GEMINI_MIN_RATE_PER_MINUTE = per_worker(float(os.getenv("GEMINI_MIN_RATE_PER_MINUTE", "30")))
+GEMINI_RATE_BURST = per_worker(int(os.getenv("GEMINI_RATE_BURST", "20")))
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))  # per model
+GEMINI_RETRY_BASE_DELAY_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_DELAY_SECONDS", "0.5"))
+GEMINI_RETRY_MAX_DELAY_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_DELAY_SECONDS", "8"))
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "150"))  # all attempts, all models
+GEMINI_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "90"))
+GEMINI_HEDGE_REQUESTS = os.getenv("GEMINI_HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.95"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+
+# Request deadlines and partial results
+# Time budget for one summary request across downloads, ffmpeg and Gemini calls.
+# Callers can ask for less with the X-Request-Timeout header (seconds). 0 disables.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "240"))
+# What a failed file does to the request: require_primary (a failed primary audio fails
+# it), require_all (any failure does) or best_effort (summarise whatever succeeded).
+# A required file failing cancels the remaining downloads and conversions straight away.
+PARTIAL_RESULT_POLICY = os.getenv("PARTIAL_RESULT_POLICY", "require_primary").lower()
+if PARTIAL_RESULT_POLICY not in ("require_primary", "require_all", "best_effort"):
+    logger.warning(f"⚠️ Unknown PARTIAL_RESULT_POLICY '{PARTIAL_RESULT_POLICY}', using require_primary")
+    PARTIAL_RESULT_POLICY = "require_primary"
+
+# Media download client configuration
+DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", "30"))
+DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "100"))
+DOWNLOAD_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_KEEPALIVE_CONNECTIONS", "20"))
+DOWNLOAD_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("DOWNLOAD_KEEPALIVE_EXPIRY_SECONDS", "60"))
+DOWNLOAD_MAX_CONNECTIONS_PER_HOST = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS_PER_HOST", "10"))
+DOWNLOAD_HTTP2 = os.getenv("DOWNLOAD_HTTP2", "true").lower() in ("1", "true", "yes")
+# Objects above this size are refused, checked against Content-Length and while streaming. 0 disables.
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(256 * 1024 * 1024)))
+# Buffered downloads larger than one part are fetched as parallel byte ranges. 0 disables.
+DOWNLOAD_RANGE_PART_BYTES = int(os.getenv("DOWNLOAD_RANGE_PART_BYTES", str(8 * 1024 * 1024)))
+DOWNLOAD_RANGE_CONCURRENCY = int(os.getenv("DOWNLOAD_RANGE_CONCURRENCY", "4"))  # ranges in flight per object
+DOWNLOAD_MAX_RESUMES = int(os.getenv("DOWNLOAD_MAX_RESUMES", "3"))  # Range resumes per response after a dropped connection
+DOWNLOAD_VERIFY_CHECKSUM = os.getenv("DOWNLOAD_VERIFY_CHECKSUM", "true").lower() in ("1", "true", "yes")
+
+# Audio transcoding configuration
+AUDIO_STREAMING_MODE = os.getenv("AUDIO_STREAMING_MODE", "true").lower() in ("1", "true", "yes")
+AUDIO_STREAM_CHUNK_SIZE = int(os.getenv("AUDIO_STREAM_CHUNK_SIZE", str(64 * 1024)))
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_OUTPUT_CODEC = os.getenv("AUDIO_OUTPUT_CODEC", "opus").lower()  # wav, flac, opus or mp3
+AUDIO_OUTPUT_BITRATE = os.getenv("AUDIO_OUTPUT_BITRATE", "")  # overrides the lossy codec default, e.g. "32k"
+AUDIO_PASSTHROUGH = os.getenv("AUDIO_PASSTHROUGH", "true").lower() in ("1", "true", "yes")
+# Output codecs Gemini accepts for audio. "wav" is raw PCM that gets a WAV header added.
+AUDIO_CODECS = {
+    "wav": {"mime_type": "audio/wav", "output": {"format": "s16le", "acodec": "pcm_s16le"}},
+    "flac": {"mime_type": "audio/flac", "output": {"format": "flac", "acodec": "flac"}},
+    "opus": {"mime_type": "audio/ogg", "output": {"format": "ogg", "acodec": "libopus", "audio_bitrate": "24k", "application": "voip", "compression_level": 0}},
+    "mp3": {"mime_type": "audio/mp3", "output": {"format": "mp3", "acodec": "libmp3lame", "audio_bitrate": "32k"}},
+}
+if AUDIO_OUTPUT_CODEC not in AUDIO_CODECS:
+    logger.warning(f"⚠️ Unknown AUDIO_OUTPUT_CODEC '{AUDIO_OUTPUT_CODEC}', using wav")
+    AUDIO_OUTPUT_CODEC = "wav"
+# Silence removal: drop long silent stretches from the decoded 16kHz PCM before encoding.
+# Needs decoded audio, so compressed uploads are transcoded instead of passed through.
+AUDIO_SILENCE_REMOVAL = os.getenv("AUDIO_SILENCE_REMOVAL", "false").lower() in ("1", "true", "yes")
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-45"))
+AUDIO_SILENCE_NOISE_MARGIN_DB = float(os.getenv("AUDIO_SILENCE_NOISE_MARGIN_DB", "8"))
+AUDIO_SILENCE_MIN_MS = int(os.getenv("AUDIO_SILENCE_MIN_MS", "700"))
+AUDIO_SILENCE_PADDING_MS = int(os.getenv("AUDIO_SILENCE_PADDING_MS", "200"))
+AUDIO_SILENCE_MIN_KEEP_RATIO = float(os.getenv("AUDIO_SILENCE_MIN_KEEP_RATIO", "0.1"))  # below this the audio is sent untrimmed
+# Long-recording chunking: recordings longer than AUDIO_CHUNKING_MIN_SECONDS are split
+# at pauses into overlapping chunks that are transcribed in parallel; the summary is
+# then generated from the merged transcript.
+AUDIO_CHUNKING = os.getenv("AUDIO_CHUNKING", "false").lower() in ("1", "true", "yes")
+AUDIO_CHUNKING_MIN_SECONDS = float(os.getenv("AUDIO_CHUNKING_MIN_SECONDS", "600"))
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "180"))
+AUDIO_CHUNK_OVERLAP_SECONDS = float(os.getenv("AUDIO_CHUNK_OVERLAP_SECONDS", "2"))
+AUDIO_CHUNK_SEARCH_SECONDS = float(os.getenv("AUDIO_CHUNK_SEARCH_SECONDS", "20"))  # how far from the nominal cut to look for a pause
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "8"))  # chunk transcriptions in flight per instance
+# Compressed uploads Gemini can read directly, mapped to the MIME type it expects.
+# Browser recordings (WebM/Opus) are not on the list and always get transcoded.
+PASSTHROUGH_AUDIO_MIME_TYPES = {
+    "audio/mpeg": "audio/mp3", "audio/mp3": "audio/mp3", "audio/aac": "audio/aac",
+    "audio/ogg": "audio/ogg", "audio/flac": "audio/flac", "audio/x-flac": "audio/flac",
+}
+# Containers whose index may sit at the end of the file cannot be decoded from
+# a pipe, so they always take the buffered tempfile path.
+NON_STREAMABLE_AUDIO_MIME_TYPES = {"audio/mp4", "audio/x-m4a", "audio/m4a", "video/mp4", "video/quicktime"}
+
+# Conversion executor configuration
+CONVERSION_WORKERS = per_worker(int(os.getenv("CONVERSION_WORKERS", str(INSTANCE_CPUS))))
+FFMPEG_MAX_CONCURRENCY = per_worker(int(os.getenv("FFMPEG_MAX_CONCURRENCY", str(INSTANCE_CPUS))))
+CONVERSION_MAX_QUEUE = int(os.getenv("CONVERSION_MAX_QUEUE", "64"))
+CONVERSION_RETRY_AFTER_SECONDS = int(os.getenv("CONVERSION_RETRY_AFTER_SECONDS", "5"))
+IMAGE_CONVERSION_MODE = os.getenv("IMAGE_CONVERSION_MODE", "process")  # process or thread
+
+# Image conversion configuration
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "jpeg").lower()  # jpeg, webp or png
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "85"))  # jpeg/webp only
+IMAGE_MAX_SIZE = int(os.getenv("IMAGE_MAX_SIZE", "1024"))
+# Uploads already in a format Gemini reads, within IMAGE_MAX_SIZE, upright and at most
+# this many bytes are sent as-is instead of being re-encoded (0 disables).
+IMAGE_PASSTHROUGH_MAX_BYTES = int(os.getenv("IMAGE_PASSTHROUGH_MAX_BYTES", str(512 * 1024)))
+IMAGE_FORMATS = {
+    "jpeg": {"pil_format": "JPEG", "mime_type": "image/jpeg", "modes": ("RGB", "L")},
+    "webp": {"pil_format": "WEBP", "mime_type": "image/webp", "modes": ("RGB", "RGBA", "L")},
+    "png": {"pil_format": "PNG", "mime_type": "image/png", "modes": ("RGB", "RGBA", "L", "LA", "P")},
+}
+if IMAGE_OUTPUT_FORMAT not in IMAGE_FORMATS:
+    logger.warning(f"⚠️ Unknown IMAGE_OUTPUT_FORMAT '{IMAGE_OUTPUT_FORMAT}', using jpeg")
+    IMAGE_OUTPUT_FORMAT = "jpeg"
+PASSTHROUGH_IMAGE_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+# Gemini Files API configuration
+# Payloads above this size are uploaded through the Files API instead of being base64-inlined.
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Uploaded files are reused across regenerations for this long (the API keeps them for 48h).
+GEMINI_FILE_REUSE_TTL_SECONDS = int(os.getenv("GEMINI_FILE_REUSE_TTL_SECONDS", str(6 * 60 * 60)))
+GEMINI_FILE_CLEANUP_INTERVAL_SECONDS = int(os.getenv("GEMINI_FILE_CLEANUP_INTERVAL_SECONDS", "600"))
+GEMINI_FILE_ACTIVE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_FILE_ACTIVE_TIMEOUT_SECONDS", "60"))
+
+# Summary prompt caching
+# Rendered prompts are memoized per (template config, submitted_by).
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1024"))
+# Also register each prompt as Gemini cached content and send a reference instead of
+# the prompt. The API only caches inputs above a minimum token count (thousands of
+# tokens depending on the model); shorter prompts keep being sent inline.
+GEMINI_PROMPT_CACHE = os.getenv("GEMINI_PROMPT_CACHE", "false").lower() in ("1", "true", "yes")
+GEMINI_PROMPT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_PROMPT_CACHE_TTL_SECONDS", "3600"))
+GEMINI_PROMPT_CACHE_REFRESH_SECONDS = int(os.getenv("GEMINI_PROMPT_CACHE_REFRESH_SECONDS", "600"))  # extend the TTL when used this close to expiry
+GEMINI_PROMPT_CACHE_RETRY_SECONDS = int(os.getenv("GEMINI_PROMPT_CACHE_RETRY_SECONDS", "3600"))  # after a failed create
+
+# Summary job queue configuration
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")  # memory or sqlite
+JOB_QUEUE_SQLITE_PATH = os.getenv("JOB_QUEUE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "doctor-recep-jobs.sqlite3"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "60"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "0.5"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # sqlite: running jobs of a dead worker are retried after this
+
+# Converted media cache configuration
+MEDIA_CACHE_BACKEND = os.getenv("MEDIA_CACHE_BACKEND", "memory")  # none, memory, disk or tiered
+MEDIA_CACHE_MEMORY_MAX_BYTES = per_worker(int(os.getenv("MEDIA_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024))))
+# Workers share the directory but each indexes and evicts its own entries, so each gets a share of the budget
+MEDIA_CACHE_DISK_MAX_BYTES = per_worker(int(os.getenv("MEDIA_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024))))
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "doctor-recep-media-cache"))
+
+# Batch summary configuration
+BATCH_MAX_CONSULTATIONS = int(os.getenv("BATCH_MAX_CONSULTATIONS", "50"))
+# Distinct media files downloaded/converted at once per batch; keeps a large batch
+# from overflowing the conversion queue (CONVERSION_MAX_QUEUE).
+BATCH_MEDIA_CONCURRENCY = int(os.getenv("BATCH_MEDIA_CONCURRENCY", "16"))
+# Shared by all batches on the instance
+BATCH_GEMINI_CONCURRENCY = per_worker(int(os.getenv("BATCH_GEMINI_CONCURRENCY", "8")))
+BATCH_GEMINI_RATE_PER_MINUTE = per_worker(float(os.getenv("BATCH_GEMINI_RATE_PER_MINUTE", "0")))  # 0 disables the limit
+BATCH_GEMINI_BURST = per_worker(int(os.getenv("BATCH_GEMINI_BURST", "0"))) or BATCH_GEMINI_CONCURRENCY
+
+# Startup warm-up: after startup, load the lazily imported modules and prime the
+# Gemini client, the ffmpeg binary and codecs, and PIL in the conversion workers
+# in the background, so /health answers at once and the first request does not
+# pay for them. When disabled the Gemini client is built during startup instead.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Doctor Reception API",
@@ -48,44 +284,592 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Outermost, so every log line of a request (CORS included) carries its id
+app.add_middleware(RequestIdMiddleware)
+
+# Shared Gemini client
+def _install_pooled_transport(client, pool_size: int) -> bool:
+    """Route the client's API-key requests through one pooled requests.Session.
+
+    google-genai 0.3.0 opens a new requests.Session, and with it a new TCP+TLS
+    connection, for every API call. This swaps in an equivalent request method
+    backed by a shared keep-alive pool. Returns False (leaving the SDK untouched)
+    if the SDK internals are not the ones this was written against.
+    """
+    try:
+        from google.genai import _api_client, errors as genai_errors
+        api_client = client._api_client
+        if api_client.vertexai or not hasattr(api_client, "_request_unauthorized"):
+            return False
+    except (ImportError, AttributeError):
+        return False
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    def _request_unauthorized(http_request, stream=False):
+        data = None
+        if http_request.data:
+            if not isinstance(http_request.data, bytes):
+                data = json.dumps(http_request.data, cls=_api_client.RequestJsonEncoder)
+            else:
+                data = http_request.data
+        response = session.request(
+            http_request.method, http_request.url, headers=http_request.headers, data=data, stream=stream
+        )
+        genai_errors.APIError.raise_for_response(response)
+        return _api_client.HttpResponse(response.headers, response if stream else [response.text])
+
+    api_client._request_unauthorized = _request_unauthorized
+    return True
+
 
-# Context manager for Gemini client
 class GeminiClientManager:
-    """Context manager for Gemini client"""
-    def __init__(self, api_key: str):
+    """Owns the app-wide Gemini client.
+
+    The client is built once at startup (warm) and handed to every request by
+    ``async with gemini_manager as client``. Construction time and per-request
+    acquire overhead are recorded for /health.
+    """
+    def __init__(self, api_key: str, pool_size: int, base_url: str = ""):
         self.api_key = api_key
+        self.pool_size = pool_size
+        self.base_url = base_url
         self.client = None
+        self.pooled_transport = False
+        self.error: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._stats = {"init_ms": None, "initialized_at": None, "acquires": 0, "acquire_seconds_total": 0.0}
+
+    async def start(self):
+        """Build the shared client; failures are recorded and retried on next use"""
+        async with self._lock:
+            if self.client is not None:
+                return self.client
+            started = time.perf_counter()
+            try:
+                http_options = {"base_url": self.base_url} if self.base_url else None
+                client = await asyncio.to_thread(genai.Client, api_key=self.api_key, http_options=http_options)
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"❌ Failed to initialize Gemini client: {e}")
+                raise
+            self.pooled_transport = _install_pooled_transport(client, self.pool_size)
+            self.client = client
+            self.error = None
+            self._stats["init_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self._stats["initialized_at"] = datetime.now().isoformat()
+            logger.info(f"✅ Gemini client initialized in {self._stats['init_ms']} ms (pooled transport: {self.pooled_transport})")
+            return client
 
     async def __aenter__(self):
-        try:
-            # This instantiation is synchronous. If it ever becomes blocking,
-            # it might need to be wrapped in asyncio.to_thread as well.
-            # For now, SDK client instantiations are typically lightweight.
-            self.client = genai.Client(api_key=self.api_key)
-            logger.info("✅ Gemini client initialized successfully")
-            return self.client
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Gemini client: {e}")
-            raise
+        started = time.perf_counter()
+        client = self.client if self.client is not None else await self.start()
+        self._stats["acquires"] += 1
+        self._stats["acquire_seconds_total"] += time.perf_counter() - started
+        return client
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        if self.client:
-            # The google-generativeai client typically manages its own connections.
-            # client.aio (AsyncGenerativeModel) does not have a .close() method.
-            # Explicitly closing might not be necessary or supported this way.
-            # If specific cleanup is needed, refer to SDK documentation.
-            # Commenting out the erroneous close call.
-            # try:
-            #     await self.client.aio.close() # This line caused an AttributeError
-            #     logger.info("✅ Gemini client closed successfully")
-            # except Exception as e:
-            #     logger.error(f"❌ Error closing Gemini client: {e}")
-            logger.info("✅ Gemini client manager exiting.")
+        # The client is shared for the app lifetime; nothing to release per request.
+        return False
+
+    def stats(self) -> dict:
+        acquires = self._stats["acquires"]
+        return {
+            "state": "ready" if self.client is not None else ("error" if self.error else "not_initialized"),
+            "error": self.error,
+            "pooled_transport": self.pooled_transport,
+            "init_ms": self._stats["init_ms"],
+            "initialized_at": self._stats["initialized_at"],
+            "requests_served": acquires,
+            "avg_acquire_us": round(self._stats["acquire_seconds_total"] / acquires * 1e6, 2) if acquires else 0.0,
+        }
 
 
 # Initialize Gemini client manager
-gemini_manager = GeminiClientManager(api_key=os.getenv("GEMINI_API_KEY"))
+gemini_manager = GeminiClientManager(
+    api_key=os.getenv("GEMINI_API_KEY"), pool_size=GEMINI_HTTP_POOL_SIZE, base_url=GEMINI_BASE_URL
+)
+
+# Rate limiting, retries, hedging and model fallback for every summary call
+gemini_caller = GeminiCaller(
+    models=[GEMINI_MODEL] + [m for m in GEMINI_FALLBACK_MODELS if m != GEMINI_MODEL],
+    limiter=AdaptiveTokenBucket(GEMINI_RATE_PER_MINUTE, GEMINI_RATE_BURST, GEMINI_MIN_RATE_PER_MINUTE),
+    max_attempts=GEMINI_MAX_ATTEMPTS,
+    base_delay=GEMINI_RETRY_BASE_DELAY_SECONDS,
+    max_delay=GEMINI_RETRY_MAX_DELAY_SECONDS,
+    deadline=GEMINI_DEADLINE_SECONDS,
+    attempt_timeout=GEMINI_ATTEMPT_TIMEOUT_SECONDS,
+    hedge=GEMINI_HEDGE_REQUESTS,
+    hedge_percentile=GEMINI_HEDGE_PERCENTILE,
+    hedge_min_samples=GEMINI_HEDGE_MIN_SAMPLES,
+)
+
+# Shared HTTP client for media downloads
+class DownloadClientManager:
+    """App-lifetime pooled HTTP client for downloading media from storage.
+
+    One client is opened at startup and closed at shutdown so downloads from the
+    same storage host reuse keep-alive (or HTTP/2 multiplexed) connections
+    instead of paying a TCP+TLS handshake per file. Media bodies are size-capped,
+    verified and resumed with Range requests after dropped connections, and large
+    buffered downloads are split into parallel ranges (see resumable_download).
+    """
+    def __init__(
+        self,
+        timeout: float,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        max_connections_per_host: int,
+        http2: bool,
+        max_bytes: int = 0,
+        range_part_bytes: int = 0,
+        range_concurrency: int = 4,
+        max_resumes: int = 3,
+        verify_checksum: bool = True,
+    ):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.range_part_bytes = range_part_bytes
+        self.range_concurrency = range_concurrency
+        self.max_resumes = max_resumes
+        self.verify_checksum = verify_checksum
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self.http2 = http2
+        self.http2_enabled = False
+        self.client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: dict[str, asyncio.Semaphore] = {}
+        self._stats = {
+            "requests": 0, "new_connections": 0, "errors": 0, "bytes": 0,
+            "ranged_downloads": 0, "range_requests": 0, "resumes": 0, "too_large": 0, "integrity_errors": 0,
+        }
+        self._host_stats: dict[str, dict] = {}
+
+    async def start(self):
+        if self.client is not None:
+            return
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401  (required by httpx for HTTP/2)
+            except ImportError:
+                logger.warning("⚠️ h2 package not installed, falling back to HTTP/1.1 for downloads")
+                http2 = False
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=self.limits,
+            http2=http2,
+            follow_redirects=True,
+        )
+        self.http2_enabled = http2
+        logger.info(
+            f"✅ Download client started (HTTP/2: {http2}, max connections: {self.limits.max_connections}, "
+            f"per host: {self.max_connections_per_host})"
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info("✅ Download client closed.")
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _host_counters(self, host: str) -> dict:
+        counters = self._host_stats.get(host)
+        if counters is None:
+            counters = {"requests": 0, "new_connections": 0, "in_flight": 0}
+            self._host_stats[host] = counters
+        return counters
+
+    def _trace_hook(self, counters: dict):
+        async def trace(event_name: str, info: dict):
+            # httpcore only emits connect_tcp when it opens a new connection,
+            # so every other request on this host reused a pooled one.
+            if event_name == "connection.connect_tcp.complete":
+                self._stats["new_connections"] += 1
+                counters["new_connections"] += 1
+        return trace
+
+    @asynccontextmanager
+    async def stream(
+        self, url: str, method: str = "GET", headers: Optional[dict] = None, reuse_slot: bool = False
+    ) -> AsyncIterator[httpx.Response]:
+        """Open a streamed request through the shared pool, capped per host.
+
+        The body is not read; callers consume it with ``aiter_bytes``/``aread``
+        while the per-host slot is held. ``reuse_slot`` skips the cap for a request
+        made while the caller already holds a slot (resuming an interrupted body).
+        """
+        if self.client is None:
+            # Not started through the app lifecycle (e.g. scripts); start lazily.
+            await self.start()
+        host = urlparse(url).netloc
+        counters = self._host_counters(host)
+
+        async with nullcontext() if reuse_slot else self._host_semaphore(host):
+            self._stats["requests"] += 1
+            counters["requests"] += 1
+            counters["in_flight"] += 1
+            try:
+                async with self.client.stream(
+                    method, url, headers=headers, timeout=cap_timeout(self.timeout),
+                    extensions={"trace": self._trace_hook(counters)},
+                ) as response:
+                    try:
+                        yield response
+                    finally:
+                        self._stats["bytes"] += response.num_bytes_downloaded
+                        BYTES_DOWNLOADED.inc(response.num_bytes_downloaded)
+            except httpx.HTTPError:
+                self._stats["errors"] += 1
+                raise
+            finally:
+                counters["in_flight"] -= 1
+
+    def _body_options(self) -> dict:
+        return {"max_bytes": self.max_bytes, "max_resumes": self.max_resumes, "verify_checksum": self.verify_checksum}
+
+    @contextmanager
+    def _count_failures(self):
+        try:
+            yield
+        except DownloadTooLargeError:
+            self._stats["too_large"] += 1
+            raise
+        except DownloadIntegrityError:
+            self._stats["integrity_errors"] += 1
+            raise
+
+    @asynccontextmanager
+    async def open(self, url: str) -> AsyncIterator[ResumableBody]:
+        """GET a whole object as a size-capped body that resumes after dropped connections."""
+        with self._count_failures():
+            async with self.stream(url) as response:
+                response.raise_for_status()
+                body = ResumableBody(self.stream, url, response, **self._body_options())
+                try:
+                    yield body
+                finally:
+                    self._stats["resumes"] += body.resumes
+                    await body.aclose()
+
+    def use_ranges(self, body: ResumableBody) -> bool:
+        """Whether an opened body is worth re-fetching as parallel ranges before reading it whole"""
+        return bool(self.range_part_bytes) and body.resumable and (body.length or 0) > self.range_part_bytes
+
+    async def fetch(self, url: str) -> Download:
+        """Download a whole object, as parallel byte ranges when it is larger than one part."""
+        with self._count_failures():
+            download = await fetch_object(
+                self.stream, url, self.range_part_bytes, self.range_concurrency, **self._body_options()
+            )
+        self._stats["resumes"] += download.resumes
+        if download.ranges > 1:
+            self._stats["ranged_downloads"] += 1
+            self._stats["range_requests"] += download.ranges
+        return download
+
+    async def head(self, url: str) -> httpx.Response:
+        """HEAD a URL through the shared pool (used for cache validators)."""
+        async with self.stream(url, method="HEAD") as response:
+            # Consume the (empty) body; an unread response closes its connection instead of returning it to the pool
+            await response.aread()
+        return response
+
+    def stats(self) -> dict:
+        """Connection-reuse metrics for the download pool."""
+        requests_made = self._stats["requests"]
+        reused = max(requests_made - self._stats["new_connections"], 0)
+        return {
+            **self._stats,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / requests_made, 3) if requests_made else 0.0,
+            "http2": self.http2_enabled,
+            "hosts": {host: dict(counters) for host, counters in self._host_stats.items()},
+        }
+
+
+download_manager = DownloadClientManager(
+    timeout=DOWNLOAD_TIMEOUT_SECONDS,
+    max_connections=DOWNLOAD_MAX_CONNECTIONS,
+    max_keepalive_connections=DOWNLOAD_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=DOWNLOAD_KEEPALIVE_EXPIRY_SECONDS,
+    max_connections_per_host=DOWNLOAD_MAX_CONNECTIONS_PER_HOST,
+    http2=DOWNLOAD_HTTP2,
+    max_bytes=DOWNLOAD_MAX_BYTES,
+    range_part_bytes=DOWNLOAD_RANGE_PART_BYTES,
+    range_concurrency=DOWNLOAD_RANGE_CONCURRENCY,
+    max_resumes=DOWNLOAD_MAX_RESUMES,
+    verify_checksum=DOWNLOAD_VERIFY_CHECKSUM,
+)
+
+# Bounded executor for ffmpeg/PIL conversions
+class ConversionQueueFullError(Exception):
+    """Raised when the conversion queue is saturated; surfaced as 503 with Retry-After"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Conversion queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ConversionExecutor:
+    """Bounded executor for CPU-heavy media conversions.
+
+    PIL work runs in a process pool so resizes do not contend for the GIL, and
+    ffmpeg launches are gated by a semaphore. Callers waiting for a slot count
+    against a shared queue bound; once it is reached new work is rejected with
+    ConversionQueueFullError instead of piling up more subprocesses.
+    """
+    def __init__(self, image_workers: int, ffmpeg_concurrency: int, max_queue: int, retry_after: int, image_mode: str):
+        self.image_workers = max(image_workers, 1)
+        self.ffmpeg_concurrency = max(ffmpeg_concurrency, 1)
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.image_mode = image_mode
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._image_semaphore = asyncio.Semaphore(self.image_workers)
+        self._ffmpeg_semaphore = asyncio.Semaphore(self.ffmpeg_concurrency)
+        self._queued = 0
+        self._running = {"image": 0, "ffmpeg": 0}
+        self._stats = {"completed": 0, "rejected": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    async def start(self):
+        if self.image_mode == "process" and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.image_workers)
+            # Fork the workers now, while the process is still quiet, rather than on the first request.
+            await asyncio.get_running_loop().run_in_executor(self._pool, _noop)
+            logger.info(f"✅ Conversion executor started ({self.image_workers} image workers, {self.ffmpeg_concurrency} ffmpeg slots, queue {self.max_queue})")
+
+    async def shutdown(self):
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.shutdown, True, cancel_futures=True)
+            self._pool = None
+            logger.info("✅ Conversion executor shut down.")
+
+    @asynccontextmanager
+    async def _slot(self, kind: str, semaphore: asyncio.Semaphore):
+        if semaphore.locked() and self._queued >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise ConversionQueueFullError(self.retry_after)
+        self._queued += 1
+        queued_at = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            self._queued -= 1
+        waited = time.perf_counter() - queued_at
+        self._stats["wait_seconds_total"] += waited
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        self._running[kind] += 1
+        try:
+            yield
+        finally:
+            self._running[kind] -= 1
+            self._stats["completed"] += 1
+            semaphore.release()
+
+    def ffmpeg_slot(self):
+        """Hold one of the ffmpeg slots for the lifetime of a subprocess"""
+        return self._slot("ffmpeg", self._ffmpeg_semaphore)
+
+    async def run_image(self, func, *args):
+        """Run a picklable PIL function in the process pool (or a thread in thread mode)"""
+        async with self._slot("image", self._image_semaphore):
+            if self._pool is None:
+                return await asyncio.to_thread(func, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    def stats(self) -> dict:
+        completed = self._stats["completed"]
+        return {
+            "queue_depth": self._queued,
+            "max_queue": self.max_queue,
+            "running_image": self._running["image"],
+            "running_ffmpeg": self._running["ffmpeg"],
+            "image_workers": self.image_workers,
+            "ffmpeg_concurrency": self.ffmpeg_concurrency,
+            "completed": completed,
+            "rejected": self._stats["rejected"],
+            "avg_wait_seconds": round(self._stats["wait_seconds_total"] / completed, 4) if completed else 0.0,
+            "max_wait_seconds": round(self._stats["wait_seconds_max"], 4),
+        }
+
+
+def _noop():
+    return None
+
+
+conversion_executor = ConversionExecutor(
+    image_workers=CONVERSION_WORKERS,
+    ffmpeg_concurrency=FFMPEG_MAX_CONCURRENCY,
+    max_queue=CONVERSION_MAX_QUEUE,
+    retry_after=CONVERSION_RETRY_AFTER_SECONDS,
+    image_mode=IMAGE_CONVERSION_MODE,
+)
+
+# Gemini Files API handles for large media
+class GeminiFileRegistry:
+    """Uploads large payloads through the Gemini Files API and reuses the handles.
+
+    Handles are keyed by a hash of the converted bytes, so regenerating a summary
+    for the same recording reuses the earlier upload. Concurrent requests for the
+    same payload share one upload. Entries are dropped (and the remote file
+    deleted) once GEMINI_FILE_REUSE_TTL_SECONDS has passed or the server-side
+    expiration is near.
+    """
+    # Stop handing out a file this long before the API expires it
+    EXPIRY_MARGIN_SECONDS = 15 * 60
+
+    def __init__(self, reuse_ttl: int, cleanup_interval: int, active_timeout: float):
+        self.reuse_ttl = reuse_ttl
+        self.cleanup_interval = cleanup_interval
+        self.active_timeout = active_timeout
+        # key -> {"name", "uri", "mime_type", "expires_at"}
+        self._files: dict[str, dict] = {}
+        self._uploads_in_flight: dict[str, asyncio.Future] = {}
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._client = None
+        self._stats = {"uploads": 0, "reused": 0, "upload_errors": 0, "deleted": 0, "bytes_uploaded": 0}
+
+    def start(self, client=None):
+        self._client = client or self._client
+        if self._cleanup_task is None and self.cleanup_interval > 0:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+
+    async def get_part(self, client, data: bytes, mime_type: str) -> types.Part:
+        """Return a file_data Part for the payload, uploading it if needed"""
+        self._client = self._client or client
+        key = hashlib.sha256(data).hexdigest()
+        entry = self._files.get(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            self._stats["reused"] += 1
+            logger.info(f"♻️ Reusing uploaded Gemini file {entry['name']}", extra={"stage": "files_upload"})
+            return types.Part.from_uri(file_uri=entry["uri"], mime_type=entry["mime_type"])
+
+        in_flight = self._uploads_in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._upload(client, key, data, mime_type))
+            self._uploads_in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._uploads_in_flight.pop(key, None))
+        entry = await asyncio.shield(in_flight)
+        return types.Part.from_uri(file_uri=entry["uri"], mime_type=entry["mime_type"])
+
+    async def _upload(self, client, key: str, data: bytes, mime_type: str) -> dict:
+        # The SDK uploads from a path, so spill the payload to a short-lived temp file.
+        suffix = mimetypes.guess_extension(mime_type) or ".bin"
+        tmp_name = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                tmp_name = tmp.name
+            await asyncio.to_thread(_write_file, tmp_name, data)
+            with stage_timer("files_upload"):
+                uploaded = await client.aio.files.upload(path=tmp_name, config={"mime_type": mime_type})
+                uploaded = await self._wait_until_active(client, uploaded)
+        except Exception:
+            self._stats["upload_errors"] += 1
+            raise
+        finally:
+            if tmp_name:
+                try: os.unlink(tmp_name)
+                except OSError: pass
+
+        expires_at = time.time() + self.reuse_ttl
+        if uploaded.expiration_time:
+            expires_at = min(expires_at, uploaded.expiration_time.timestamp() - self.EXPIRY_MARGIN_SECONDS)
+        entry = {
+            "name": uploaded.name,
+            "uri": uploaded.uri,
+            "mime_type": uploaded.mime_type or mime_type,
+            "expires_at": expires_at,
+        }
+        self._files[key] = entry
+        self._stats["uploads"] += 1
+        self._stats["bytes_uploaded"] += len(data)
+        logger.info(f"☁️ Uploaded {len(data)} bytes to Gemini Files API as {uploaded.name} (MIME: {entry['mime_type']})", extra={"stage": "files_upload"})
+        return entry
+
+    async def _wait_until_active(self, client, uploaded):
+        deadline = time.monotonic() + self.active_timeout
+        while uploaded.state == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Gemini file {uploaded.name} still processing after {self.active_timeout}s")
+            await asyncio.sleep(1)
+            uploaded = await client.aio.files.get(name=uploaded.name)
+        if uploaded.state == "FAILED":
+            raise RuntimeError(f"Gemini file {uploaded.name} failed processing")
+        return uploaded
+
+    async def cleanup_expired(self):
+        """Forget expired handles and delete the remote files"""
+        now = time.time()
+        expired = [key for key, entry in self._files.items() if entry["expires_at"] <= now]
+        for key in expired:
+            entry = self._files.pop(key)
+            if self._client is None:
+                continue
+            try:
+                await self._client.aio.files.delete(name=entry["name"])
+                self._stats["deleted"] += 1
+            except Exception as e:
+                # The API removes files after 48h anyway, so a failed delete is not fatal.
+                logger.warning(f"⚠️ Failed to delete Gemini file {entry['name']}: {e}")
+        if expired:
+            logger.info(f"🧹 Released {len(expired)} expired Gemini file handle(s)")
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                await self.cleanup_expired()
+            except Exception as e:
+                logger.error(f"❌ Gemini file cleanup failed: {e}")
+
+    def stats(self) -> dict:
+        return {**self._stats, "active_handles": len(self._files), "uploads_in_flight": len(self._uploads_in_flight)}
+
+
+def _write_file(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+gemini_files = GeminiFileRegistry(
+    reuse_ttl=GEMINI_FILE_REUSE_TTL_SECONDS,
+    cleanup_interval=GEMINI_FILE_CLEANUP_INTERVAL_SECONDS,
+    active_timeout=GEMINI_FILE_ACTIVE_TIMEOUT_SECONDS,
+)
+
+# Initialize converted media cache
+media_cache = build_media_cache(
+    MEDIA_CACHE_BACKEND,
+    memory_max_bytes=MEDIA_CACHE_MEMORY_MAX_BYTES,
+    disk_max_bytes=MEDIA_CACHE_DISK_MAX_BYTES,
+    disk_directory=MEDIA_CACHE_DIR,
+)
 
 # Pydantic models
 class TemplateConfig(BaseModel):
@@ -103,6 +887,7 @@ class GenerateSummaryRequest(BaseModel):
     image_urls: Optional[List[str]] = []
     template_config: Optional[TemplateConfig] = TemplateConfig()
     submitted_by: str = "doctor"
+    include_timings: bool = False # Add a per-stage timing breakdown to files_processed["timings"]
 
 class GenerateSummaryResponse(BaseModel):
     summary: str
@@ -110,31 +895,63 @@ class GenerateSummaryResponse(BaseModel):
     timestamp: str
     files_processed: dict
 
+class SummaryJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded or failed
+    idempotency_key: Optional[str] = None
+    created_at: str
+    updated_at: str
+    result: Optional[GenerateSummaryResponse] = None
+    error: Optional[dict] = None
+
+class BatchSummaryRequest(BaseModel):
+    consultations: List[GenerateSummaryRequest] = Field(min_length=1, max_length=BATCH_MAX_CONSULTATIONS)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    client_connected = False
-    try:
-        # Temporarily enter the context to check client initialization
-        # This is a lightweight check.
-        temp_client = genai.Client(api_key=gemini_manager.api_key)
-        if temp_client: # Basic check if client object was created
-            client_connected = True
-        # Note: A more robust check would involve making a lightweight API call,
-        # but that might incur costs or have rate limits.
-    except Exception:
-        client_connected = False
+    """Health check endpoint.
 
+    Cheap readiness check: reports the state of the shared Gemini client built at
+    startup instead of constructing a new one per probe.
+    """
+    gemini_client = gemini_manager.stats()
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "gemini_client": "connected" if client_connected else "disconnected (initialization check)",
-        "model": "gemini-2.5-flash-preview-05-20"
+        "gemini_client": "connected" if gemini_client["state"] == "ready" else f"disconnected ({gemini_client['state']})",
+        "gemini_client_stats": gemini_client,
+        "model": GEMINI_MODEL,
+        "fallback_models": GEMINI_FALLBACK_MODELS,
+        "gemini_calls": gemini_caller.stats(),
+        "download_client": download_manager.stats(),
+        "media_cache": media_cache.stats(),
+        "conversion_executor": conversion_executor.stats(),
+        "gemini_files": gemini_files.stats(),
+        "prompt_cache": prompt_cache.stats(),
+        "summary_jobs": summary_jobs.stats(),
+        "batch_summaries": batch_summary_stats(),
+        "startup": startup_stats(),
     }
 
+stats_collector.register("gemini_client", gemini_manager.stats)
+stats_collector.register("gemini_calls", gemini_caller.stats)
+stats_collector.register("download_client", download_manager.stats)
+stats_collector.register("media_cache", media_cache.stats)
+stats_collector.register("conversion_executor", conversion_executor.stats)
+stats_collector.register("gemini_files", gemini_files.stats)
+stats_collector.register("summary_jobs", lambda: summary_jobs.stats())
+stats_collector.register("batch_summaries", lambda: batch_summary_stats())
+stats_collector.register("startup", lambda: {k: v for k, v in startup_stats().items() if k not in ("pid", "module_imports")})
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency, bytes, in-flight and error counts, plus the stats above"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 def generate_prompt(template_config: TemplateConfig, submitted_by: str) -> str:
-    """Generate AI prompt based on template configuration"""
+    """Generate AI prompt based on template configuration (memoized through prompt_cache)"""
     context_note = (
         "This consultation was recorded by the doctor during patient visit."
         if submitted_by == "doctor"
@@ -171,6 +988,16 @@ Instructions:
 Please provide a concise, factual patient consultation summary based primarily on the audio recording(s), supplemented by any relevant visual information from images. If images are present, include observations about what is visible in them.
     """.strip()
 
+prompt_cache = PromptCache(
+    generate_prompt,
+    max_entries=PROMPT_CACHE_MAX_ENTRIES,
+    context_cache=GEMINI_PROMPT_CACHE,
+    ttl=GEMINI_PROMPT_CACHE_TTL_SECONDS,
+    refresh_margin=GEMINI_PROMPT_CACHE_REFRESH_SECONDS,
+    retry_after_failure=GEMINI_PROMPT_CACHE_RETRY_SECONDS,
+)
+stats_collector.register("prompt_cache", prompt_cache.stats)
+
 def get_file_extension_from_url(url: str) -> str:
     """Extract file extension from URL"""
     parsed_url = urlparse(url)
@@ -209,228 +1036,815 @@ async def detect_mime_type(url: str, content_type: str) -> str:
     
     return 'application/octet-stream'
 
-async def download_file_from_url(url: str) -> tuple[bytes, str]:
-    """Download file from URL and return bytes with detected MIME type"""
+def response_validator(headers: httpx.Headers) -> Optional[str]:
+    """The ETag, else Last-Modified, storage sent for an object (None if neither)"""
+    return headers.get("etag") or headers.get("last-modified")
+
+async def download_file_from_url(url: str) -> tuple[bytes, str, Optional[str]]:
+    """Download file from URL and return bytes with detected MIME type and its validator (see response_validator)"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client_http:
-            response = await client_http.get(url)
-            response.raise_for_status()
-            content_type = response.headers.get("content-type", "")
+        with stage_timer("download"):
+            download = await download_manager.fetch(url)
+        content_type = download.headers.get("content-type", "")
+        with stage_timer("mime_detection"):
             mime_type = await detect_mime_type(url, content_type)
-            logger.info(f"📥 Downloaded file: {url} (MIME: {mime_type}, Size: {len(response.content)} bytes)")
-            return response.content, mime_type
+        logger.info(f"📥 Downloaded file: {url} (MIME: {mime_type}, Size: {len(download.content)} bytes, HTTP: {download.http_version}, ranges: {download.ranges})", extra={"stage": "download"})
+        return download.content, mime_type, response_validator(download.headers)
     except Exception as e:
         logger.error(f"Failed to download file from {url}: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to download file from {url}: {str(e)}")
 
-async def convert_audio_to_wav(file_bytes: bytes) -> tuple[bytes, str]:
-    """Convert audio to WAV format with 16kHz mono"""
-    def _blocking_ffmpeg_operations():
-        tmp_in_name, tmp_out_name = None, None
+def _audio_output_args(codec: str) -> dict:
+    """ffmpeg output options for a target codec, always 16kHz mono"""
+    spec = AUDIO_CODECS[codec]
+    args = {"ac": 1, "ar": AUDIO_SAMPLE_RATE, **spec["output"]}
+    if AUDIO_OUTPUT_BITRATE and "audio_bitrate" in args:
+        args["audio_bitrate"] = AUDIO_OUTPUT_BITRATE
+    return args
+
+def _finish_audio_output(codec: str, data: bytes) -> tuple[bytes, str]:
+    if codec == "wav":
+        data = _pcm_to_wav(data)
+    return data, AUDIO_CODECS[codec]["mime_type"]
+
+def _passthrough_mime_type(mime_type: Optional[str], remove_silence: bool = AUDIO_SILENCE_REMOVAL) -> Optional[str]:
+    """MIME type to send as-is when the upload is already a compressed format Gemini accepts"""
+    if AUDIO_PASSTHROUGH and not remove_silence and mime_type:
+        return PASSTHROUGH_AUDIO_MIME_TYPES.get(mime_type)
+    return None
+
+def _streams_through_ffmpeg(mime_type: str, allow_passthrough: bool) -> bool:
+    """Whether stream_transcode_audio pipes this upload into ffmpeg (not passed through or buffered for seeking)"""
+    if allow_passthrough and _passthrough_mime_type(mime_type):
+        return False
+    return mime_type not in NON_STREAMABLE_AUDIO_MIME_TYPES
+
+async def _run_ffmpeg(args: list, input_data: Optional[bytes] = None) -> bytes:
+    """Run a compiled ffmpeg command and return its stdout.
+
+    The process is killed if the awaiting task is cancelled (request deadline or a
+    failed required file), so abandoned conversions stop burning CPU.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        output, stderr = await process.communicate(input_data)
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed: {stderr.decode(errors='replace') if stderr else 'Unknown error'}")
+    return output
+
+async def _encode_pcm(pcm: bytes, codec: str) -> bytes:
+    """Encode 16kHz mono s16le PCM to a compressed codec through ffmpeg pipes"""
+    args = (
+        ffmpeg
+        .input('pipe:0', format='s16le', ac=1, ar=AUDIO_SAMPLE_RATE)
+        .output('pipe:1', **_audio_output_args(codec))
+        .global_args('-hide_banner', '-loglevel', 'error')
+        .compile()
+    )
+    return await _run_ffmpeg(args, pcm)
+
+async def _compact_and_encode(pcm: bytes, codec: str) -> tuple[bytes, str]:
+    """Remove long silences from decoded PCM, then encode it. Caller holds an ffmpeg slot."""
+    with stage_timer("silence_removal"):
+        pcm, compaction = await asyncio.to_thread(
+            audio_compaction.compact_pcm,
+            pcm,
+            AUDIO_SAMPLE_RATE,
+            threshold_db=AUDIO_SILENCE_THRESHOLD_DB,
+            noise_margin_db=AUDIO_SILENCE_NOISE_MARGIN_DB,
+            min_silence_ms=AUDIO_SILENCE_MIN_MS,
+            padding_ms=AUDIO_SILENCE_PADDING_MS,
+            min_keep_ratio=AUDIO_SILENCE_MIN_KEEP_RATIO,
+        )
+    AUDIO_COMPACTION_RATIO.observe(compaction["compression_ratio"])
+    record_file_detail("audio_compaction", compaction)
+    if "skipped" in compaction:
+        logger.warning(f"⚠️ Silence removal skipped ({compaction['skipped']}), sending {compaction['original_seconds']}s untrimmed")
+    else:
+        logger.info(f"🔇 Silence removed: {compaction['original_seconds']}s -> {compaction['compacted_seconds']}s ({compaction['compression_ratio']}x)", extra={"stage": "silence_removal"})
+    if codec != "wav":
+        with stage_timer("transcode"):
+            pcm = await _encode_pcm(pcm, codec)
+    return _finish_audio_output(codec, pcm)
+
+async def convert_audio(
+    file_bytes: bytes,
+    mime_type: Optional[str] = None,
+    codec: str = AUDIO_OUTPUT_CODEC,
+    remove_silence: bool = AUDIO_SILENCE_REMOVAL,
+    allow_passthrough: bool = True,
+) -> tuple[bytes, str]:
+    """Convert audio to the configured codec at 16kHz mono, or pass supported compressed uploads through"""
+    passthrough_mime_type = _passthrough_mime_type(mime_type, remove_silence) if allow_passthrough else None
+    if passthrough_mime_type:
+        return file_bytes, passthrough_mime_type
+    # Silence removal works on raw PCM, which is encoded afterwards.
+    decode_codec = "wav" if remove_silence else codec
+
+    async def _transcode_from_file() -> bytes:
+        tmp_in_name = None
         try:
+            # Input stays a real file so containers that need seeking (MP4/M4A) still decode.
             with tempfile.NamedTemporaryFile(suffix='.tmp', delete=False) as tmp_in:
                 tmp_in_name = tmp_in.name
-                tmp_in.write(file_bytes)
-                tmp_in.flush()
-            
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_out:
-                tmp_out_name = tmp_out.name
-
-            process = (
+            await asyncio.to_thread(_write_file, tmp_in_name, file_bytes)
+            args = (
                 ffmpeg
                 .input(tmp_in_name)
-                .output(tmp_out_name, acodec='pcm_s16le', ac=1, ar=16000)
-                .overwrite_output()
-                .run_async(pipe_stdout=True, pipe_stderr=True)
+                .output('pipe:1', **_audio_output_args(decode_codec))
+                .global_args('-hide_banner', '-loglevel', 'error')
+                .compile()
             )
-            stdout, stderr = process.communicate()
-            if process.returncode != 0:
-                raise RuntimeError(f"FFmpeg failed: {stderr.decode() if stderr else 'Unknown error'}")
-            with open(tmp_out_name, 'rb') as f:
-                wav_bytes = f.read()
-            return wav_bytes, 'audio/wav'
+            return await _run_ffmpeg(args)
         finally:
             if tmp_in_name:
                 try: os.unlink(tmp_in_name)
                 except OSError: pass
-            if tmp_out_name:
-                try: os.unlink(tmp_out_name)
-                except OSError: pass
-                    
-    return await asyncio.to_thread(_blocking_ffmpeg_operations)
+
+    async with conversion_executor.ffmpeg_slot():
+        with stage_timer("transcode"):
+            decoded = await _transcode_from_file()
+        if remove_silence:
+            return await _compact_and_encode(decoded, codec)
+    return _finish_audio_output(codec, decoded)
+
+async def convert_audio_to_wav(file_bytes: bytes) -> tuple[bytes, str]:
+    """Convert audio to WAV format with 16kHz mono"""
+    return await convert_audio(file_bytes, codec="wav")
+
+def _pcm_to_wav(pcm_bytes: bytes, sample_rate: int = AUDIO_SAMPLE_RATE, channels: int = 1, sample_width: int = 2) -> bytes:
+    """Wrap raw little-endian PCM in a canonical 44-byte WAV header"""
+    byte_rate = sample_rate * channels * sample_width
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + len(pcm_bytes), b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b'data', len(pcm_bytes),
+    )
+    return header + pcm_bytes
+
+async def stream_transcode_audio(url: str, codec: str = AUDIO_OUTPUT_CODEC, allow_passthrough: bool = True) -> tuple[bytes, str, int, Optional[str]]:
+    """Download audio and transcode it to the configured codec in a single pipeline.
+
+    Response chunks are piped straight into ffmpeg's stdin and the encoded audio
+    is read from its stdout, so the source is never held in memory and no
+    temporary files are written. Supported compressed uploads are passed through
+    untouched. Returns (audio_bytes, mime_type, downloaded_bytes, validator), the
+    validator being the source's ETag or Last-Modified (see response_validator).
+    """
+    file_bytes = None
+    async with AsyncExitStack() as ffmpeg_slot:
+        # Wait for ffmpeg before opening the download, so queued transcodes do not hold
+        # per-host download slots (and idle responses) while ffmpeg is saturated. The
+        # URL decides up front; the response headers can still correct it below.
+        slot_held = _streams_through_ffmpeg(await detect_mime_type(url, ""), allow_passthrough)
+        if slot_held:
+            await ffmpeg_slot.enter_async_context(conversion_executor.ffmpeg_slot())
+        async with download_manager.open(url) as response:
+            validator = response_validator(response.headers)
+            with stage_timer("mime_detection"):
+                mime_type = await detect_mime_type(url, response.headers.get("content-type", ""))
+            passthrough_mime_type = _passthrough_mime_type(mime_type) if allow_passthrough else None
+            if not _streams_through_ffmpeg(mime_type, allow_passthrough):
+                await ffmpeg_slot.aclose()  # buffered below; convert_audio takes its own slot
+                if not download_manager.use_ranges(response):
+                    with stage_timer("download"):
+                        file_bytes = await response.aread()
+            else:
+                if not slot_held:
+                    await ffmpeg_slot.enter_async_context(conversion_executor.ffmpeg_slot())
+                with stage_timer("stream_transcode"):
+                    encoded = await _pipe_response_through_ffmpeg(response, "wav" if AUDIO_SILENCE_REMOVAL else codec)
+                logger.info(f"📥 Streamed file: {url} (MIME: {mime_type}, Size: {response.num_bytes_downloaded} bytes)", extra={"stage": "download"})
+                if AUDIO_SILENCE_REMOVAL:
+                    audio_bytes, audio_mime_type = await _compact_and_encode(encoded, codec)
+                else:
+                    audio_bytes, audio_mime_type = _finish_audio_output(codec, encoded)
+                return audio_bytes, audio_mime_type, response.num_bytes_downloaded, validator
+
+    if file_bytes is None:
+        # Large recording: abandon the single stream and fetch it as parallel ranges
+        with stage_timer("download"):
+            file_bytes = (await download_manager.fetch(url)).content
+    if passthrough_mime_type:
+        logger.info(f"📥 Downloaded file: {url} (MIME: {mime_type}, Size: {len(file_bytes)} bytes, passthrough)", extra={"stage": "download"})
+        return file_bytes, passthrough_mime_type, len(file_bytes), validator
+    logger.info(f"📥 Downloaded file: {url} (MIME: {mime_type}, Size: {len(file_bytes)} bytes, buffered: container needs seeking)", extra={"stage": "download"})
+    audio_bytes, audio_mime_type = await convert_audio(file_bytes, mime_type, codec, allow_passthrough=allow_passthrough)
+    return audio_bytes, audio_mime_type, len(file_bytes), validator
+
+async def stream_audio_to_wav(url: str) -> tuple[bytes, str, int, Optional[str]]:
+    """Streaming transcode to 16kHz mono WAV. Returns (wav_bytes, mime_type, downloaded_bytes, validator)."""
+    return await stream_transcode_audio(url, codec="wav")
+
+async def _pipe_response_through_ffmpeg(response: httpx.Response, codec: str) -> bytes:
+    """Feed a streamed response into ffmpeg and return its encoded stdout"""
+    args = (
+        ffmpeg
+        .input('pipe:0')
+        .output('pipe:1', **_audio_output_args(codec))
+        .global_args('-hide_banner', '-loglevel', 'error')
+        .compile()
+    )
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def _feed_stdin():
+        try:
+            async for chunk in response.aiter_bytes(AUDIO_STREAM_CHUNK_SIZE):
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg exited early; its stderr and return code say why.
+            pass
+        finally:
+            process.stdin.close()
+
+    try:
+        _, encoded, stderr = await asyncio.gather(
+            _feed_stdin(), process.stdout.read(), process.stderr.read()
+        )
+        await process.wait()
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpeg failed: {stderr.decode(errors='replace') if stderr else 'Unknown error'}")
+    return encoded
+
+def _convert_image_blocking(
+    file_bytes: bytes,
+    max_size: int,
+    output_format: str,
+    quality: int,
+    passthrough_max_bytes: int,
+    fast_decode: bool = True,
+) -> tuple[bytes, str]:
+    """PIL conversion; module-level so it can run in the conversion process pool.
+
+    Small upright uploads already in a supported format are returned untouched.
+    JPEGs are decoded with ``Image.draft`` so the decoder downscales by up to 8x
+    before the LANCZOS resize, EXIF orientation is applied so phone photos are
+    upright, and the result is encoded to ``output_format``.
+    """
+    img = Image.open(io.BytesIO(file_bytes))
+    upright = img.getexif().get(0x0112, 1) == 1  # EXIF Orientation tag
+    if (
+        len(file_bytes) <= passthrough_max_bytes
+        and img.format in PASSTHROUGH_IMAGE_FORMATS
+        and max(img.size) <= max_size
+        and upright
+    ):
+        return file_bytes, PASSTHROUGH_IMAGE_FORMATS[img.format]
+
+    spec = IMAGE_FORMATS[output_format]
+    if fast_decode and img.format == "JPEG":
+        img.draft("RGB" if img.mode != "L" else "L", (max_size, max_size))
+    if not upright:
+        img = ImageOps.exif_transpose(img)
+    if img.mode not in spec["modes"]:
+        if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+            # Flatten transparency onto white so it does not turn black in JPEG.
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            img = img.convert("RGB")
+    width, height = img.size
+    if width > max_size or height > max_size:
+        ratio = min(max_size/width, max_size/height)
+        new_width = int(width * ratio)
+        new_height = int(height * ratio)
+        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    if output_format == "png":
+        img.save(output, format=spec["pil_format"])
+    else:
+        img.save(output, format=spec["pil_format"], quality=quality)
+    return output.getvalue(), spec["mime_type"]
+
+async def convert_image(
+    file_bytes: bytes,
+    max_size: int = IMAGE_MAX_SIZE,
+    output_format: str = IMAGE_OUTPUT_FORMAT,
+    quality: int = IMAGE_OUTPUT_QUALITY,
+    passthrough_max_bytes: int = IMAGE_PASSTHROUGH_MAX_BYTES,
+) -> tuple[bytes, str]:
+    """Resize an image to fit max_size and encode it to the configured format"""
+    with stage_timer("image_resize"):
+        return await conversion_executor.run_image(
+            _convert_image_blocking, file_bytes, max_size, output_format, quality, passthrough_max_bytes
+        )
 
 async def convert_image_to_png(file_bytes: bytes, max_size: int = 1024) -> tuple[bytes, str]:
     """Convert image to PNG format and resize if needed"""
-    def _blocking_pil_operations():
-        img = Image.open(io.BytesIO(file_bytes))
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        width, height = img.size
-        if width > max_size or height > max_size:
-            ratio = min(max_size/width, max_size/height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        output = io.BytesIO()
-        img.save(output, format='PNG', optimize=True)
-        png_bytes = output.getvalue()
-        return png_bytes, 'image/png'
-        
-    return await asyncio.to_thread(_blocking_pil_operations)
+    return await convert_image(file_bytes, max_size, output_format="png", passthrough_max_bytes=0)
+
+# Cache variants: bump these when conversion parameters change so old entries stop matching
+_SILENCE_CACHE_VARIANT = (
+    f":silence={AUDIO_SILENCE_THRESHOLD_DB}/{AUDIO_SILENCE_NOISE_MARGIN_DB}/{AUDIO_SILENCE_MIN_MS}/{AUDIO_SILENCE_PADDING_MS}/{AUDIO_SILENCE_MIN_KEEP_RATIO}"
+    if AUDIO_SILENCE_REMOVAL else ""
+)
+AUDIO_CACHE_VARIANT = f"audio:{AUDIO_OUTPUT_CODEC}:{AUDIO_OUTPUT_BITRATE}:{AUDIO_SAMPLE_RATE}:mono:passthrough={AUDIO_PASSTHROUGH}{_SILENCE_CACHE_VARIANT}"
+# Decoded PCM (WAV) used by long-recording chunking
+AUDIO_PCM_CACHE_VARIANT = f"audio:wav:{AUDIO_SAMPLE_RATE}:mono{_SILENCE_CACHE_VARIANT}"
+IMAGE_CACHE_VARIANT = f"image:{IMAGE_OUTPUT_FORMAT}:{IMAGE_OUTPUT_QUALITY}:{IMAGE_MAX_SIZE}:passthrough={IMAGE_PASSTHROUGH_MAX_BYTES}"
+
+async def fetch_validator(url: str) -> Optional[str]:
+    """HEAD a URL for its current validator (see response_validator), or None if the server sends none"""
+    try:
+        response = await download_manager.head(url)
+        if response.is_success:
+            return response_validator(response.headers)
+    except httpx.HTTPError as e:
+        logger.warning(f"⚠️ HEAD request failed for {url}: {e}")
+    return None
+
+async def load_converted_media(url: str, variant: str, convert, stream_convert=None) -> tuple[bytes, str, bool]:
+    """Return converted media for a URL, going through the media cache.
+
+    Entries are keyed by URL and carry the ETag (or Last-Modified) of the object
+    they were converted from. Only a URL already in the cache costs a HEAD, to
+    check that validator is still current, and a hit skips both download and
+    conversion; a miss goes straight to the download and stores the validator
+    of that response. Without a validator the buffered path keys on a hash of
+    the downloaded bytes, which still skips conversion; the streaming path
+    cannot be content-addressed and is not cached. Returns (data, mime_type, cache_hit).
+    """
+    cache_key = None
+    if media_cache.enabled:
+        cache_key = media_cache_key(variant, url)
+        cached = await media_cache.get(cache_key)
+        if cached is not None and cached.validator and await fetch_validator(url) == cached.validator:
+            return cached.data, cached.mime_type, True
+
+    if stream_convert is not None:
+        data, mime_type, validator = await stream_convert(url)
+        if validator is None:
+            cache_key = None
+    else:
+        file_bytes, source_mime_type, validator = await download_file_from_url(url)
+        if media_cache.enabled and validator is None:
+            cache_key = media_cache_key(variant, hashlib.sha256(file_bytes).hexdigest())
+            cached = await media_cache.get(cache_key)
+            if cached is not None:
+                return cached.data, cached.mime_type, True
+        data, mime_type = await convert(file_bytes, source_mime_type)
+
+    if cache_key is not None:
+        await media_cache.put(cache_key, CachedMedia(data, mime_type, validator))
+    return data, mime_type, False
+
+async def build_media_part(client, data: bytes, mime_type: str) -> tuple[types.Part, str]:
+    """Inline small payloads; upload large ones through the Files API. Returns (part, transport)."""
+    kind = mime_type.split("/")[0]
+    if client is not None and len(data) > GEMINI_INLINE_MAX_BYTES:
+        part = await gemini_files.get_part(client, data, mime_type)
+        BYTES_SENT_TO_MODEL.labels(kind, "files_api").inc(len(data))
+        return part, "files_api"
+    BYTES_SENT_TO_MODEL.labels(kind, "inline").inc(len(data))
+    return types.Part.from_bytes(data=data, mime_type=mime_type), "inline"
+
+async def _stream_audio_payload(url: str) -> tuple[bytes, str, Optional[str]]:
+    audio_bytes, audio_mime_type, _, validator = await stream_transcode_audio(url)
+    return audio_bytes, audio_mime_type, validator
+
+async def _convert_image_payload(file_bytes: bytes, mime_type: str) -> tuple[bytes, str]:
+    return await convert_image(file_bytes)
+
+async def _convert_audio_pcm(file_bytes: bytes, mime_type: str) -> tuple[bytes, str]:
+    return await convert_audio(file_bytes, mime_type, codec="wav", allow_passthrough=False)
+
+async def _stream_audio_pcm(url: str) -> tuple[bytes, str, Optional[str]]:
+    audio_bytes, audio_mime_type, _, validator = await stream_transcode_audio(url, codec="wav", allow_passthrough=False)
+    return audio_bytes, audio_mime_type, validator
+
+# Long-recording chunking
+transcription_semaphore = asyncio.Semaphore(max(TRANSCRIPTION_CONCURRENCY, 1))
+
+def generate_transcription_prompt(index: int, total: int) -> str:
+    """Prompt for transcribing one chunk of a long consultation recording"""
+    return f"""
+You are transcribing part {index + 1} of {total} of a doctor-patient consultation recorded in an Indian clinic.
+
+Transcribe everything that is said in this audio segment verbatim, in the language it is spoken.
+Label speakers as "Doctor:" or "Patient:" where you can tell them apart.
+Do not summarise, translate, correct or add anything that was not said.
+The segment may start or end mid-sentence; transcribe the partial words you hear.
+"""
+
+async def encode_pcm_audio(pcm: bytes, codec: str = AUDIO_OUTPUT_CODEC) -> tuple[bytes, str]:
+    """Encode decoded 16kHz mono PCM to the output codec"""
+    if codec == "wav":
+        return _finish_audio_output(codec, pcm)
+    async with conversion_executor.ffmpeg_slot():
+        with stage_timer("transcode"):
+            return _finish_audio_output(codec, await _encode_pcm(pcm, codec))
+
+async def transcribe_audio_chunk(client, pcm: bytes, index: int, total: int) -> str:
+    """Encode one PCM chunk and transcribe it, at most TRANSCRIPTION_CONCURRENCY at a time per instance"""
+    data, mime_type = await encode_pcm_audio(pcm)
+    part, _ = await build_media_part(client, data, mime_type)
+    async with transcription_semaphore:
+        with stage_timer("transcribe"):
+            response, _ = await gemini_caller.generate_content(client, [generate_transcription_prompt(index, total), part])
+    return (response.text or "").strip()
+
+async def build_chunked_audio_part(audio_url: str, client) -> tuple[types.Part, str, int, bool, str]:
+    """Decode an audio file and, when it is long, replace it with a merged transcript.
+
+    The recording is cut at pauses into overlapping chunks that are transcribed in
+    parallel, so wall-clock time follows the slowest chunk rather than the whole
+    recording. Recordings under AUDIO_CHUNKING_MIN_SECONDS are encoded and sent as
+    audio. Returns (part, mime_type, size, cache_hit, transport).
+    """
+    wav_bytes, _, cache_hit = await load_converted_media(
+        audio_url,
+        AUDIO_PCM_CACHE_VARIANT,
+        _convert_audio_pcm,
+        stream_convert=_stream_audio_pcm if AUDIO_STREAMING_MODE else None,
+    )
+    pcm = wav_bytes[44:]  # canonical header written by _pcm_to_wav
+    seconds = len(pcm) / (2 * AUDIO_SAMPLE_RATE)
+    if seconds < AUDIO_CHUNKING_MIN_SECONDS:
+        data, mime_type = await encode_pcm_audio(pcm)
+        part, transport = await build_media_part(client, data, mime_type)
+        return part, mime_type, len(data), cache_hit, transport
+
+    with stage_timer("chunk_planning"):
+        chunks = await asyncio.to_thread(
+            audio_compaction.plan_chunks, pcm, AUDIO_SAMPLE_RATE, AUDIO_CHUNK_SECONDS, AUDIO_CHUNK_OVERLAP_SECONDS, AUDIO_CHUNK_SEARCH_SECONDS
+        )
+    logger.info(f"✂️ Splitting {seconds:.0f}s recording into {len(chunks)} chunks for parallel transcription", extra={"stage": "chunk_planning"})
+    record_file_detail("audio_chunks", {"seconds": round(seconds, 2), "chunks": len(chunks)})
+    transcripts = await asyncio.gather(*[
+        transcribe_audio_chunk(client, pcm[start * 2:end * 2], index, len(chunks))
+        for index, (start, end) in enumerate(chunks)
+    ])
+    segments = "\n\n".join(
+        f"[Segment {index + 1}/{len(chunks)}, {start / AUDIO_SAMPLE_RATE:.0f}s-{end / AUDIO_SAMPLE_RATE:.0f}s]\n{text}"
+        for index, ((start, end), text) in enumerate(zip(chunks, transcripts))
+    )
+    transcript = (
+        f"Transcript of a {seconds / 60:.1f} minute consultation recording, transcribed in {len(chunks)} segments. "
+        f"Adjacent segments overlap by about {AUDIO_CHUNK_OVERLAP_SECONDS:.0f} seconds, so speech repeated at a "
+        f"segment boundary was only said once. Treat this transcript as the audio recording.\n\n{segments}"
+    )
+    return types.Part.from_text(transcript), "text/plain", len(transcript), cache_hit, "transcript"
 
 # Modified return type to be more consistent for easier processing after gather
-async def process_single_audio_file(audio_url: str, audio_file_identifier: str) -> Tuple[Optional[types.Part], str, str, Optional[str]]:
+async def process_single_audio_file(audio_url: str, audio_file_identifier: str, client=None) -> Tuple[Optional[types.Part], str, str, Optional[str]]:
     """Process a single audio file. Returns (part, identifier, url, error_message_if_any)."""
-    logger.info(f"📤 Processing {audio_file_identifier} audio file: {audio_url}")
+    logger.info(f"📤 Processing {audio_file_identifier} audio file: {audio_url}", extra={"stage": "file"})
     try:
-        file_bytes, _ = await download_file_from_url(audio_url)
-        wav_bytes, wav_mime_type = await convert_audio_to_wav(file_bytes)
-        audio_part = types.Part.from_bytes(data=wav_bytes, mime_type=wav_mime_type)
-        logger.info(f"✅ {audio_file_identifier.replace('_', ' ').capitalize()} audio processed successfully (MIME: {wav_mime_type}, Size: {len(wav_bytes)} bytes)")
-        return audio_part, audio_file_identifier, audio_url, None
+        with file_scope(audio_file_identifier):
+            if AUDIO_CHUNKING and client is not None:
+                audio_part, audio_mime_type, size, cache_hit, transport = await build_chunked_audio_part(audio_url, client)
+            else:
+                audio_bytes, audio_mime_type, cache_hit = await load_converted_media(
+                    audio_url,
+                    AUDIO_CACHE_VARIANT,
+                    convert_audio,
+                    stream_convert=_stream_audio_payload if AUDIO_STREAMING_MODE else None,
+                )
+                audio_part, transport = await build_media_part(client, audio_bytes, audio_mime_type)
+                size = len(audio_bytes)
+            logger.info(f"✅ {audio_file_identifier.replace('_', ' ').capitalize()} audio processed successfully (MIME: {audio_mime_type}, Size: {size} bytes, cache: {'hit' if cache_hit else 'miss'}, via: {transport})", extra={"stage": "file"})
+            return audio_part, audio_file_identifier, audio_url, None
+    except ConversionQueueFullError:
+        raise
     except Exception as e:
         error_msg = f"Failed to process {audio_file_identifier} audio {audio_url}: {str(e)}"
         logger.error(f"❌ {error_msg}")
         return None, audio_file_identifier, audio_url, error_msg
 
 # Modified return type to be more consistent
-async def process_single_image_file(image_url: str, image_file_identifier: str) -> Tuple[Optional[types.Part], str, str, Optional[str]]:
+async def process_single_image_file(image_url: str, image_file_identifier: str, client=None) -> Tuple[Optional[types.Part], str, str, Optional[str]]:
     """Process a single image file. Returns (part, identifier, url, error_message_if_any)."""
-    logger.info(f"📤 Processing {image_file_identifier} image file: {image_url}")
+    logger.info(f"📤 Processing {image_file_identifier} image file: {image_url}", extra={"stage": "file"})
     try:
-        file_bytes, _ = await download_file_from_url(image_url)
-        png_bytes, png_mime_type = await convert_image_to_png(file_bytes)
-        image_part = types.Part.from_bytes(data=png_bytes, mime_type=png_mime_type)
-        logger.info(f"✅ {image_file_identifier.replace('_', ' ').capitalize()} image processed successfully (MIME: {png_mime_type}, Size: {len(png_bytes)} bytes)")
-        return image_part, image_file_identifier, image_url, None
+        with file_scope(image_file_identifier):
+            image_bytes, image_mime_type, cache_hit = await load_converted_media(image_url, IMAGE_CACHE_VARIANT, _convert_image_payload)
+            image_part, transport = await build_media_part(client, image_bytes, image_mime_type)
+            logger.info(f"✅ {image_file_identifier.replace('_', ' ').capitalize()} image processed successfully (MIME: {image_mime_type}, Size: {len(image_bytes)} bytes, cache: {'hit' if cache_hit else 'miss'}, via: {transport})", extra={"stage": "file"})
+            return image_part, image_file_identifier, image_url, None
+    except ConversionQueueFullError:
+        raise
     except Exception as e:
         error_msg = f"Failed to process {image_file_identifier} image {image_url}: {str(e)}"
         logger.error(f"❌ {error_msg}")
         return None, image_file_identifier, image_url, error_msg
 
-@app.post("/api/generate-summary", response_model=GenerateSummaryResponse)
-async def generate_summary(request: GenerateSummaryRequest):
-    """Generate AI summary using Gemini 2.5 Flash Preview with Base64 Inline Data"""
+def build_file_processing_tasks(request: GenerateSummaryRequest, client, media_loader=None) -> list:
+    """Create one processing coroutine per audio/image URL in the request, primary audio first.
+
+    A batch passes its ``BatchMediaLoader`` so URLs shared between consultations are processed once.
+    """
+    process_audio = media_loader.audio if media_loader else process_single_audio_file
+    process_image = media_loader.image if media_loader else process_single_image_file
+    all_file_processing_tasks = []
+
+    # Prepare audio tasks
+    all_audio_urls = [request.primary_audio_url] + (request.additional_audio_urls or [])
+    logger.info(f"🎵 Preparing {len(all_audio_urls)} audio file task(s)...", extra={"stage": "file"})
+    for i, audio_url in enumerate(all_audio_urls):
+        file_identifier = "primary_audio" if i == 0 else f"additional_audio_{i}"
+        all_file_processing_tasks.append(
+            process_audio(audio_url, file_identifier, client)
+        )
+
+    # Prepare image tasks
+    image_urls = request.image_urls or []
+    logger.info(f"🖼️ Preparing {len(image_urls)} image file task(s)...", extra={"stage": "file"})
+    for i, image_url in enumerate(image_urls):
+        file_identifier = f"image_{i}"
+        all_file_processing_tasks.append(
+            process_image(image_url, file_identifier, client)
+        )
+
+    if not all_file_processing_tasks:
+        logger.warning("No files to process.")
+        # Decide if this should be an error or proceed with only prompt
+        # For now, assuming at least primary_audio_url is always there.
+    return all_file_processing_tasks
+
+def collect_file_results(all_results: list) -> tuple[list, dict]:
+    """Split process_single_* results into Gemini parts and the files_processed summary"""
+    parts = []
+    files_processed = {"audio": 0, "images": 0, "errors": []}
+    for result_tuple in all_results:
+        part, identifier, url, error_message = result_tuple
+
+        if error_message:
+            files_processed["errors"].append(error_message)
+        elif part:
+            parts.append(part)
+            if "audio" in identifier:
+                files_processed["audio"] += 1
+            elif "image" in identifier:
+                files_processed["images"] += 1
+        else:
+            # This case should ideally not happen if error_message is set when part is None
+            unknown_error_msg = f"Unknown issue processing {identifier} from {url} - no part and no error message."
+            logger.error(unknown_error_msg)
+            files_processed["errors"].append(unknown_error_msg)
+
+    for detail in ("audio_compaction", "audio_chunks"):
+        values = request_file_details(detail)
+        if values:
+            files_processed[detail] = values
+
+    total_files_successfully_processed = files_processed["audio"] + files_processed["images"]
+    logger.info(f"📊 Total files successfully processed for Gemini: {total_files_successfully_processed} ({files_processed['audio']} audio + {files_processed['images']} images)", extra={"stage": "file"})
+    if files_processed["errors"]:
+        # Each error was already logged where it happened; the full list is in the response.
+        logger.warning(f"⚠️ {len(files_processed['errors'])} file(s) had processing errors", extra={"stage": "file"})
+    return parts, files_processed
+
+class RequiredFileError(Exception):
+    """A file that PARTIAL_RESULT_POLICY requires could not be processed; surfaced as 400"""
+
+def _is_required_file(identifier: str) -> bool:
+    if PARTIAL_RESULT_POLICY == "require_all":
+        return True
+    return PARTIAL_RESULT_POLICY == "require_primary" and identifier == "primary_audio"
+
+async def iter_file_results(coros: list) -> AsyncIterator[tuple[int, tuple]]:
+    """Run file processing coroutines concurrently and yield (index, result) as each finishes.
+
+    When a file required by PARTIAL_RESULT_POLICY fails, a task raises (e.g.
+    ConversionQueueFullError) or the request deadline passes, the remaining tasks
+    are cancelled, which kills their ffmpeg subprocesses, instead of waiting for
+    files the summary can no longer use.
+    """
+    indexes = {asyncio.ensure_future(coro): index for index, coro in enumerate(coros)}
+    pending = set(indexes)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=time_left(), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError(f"Request deadline passed with {len(pending)} file(s) still processing")
+            for task in done:
+                result = task.result()
+                _, identifier, _, error_message = result
+                if error_message and _is_required_file(identifier):
+                    raise RequiredFileError(error_message)
+                yield indexes[task], result
+    finally:
+        if pending:
+            logger.warning(f"🛑 Cancelling {len(pending)} remaining file task(s)")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            FILE_TASKS_CANCELLED.inc(len(pending))
+        for task in indexes:
+            # Mark failures of tasks finished alongside the one that stopped us as retrieved.
+            if task.done() and not task.cancelled():
+                task.exception()
+
+async def gather_file_results(coros: list) -> list:
+    """Results of the file processing coroutines in request order, failing fast like iter_file_results"""
+    results: list = [None] * len(coros)
+    async with aclosing(iter_file_results(coros)) as file_results:
+        async for index, result in file_results:
+            results[index] = result
+    return results
+
+def build_gemini_contents(contents: List[Any]) -> List[types.Part | str]:
+    """Filter the prompt + parts list down to types Gemini accepts and log its structure at DEBUG"""
+    gemini_contents: List[types.Part | str] = []
+    for item in contents:
+        if isinstance(item, (types.Part, str)):
+            gemini_contents.append(item)
+        else:
+            logger.warning(f"Skipping unexpected item type in contents: {type(item)}")
+
+    # Log content structure for debugging; skipped entirely unless DEBUG is enabled
+    if logger.isEnabledFor(logging.DEBUG):
+        for idx, item in enumerate(gemini_contents):
+            if isinstance(item, str):
+                logger.debug("gemini_contents[%d] type: str (prompt) length: %d", idx, len(item))
+            elif isinstance(item, types.Part):
+                # Access mime_type via inline_data for parts created from bytes
+                if hasattr(item, 'inline_data') and item.inline_data:
+                    logger.debug("gemini_contents[%d] type: Part, mime_type: %s", idx, item.inline_data.mime_type)
+                elif hasattr(item, 'file_data') and item.file_data:
+                    logger.debug("gemini_contents[%d] type: Part (Files API), mime_type: %s", idx, item.file_data.mime_type)
+                elif hasattr(item, 'text') and item.text: # Handle parts that might just be text
+                    logger.debug("gemini_contents[%d] type: Part (text only), length: %d", idx, len(item.text))
+                else:
+                    logger.debug("gemini_contents[%d] type: Part (structure not logged in detail)", idx)
+    return gemini_contents
+
+async def stream_gemini_text(client, contents: List[types.Part | str], model: str = GEMINI_MODEL, config=None) -> AsyncIterator[str]:
+    """Yield summary text chunks as Gemini produces them.
+
+    The SDK's aio stream reads the HTTP body synchronously on the event loop, so the
+    sync stream is iterated in a worker thread and handed back through a queue.
+    Closing the generator (timeout, cancellation, client disconnect) does not wait
+    for that thread: it cannot be interrupted mid-read and stops at the next chunk.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def _hand_over(item):
+        if not stop.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def _produce():
+        try:
+            for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+                if stop.is_set():
+                    # The consumer went away (e.g. the dashboard closed the stream).
+                    break
+                _hand_over(chunk)
+        except Exception as e:
+            _hand_over(e)
+        finally:
+            _hand_over(done)
+
+    loop.run_in_executor(None, _produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item.text:
+                yield item.text
+    finally:
+        stop.set()
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def request_timeout(header_value: Optional[float] = None) -> Optional[float]:
+    """Deadline for one request: the X-Request-Timeout header, capped at REQUEST_DEADLINE_SECONDS"""
+    configured = REQUEST_DEADLINE_SECONDS if REQUEST_DEADLINE_SECONDS > 0 else None
+    if header_value is None or header_value <= 0:
+        return configured
+    return min(header_value, configured) if configured else header_value
+
+def deadline_exceeded_detail() -> str:
+    return "Request deadline exceeded before the summary was generated"
+
+async def run_summary_pipeline(
+    request: GenerateSummaryRequest,
+    endpoint: str = "generate_summary",
+    media_loader=None,
+    gemini_slot=None,
+    timeout: Optional[float] = None,
+) -> GenerateSummaryResponse:
+    """Download, convert and summarise one consultation. Failures surface as HTTPException.
+
+    Batches pass a shared ``media_loader`` and a ``gemini_slot`` async context
+    manager that gates the Gemini call on the batch concurrency and rate limits.
+    ``timeout`` is the request deadline in seconds (None for no deadline).
+    """
+    timings = start_request_timings()
+    start_deadline(timeout)
+    try:
+        with stage_timer("total"):
+            response = await _run_summary_pipeline(request, media_loader, gemini_slot)
+    except Exception:
+        SUMMARY_REQUESTS.labels(endpoint, "error").inc()
+        raise
+    SUMMARY_REQUESTS.labels(endpoint, "success").inc()
+    if request.include_timings:
+        response.files_processed["timings"] = timing_breakdown(timings)
+    return response
+
+async def _run_summary_pipeline(request: GenerateSummaryRequest, media_loader=None, gemini_slot=None) -> GenerateSummaryResponse:
 
     async with gemini_manager as client: # client from context manager
         if not client: # Should be handled by __aenter__ raising an error
              raise HTTPException(status_code=503, detail="Gemini client not available")
 
-        logger.info("🎯 Processing consultation with Gemini 2.5 Flash Preview (Base64 Inline Data)...")
+        logger.info(f"🎯 Processing consultation with {GEMINI_MODEL}...", extra={"stage": "request"})
 
         try:
-            prompt = generate_prompt(request.template_config, request.submitted_by)
+            prompt_key, prompt = prompt_cache.get(request.template_config, request.submitted_by)
             contents: List[Any] = [prompt] # Use Any for mixed Part/str types initially
-            files_processed = {"audio": 0, "images": 0, "errors": []}
-            
-            all_file_processing_tasks = []
-
-            # Prepare audio tasks
-            all_audio_urls = [request.primary_audio_url] + (request.additional_audio_urls or [])
-            logger.info(f"🎵 Preparing {len(all_audio_urls)} audio file task(s)...")
-            for i, audio_url in enumerate(all_audio_urls):
-                file_identifier = f"primary_audio" if i == 0 else f"additional_audio_{i}"
-                all_file_processing_tasks.append(
-                    process_single_audio_file(audio_url, file_identifier)
-                )
 
-            # Prepare image tasks
-            image_urls = request.image_urls or []
-            logger.info(f"🖼️ Preparing {len(image_urls)} image file task(s)...")
-            for i, image_url in enumerate(image_urls):
-                file_identifier = f"image_{i}"
-                all_file_processing_tasks.append(
-                    process_single_image_file(image_url, file_identifier)
-                )
-            
-            if not all_file_processing_tasks:
-                 logger.warning("No files to process.")
-                 # Decide if this should be an error or proceed with only prompt
-                 # For now, assuming at least primary_audio_url is always there.
-
-            logger.info(f"🚀 Launching processing for {len(all_file_processing_tasks)} files concurrently...")
-            # We are using return_exceptions=False here because process_single_* functions
-            # now catch their own exceptions and return an error message.
-            # If they were to raise exceptions, gather would stop on first error.
-            # To handle individual errors and continue, we'll check the error_msg in results.
-            # Using return_exceptions=True is also an option, then result could be an Exception object.
-            # For this pattern (returning error messages), False is fine.
-            all_results = await asyncio.gather(*all_file_processing_tasks) # No return_exceptions needed with current error handling
-
-            for result_tuple in all_results:
-                part, identifier, url, error_message = result_tuple
-                
-                if error_message:
-                    files_processed["errors"].append(error_message)
-                    # Optionally, you could add more details like which URL failed
-                    # logger.error(f"Error processing {identifier} from {url}: {error_message}")
-                elif part:
-                    contents.append(part)
-                    if "audio" in identifier:
-                        files_processed["audio"] += 1
-                    elif "image" in identifier:
-                        files_processed["images"] += 1
-                else:
-                    # This case should ideally not happen if error_message is set when part is None
-                    unknown_error_msg = f"Unknown issue processing {identifier} from {url} - no part and no error message."
-                    logger.error(unknown_error_msg)
-                    files_processed["errors"].append(unknown_error_msg)
+            all_file_processing_tasks = build_file_processing_tasks(request, client, media_loader)
 
+            logger.info(f"🚀 Launching processing for {len(all_file_processing_tasks)} files concurrently...", extra={"stage": "request"})
+            # process_single_* functions catch their own exceptions and return an error
+            # message; this raises for backpressure (ConversionQueueFullError), the request
+            # deadline or a failed file the partial-result policy requires.
+            all_results = await gather_file_results(all_file_processing_tasks)
+            parts, files_processed = collect_file_results(all_results)
+            contents.extend(parts)
 
             total_files_successfully_processed = files_processed["audio"] + files_processed["images"]
-            logger.info(f"🤖 Generating summary with Gemini 2.5 Flash Preview...")
-            logger.info(f"📊 Total files successfully processed for Gemini: {total_files_successfully_processed} ({files_processed['audio']} audio + {files_processed['images']} images)")
-
-            if files_processed["errors"]:
-                logger.warning(f"⚠️ {len(files_processed['errors'])} file(s) had processing errors: {files_processed['errors']}")
+            logger.info(f"🤖 Generating summary with {GEMINI_MODEL}...", extra={"stage": "request"})
 
             if total_files_successfully_processed == 0 and not request.primary_audio_url: # Or more robust check
                  # If even the primary audio failed or no files were ever meant to be processed (unlikely with schema)
                  raise HTTPException(status_code=400, detail="No files were successfully processed to generate a summary.")
-            
-            # Ensure contents for Gemini are of type List[Part | str]
-            gemini_contents: List[types.Part | str] = []
-            for item in contents:
-                if isinstance(item, (types.Part, str)):
-                    gemini_contents.append(item)
-                else:
-                    logger.warning(f"Skipping unexpected item type in contents: {type(item)}")
-
-
-                   # Log content structure for debugging
-            for idx, item in enumerate(gemini_contents):
-                if isinstance(item, str):
-                    logger.info(f"gemini_contents[{idx}] type: str (prompt) length: {len(item)}")
-                elif isinstance(item, types.Part):
-                    # Access mime_type via inline_data for parts created from bytes
-                    if hasattr(item, 'inline_data') and item.inline_data:
-                        logger.info(f"gemini_contents[{idx}] type: Part, mime_type: {item.inline_data.mime_type}")
-                    elif hasattr(item, 'text') and item.text: # Handle parts that might just be text
-                        logger.info(f"gemini_contents[{idx}] type: Part (text only), length: {len(item.text)}")
-                    else:
-                        logger.info(f"gemini_contents[{idx}] type: Part (structure not logged in detail)")
-                # The 'else' case for unknown types in gemini_contents should ideally not be hit
-                # because you filter gemini_contents to be List[types.Part | str]
-                # else:
-                #    logger.info(f"gemini_contents[{idx}] type: {type(item)} (unexpected type in gemini_contents)")
-            response = await client.aio.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=gemini_contents # Use the filtered and typed list
-            )
+
+            gemini_contents = build_gemini_contents(contents)
+            # Sends a cached-content reference instead of the prompt when one exists for the model
+            gemini_request = prompt_cache.request(prompt_key, prompt, gemini_contents[1:])
+            async with gemini_slot() if gemini_slot else nullcontext():
+                with stage_timer("gemini"):
+                    # Rate-limited, retried and (optionally) hedged; may answer from a fallback model
+                    response, model = await gemini_caller.generate_content(client, gemini_request)
 
             summary_text = response.text
-            logger.info(f"✅ Summary generated successfully ({len(summary_text)} characters)")
-            logger.info(f"📈 Processing complete: {files_processed['audio']} audio + {files_processed['images']} images processed successfully.")
+            logger.info(f"✅ Summary generated successfully ({len(summary_text)} characters)", extra={"stage": "request"})
+            logger.info(f"📈 Processing complete: {files_processed['audio']} audio + {files_processed['images']} images processed successfully.", extra={"stage": "request"})
 
             return GenerateSummaryResponse(
                 summary=summary_text,
-                model="gemini-2.0-flash",
+                model=model,
                 timestamp=datetime.now().isoformat(),
                 files_processed=files_processed
             )
 
         except HTTPException: # Re-raise HTTPExceptions directly
             raise
+        except RequiredFileError as e:
+            logger.error("❌ Required file failed (logged above), cancelling the request")
+            raise HTTPException(status_code=400, detail=str(e))
+        except DeadlineExceededError as e:
+            logger.error(f"❌ {e}")
+            raise HTTPException(status_code=504, detail=deadline_exceeded_detail())
+        except GeminiUnavailableError as e:
+            logger.error(f"❌ {e}")
+            if deadline_exceeded():
+                raise HTTPException(status_code=504, detail=deadline_exceeded_detail())
+            raise HTTPException(
+                status_code=503,
+                detail="Gemini is temporarily unavailable, please retry shortly",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except ConversionQueueFullError as e:
+            logger.warning(f"⚠️ {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Media conversion queue is full, please retry shortly",
+                headers={"Retry-After": str(e.retry_after)}
+            )
         except Exception as e:
             logger.error(f"❌ Error generating summary: {e}", exc_info=True) # Add exc_info for traceback
             raise HTTPException(
@@ -438,6 +1852,294 @@ async def generate_summary(request: GenerateSummaryRequest):
                 detail=f"Failed to generate summary: {str(e)}"
             )
 
+@app.post("/api/generate-summary", response_model=GenerateSummaryResponse)
+async def generate_summary(
+    request: GenerateSummaryRequest,
+    x_request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout"),
+):
+    """Generate AI summary using Gemini 2.5 Flash Preview with Base64 Inline Data"""
+    return await run_summary_pipeline(request, timeout=request_timeout(x_request_timeout))
+
+@app.post("/api/generate-summary/stream")
+async def generate_summary_stream(
+    request: GenerateSummaryRequest,
+    x_request_timeout: Optional[float] = Header(default=None, alias="X-Request-Timeout"),
+):
+    """Generate AI summary and stream progress and summary text as Server-Sent Events.
+
+    Events, in order:
+      - ``file``: one per audio/image as it finishes processing
+      - ``chunk``: summary text as Gemini generates it
+      - ``done``: model, timestamp and files_processed
+      - ``error``: sent instead of the remaining events if processing fails
+    """
+
+    async def event_stream():
+        timings = start_request_timings()
+        start_deadline(request_timeout(x_request_timeout))
+        outcome = "error"
+        with stage_timer("total"):
+            async with gemini_manager as client:
+                try:
+                    prompt_key, prompt = prompt_cache.get(request.template_config, request.submitted_by)
+                    file_tasks = build_file_processing_tasks(request, client)
+                    logger.info(f"🚀 Launching processing for {len(file_tasks)} files concurrently (streaming)...", extra={"stage": "request"})
+
+                    results: list = [None] * len(file_tasks)
+                    completed = 0
+                    # aclosing: a client disconnect cancels the outstanding file tasks right away
+                    async with aclosing(iter_file_results(file_tasks)) as file_results:
+                        async for index, result in file_results:
+                            results[index] = result
+                            _, identifier, _, error_message = result
+                            completed += 1
+                            yield sse_event("file", {
+                                "identifier": identifier,
+                                "status": "error" if error_message else "processed",
+                                "error": error_message,
+                                "completed": completed,
+                                "total": len(file_tasks),
+                            })
+
+                    # Keep the original primary-first order for the model input.
+                    parts, files_processed = collect_file_results(results)
+                    gemini_contents = build_gemini_contents([prompt, *parts])
+                    gemini_request = prompt_cache.request(prompt_key, prompt, gemini_contents[1:])
+
+                    logger.info("🤖 Streaming summary with Gemini...", extra={"stage": "request"})
+                    summary_length = 0
+                    model = GEMINI_MODEL
+                    with stage_timer("gemini"):
+                        async for model, text in gemini_caller.stream(client, gemini_request, stream_gemini_text):
+                            summary_length += len(text)
+                            yield sse_event("chunk", {"text": text})
+
+                    logger.info(f"✅ Summary streamed successfully ({summary_length} characters)", extra={"stage": "request"})
+                    outcome = "success"
+                    if request.include_timings:
+                        files_processed["timings"] = timing_breakdown(timings)
+                    yield sse_event("done", {
+                        "model": model,
+                        "timestamp": datetime.now().isoformat(),
+                        "files_processed": files_processed,
+                    })
+                except RequiredFileError as e:
+                    logger.error("❌ Required file failed (logged above), cancelling the request")
+                    yield sse_event("error", {"status_code": 400, "detail": str(e)})
+                except DeadlineExceededError as e:
+                    logger.error(f"❌ {e}")
+                    yield sse_event("error", {"status_code": 504, "detail": deadline_exceeded_detail()})
+                except ConversionQueueFullError as e:
+                    logger.warning(f"⚠️ {e}")
+                    yield sse_event("error", {
+                        "status_code": 503,
+                        "detail": "Media conversion queue is full, please retry shortly",
+                        "retry_after": e.retry_after,
+                    })
+                except GeminiUnavailableError as e:
+                    logger.error(f"❌ {e}")
+                    if deadline_exceeded():
+                        yield sse_event("error", {"status_code": 504, "detail": deadline_exceeded_detail()})
+                    else:
+                        yield sse_event("error", {
+                            "status_code": 503,
+                            "detail": "Gemini is temporarily unavailable, please retry shortly",
+                            "retry_after": e.retry_after,
+                        })
+                except TimeoutError:
+                    # Gemini stalled after the first chunk, so the stream could not be retried
+                    logger.error("❌ Gemini stopped sending the summary mid-stream")
+                    yield sse_event("error", {
+                        "status_code": 504,
+                        "detail": deadline_exceeded_detail() if deadline_exceeded() else "Gemini stopped sending the summary, please retry",
+                    })
+                except Exception as e:
+                    logger.error(f"❌ Error streaming summary: {e}", exc_info=True)
+                    yield sse_event("error", {"status_code": 500, "detail": f"Failed to generate summary: {str(e)}"})
+                finally:
+                    SUMMARY_REQUESTS.labels("stream", outcome).inc()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _run_summary_job(request: dict) -> dict:
+    response = await run_summary_pipeline(GenerateSummaryRequest(**request), endpoint="job", timeout=request_timeout())
+    return response.model_dump()
+
+summary_jobs = JobManager(
+    backend=build_job_queue(JOB_QUEUE_BACKEND, JOB_QUEUE_SQLITE_PATH, JOB_POLL_INTERVAL_SECONDS, JOB_LEASE_SECONDS),
+    handler=_run_summary_job,
+    concurrency=JOB_WORKER_CONCURRENCY,
+    result_ttl=JOB_RESULT_TTL_SECONDS,
+    poll_interval=JOB_POLL_INTERVAL_SECONDS,
+)
+
+def _job_response(job: dict) -> SummaryJobResponse:
+    return SummaryJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        idempotency_key=job["idempotency_key"],
+        created_at=datetime.fromtimestamp(job["created_at"]).isoformat(),
+        updated_at=datetime.fromtimestamp(job["updated_at"]).isoformat(),
+        result=job["result"],
+        error=job["error"],
+    )
+
+@app.post("/api/jobs/generate-summary", response_model=SummaryJobResponse, status_code=202)
+async def submit_summary_job(
+    request: GenerateSummaryRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
+    """Queue summary generation and return a job id to poll.
+
+    Send the consultation id as ``Idempotency-Key`` so retries and double clicks
+    return the existing job instead of generating twice. A failed job does not
+    block a new submission with the same key.
+    """
+    job, created = await summary_jobs.submit(request.model_dump(), idempotency_key)
+    if not created:
+        response.status_code = 200
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    logger.info(f"📬 Summary job {job['id']} {'queued' if created else 'already exists'} (key: {idempotency_key})")
+    return _job_response(job)
+
+@app.get("/api/jobs/{job_id}", response_model=SummaryJobResponse)
+async def get_summary_job(job_id: str, wait: float = Query(default=0, ge=0)):
+    """Job status and result. ``wait`` long-polls up to that many seconds for the job to finish."""
+    timeout = min(wait, JOB_MAX_WAIT_SECONDS)
+    job = await summary_jobs.wait(job_id, timeout) if timeout else await summary_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return _job_response(job)
+
+# Batch summaries
+class BatchMediaLoader:
+    """Processes each distinct media URL in a batch once, shared by every consultation that uses it.
+
+    Downloads and conversions for the whole batch are bounded by one semaphore, so
+    later consultations' media is prepared while earlier ones are with Gemini. Each
+    file's stage timings and details are recorded on the loader and copied into
+    every consultation that uses it.
+    """
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._tasks: dict[tuple[str, str], asyncio.Task] = {}
+        self.requested = 0
+
+    async def _run(self, process, url: str, identifier: str, client):
+        async with self._semaphore:
+            # Timed in its own breakdown rather than the consultation that happened to start it
+            timings = start_request_timings()
+            return await process(url, identifier, client), timings
+
+    async def _load(self, kind: str, process, url: str, identifier: str, client):
+        self.requested += 1
+        task = self._tasks.get((kind, url))
+        if task is None:
+            task = asyncio.create_task(self._run(process, url, identifier, client))
+            self._tasks[(kind, url)] = task
+        # Shielded so one consultation being cancelled does not cancel media others share.
+        (part, source_identifier, _, error_message), timings = await asyncio.shield(task)
+        copy_file_timings(timings, source_identifier, identifier)
+        return part, identifier, url, error_message
+
+    async def audio(self, url: str, identifier: str, client=None):
+        return await self._load("audio", process_single_audio_file, url, identifier, client)
+
+    async def image(self, url: str, identifier: str, client=None):
+        return await self._load("image", process_single_image_file, url, identifier, client)
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {"requested": self.requested, "unique": len(self._tasks)}
+
+batch_gemini_semaphore = asyncio.Semaphore(max(BATCH_GEMINI_CONCURRENCY, 1))
+batch_gemini_limiter = TokenBucket(BATCH_GEMINI_RATE_PER_MINUTE, BATCH_GEMINI_BURST)
+batch_stats = {"batches": 0, "consultations": 0, "gemini_waiting": 0}
+
+@asynccontextmanager
+async def batch_gemini_slot():
+    """Hold one of the instance-wide batch Gemini slots and a rate-limit token"""
+    batch_stats["gemini_waiting"] += 1
+    try:
+        await batch_gemini_semaphore.acquire()
+    finally:
+        batch_stats["gemini_waiting"] -= 1
+    try:
+        await batch_gemini_limiter.acquire()
+        yield
+    finally:
+        batch_gemini_semaphore.release()
+
+def batch_summary_stats() -> dict:
+    return {**batch_stats, "gemini_concurrency": BATCH_GEMINI_CONCURRENCY, "rate_limit": batch_gemini_limiter.stats()}
+
+async def _run_batch_consultation(index: int, request: GenerateSummaryRequest, media_loader: BatchMediaLoader) -> dict:
+    # Runs in its own task, so this only re-tags this consultation's log lines
+    set_request_id(f"{get_request_id()}-{index}")
+    try:
+        response = await run_summary_pipeline(request, endpoint="batch", media_loader=media_loader, gemini_slot=batch_gemini_slot)
+        return {"index": index, "status": "succeeded", "result": response.model_dump(), "error": None}
+    except Exception as e:
+        error = {"status_code": getattr(e, "status_code", 500), "detail": getattr(e, "detail", str(e))}
+        return {"index": index, "status": "failed", "result": None, "error": error}
+
+@app.post("/api/generate-summaries/batch")
+async def generate_summaries_batch(batch: BatchSummaryRequest):
+    """Summarise several consultations in one request, streaming each result as Server-Sent Events.
+
+    Media URLs shared between consultations are downloaded and converted once, and
+    Gemini calls go through the instance-wide batch concurrency and rate limits.
+
+    Events:
+      - ``result``: one per consultation as it finishes, in completion order. ``index``
+        is its position in the request; ``result`` is the normal summary response,
+        or ``error`` holds ``status_code`` and ``detail``
+      - ``done``: totals and media dedupe counts
+    """
+    consultations = batch.consultations
+    batch_stats["batches"] += 1
+    batch_stats["consultations"] += len(consultations)
+    logger.info(f"📦 Batch of {len(consultations)} consultations received")
+
+    async def event_stream():
+        media_loader = BatchMediaLoader(BATCH_MEDIA_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(_run_batch_consultation(index, request, media_loader))
+            for index, request in enumerate(consultations)
+        ]
+        succeeded = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                succeeded += result["status"] == "succeeded"
+                yield sse_event("result", result)
+            media = media_loader.stats()
+            logger.info(f"📦 Batch finished: {succeeded}/{len(tasks)} succeeded, {media['unique']} unique of {media['requested']} media files")
+            yield sse_event("done", {
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "media": media,
+            })
+        finally:
+            for task in tasks:
+                task.cancel()
+            media_loader.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Error handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -447,15 +2149,101 @@ async def global_exception_handler(request, exc):
         content={"error": "Internal server error", "detail": str(exc)}
     )
 
+# Startup warm-up and cold-start timings
+warmup_state = {"task": None, "warm": False}
+
+def startup_stats() -> dict:
+    """Import, startup and warm-up timings in seconds (process_to_* count from process start)"""
+    return {
+        "pid": os.getpid(),
+        "workers": SERVER_WORKERS,
+        "cpus": INSTANCE_CPUS,
+        "lazy_imports": LAZY_IMPORTS,
+        "warm": warmup_state["warm"],
+        **startup_timings(),
+    }
+
+def _prime_image_codecs() -> int:
+    """Encode and decode a tiny image in every output format; runs in each conversion worker"""
+    image = Image.new("RGB", (16, 16), (255, 255, 255))
+    for spec in IMAGE_FORMATS.values():
+        output = io.BytesIO()
+        image.save(output, format=spec["pil_format"])
+        Image.open(io.BytesIO(output.getvalue())).load()
+    return os.getpid()
+
+async def warm_up():
+    """Load heavy modules and prime the Gemini client, ffmpeg and PIL; failures are logged, not raised"""
+    started = time.perf_counter()
+    with timed_step("warmup_imports"):
+        # In a thread so the event loop keeps answering /health meanwhile
+        await asyncio.to_thread(load_modules, genai, types, ffmpeg, Image, ImageOps, requests, audio_compaction)
+    with timed_step("warmup_gemini_client"):
+        try:
+            gemini_files.start(await gemini_manager.start())
+        except Exception:
+            pass  # already logged; /health reports it and the next request retries
+    with timed_step("warmup_ffmpeg"):
+        try:
+            # 0.2 s of silence through the output codec loads the ffmpeg binary and its codec libraries
+            await _encode_pcm(bytes(AUDIO_SAMPLE_RATE // 5 * 2), "flac" if AUDIO_OUTPUT_CODEC == "wav" else AUDIO_OUTPUT_CODEC)
+        except Exception as e:
+            logger.warning(f"⚠️ ffmpeg warm-up failed: {e}")
+    with timed_step("warmup_image_codecs"):
+        try:
+            await asyncio.gather(*(conversion_executor.run_image(_prime_image_codecs) for _ in range(conversion_executor.image_workers)))
+        except Exception as e:
+            logger.warning(f"⚠️ Image codec warm-up failed: {e}")
+    record_step("warmup", time.perf_counter() - started)
+    record_step("process_to_warm", process_age())
+    warmup_state["warm"] = True
+    logger.info(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s ({process_age():.2f}s after process start)")
+
+record_step("app_import", time.perf_counter() - _IMPORT_STARTED)
+
 # Add a startup event to log environment info
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 Application starting up...")
     # Example: You might want to log the detected environment (dev, staging, prod)
     # logger.info(f"Environment: {os.getenv('APP_ENV', 'development')}")
+    startup_started = time.perf_counter()
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_IO_THREADS, thread_name_prefix="blocking-io")
+    )
+    if not WARMUP_ON_STARTUP:
+        try:
+            await gemini_manager.start()
+        except Exception:
+            # Keep serving; /health reports the error and the next request retries.
+            pass
+    await download_manager.start()
+    await conversion_executor.start()
+    gemini_files.start(gemini_manager.client)
+    summary_jobs.start()
+    if WARMUP_ON_STARTUP:
+        warmup_state["task"] = asyncio.create_task(warm_up())
+    record_step("startup_hooks", time.perf_counter() - startup_started)
+    record_step("process_to_ready", process_age())
+    timings = startup_timings()
+    logger.info(
+        f"✅ Ready {timings['process_to_ready']:.2f}s after process start "
+        f"(app import {timings['app_import']:.2f}s, startup hooks {timings['startup_hooks']:.2f}s, {SERVER_WORKERS} worker(s), pid {os.getpid()})"
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("👋 Application shutting down...")
+    if warmup_state["task"] is not None and not warmup_state["task"].done():
+        warmup_state["task"].cancel()
+    await download_manager.close()
+    await conversion_executor.shutdown()
+    await summary_jobs.stop()
+    await gemini_files.stop()
+    await prompt_cache.stop()
 
 if __name__ == "__main__":
     # For local development only
     import uvicorn
     # The app object is already defined, no need to use "main:app" string for uvicorn.run when in the same file.
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8080)), log_level="info")
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8080)), log_level=LOG_LEVEL.lower(), log_config=None)
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""
+Doctor Reception System - Converted Media Cache
+Content-addressed cache for transcoded audio and resized images so that
+regenerating a summary for the same consultation skips download and conversion.
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CachedMedia(NamedTuple):
+    """Converted payload ready to be wrapped in a Gemini ``types.Part``.
+
+    ``validator`` is the ETag (or Last-Modified) of the source object it was
+    converted from, for entries keyed by URL; None for content-hash entries.
+    """
+    data: bytes
+    mime_type: str
+    validator: Optional[str] = None
+
+
+def media_cache_key(*parts: str) -> str:
+    """Build a key from a conversion variant plus the source URL or content hash"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """Interface for converted-media caches. Subclasses override the _get/_put hooks."""
+    name = "base"
+    enabled = True
+
+    def __init__(self):
+        self._stats = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0}
+
+    async def get(self, key: str) -> Optional[CachedMedia]:
+        value = await self._get(key)
+        self._stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    async def put(self, key: str, value: CachedMedia) -> None:
+        self._stats["puts"] += 1
+        await self._put(key, value)
+
+    async def _get(self, key: str) -> Optional[CachedMedia]:
+        raise NotImplementedError
+
+    async def _put(self, key: str, value: CachedMedia) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "backend": self.name,
+            **self._stats,
+            "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+class NullMediaCache(MediaCache):
+    """Cache that never stores anything (MEDIA_CACHE_BACKEND=none)"""
+    name = "none"
+    enabled = False
+
+    async def _get(self, key: str) -> Optional[CachedMedia]:
+        return None
+
+    async def _put(self, key: str, value: CachedMedia) -> None:
+        return None
+
+
+class MemoryLRUCache(MediaCache):
+    """In-process LRU bounded by total payload bytes"""
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, CachedMedia]" = OrderedDict()
+
+    async def _get(self, key: str) -> Optional[CachedMedia]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    async def _put(self, key: str, value: CachedMedia) -> None:
+        size = len(value.data)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= len(previous.data)
+        self._entries[key] = value
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted.data)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes}
+
+
+class DiskCache(MediaCache):
+    """On-disk tier bounded by total file bytes, evicting least recently used files.
+
+    Each entry is one file: the MIME type (and the validator, after a tab) on the
+    first line followed by the payload.
+    Blocking file I/O runs in a worker thread. Entries being read are leased: an
+    entry evicted meanwhile leaves the index at once but its file is only deleted
+    once the last reader is done, so a hit is never cut short by an eviction.
+    """
+    name = "disk"
+
+    def __init__(self, directory: str, max_bytes: int):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # key -> size, ordered from least to most recently used
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._readers: dict[str, int] = {}
+        self._evicted_while_read: set[str] = set()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load_index(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.current_bytes += size
+
+    def _read(self, key: str) -> Optional[CachedMedia]:
+        try:
+            with open(self._path(key), "rb") as f:
+                mime_type, _, validator = f.readline().decode("utf-8").rstrip("\n").partition("\t")
+                data = f.read()
+            os.utime(self._path(key))
+            return CachedMedia(data, mime_type, validator or None)
+        except OSError:
+            return None
+
+    def _write(self, key: str, value: CachedMedia) -> int:
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(f"{value.mime_type}\t{value.validator or ''}\n".encode("utf-8"))
+            f.write(value.data)
+        os.replace(tmp_path, self._path(key))
+        return os.path.getsize(self._path(key))
+
+    def _remove(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    async def _get(self, key: str) -> Optional[CachedMedia]:
+        if key not in self._index:
+            return None
+        self._readers[key] = self._readers.get(key, 0) + 1
+        try:
+            value = await asyncio.to_thread(self._read, key)
+        finally:
+            await self._release(key)
+        if value is None:
+            if key in self._index:
+                self.current_bytes -= self._index.pop(key)
+            return None
+        if key in self._index:
+            self._index.move_to_end(key)
+        return value
+
+    async def _release(self, key: str):
+        self._readers[key] -= 1
+        if self._readers[key] == 0:
+            del self._readers[key]
+            # Evicted during the read and not written again since
+            if key in self._evicted_while_read and key not in self._index:
+                self._evicted_while_read.discard(key)
+                await asyncio.to_thread(self._remove, key)
+
+    async def _put(self, key: str, value: CachedMedia) -> None:
+        if len(value.data) > self.max_bytes:
+            return
+        try:
+            size = await asyncio.to_thread(self._write, key, value)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to write media cache entry {key}: {e}")
+            return
+        self.current_bytes -= self._index.pop(key, 0)
+        self._index[key] = size
+        self._evicted_while_read.discard(key)
+        self.current_bytes += size
+        evicted = []
+        while self.current_bytes > self.max_bytes and self._index:
+            old_key, old_size = self._index.popitem(last=False)
+            self.current_bytes -= old_size
+            self._stats["evictions"] += 1
+            if old_key in self._readers:
+                self._evicted_while_read.add(old_key)  # deleted by the last reader
+            else:
+                evicted.append(old_key)
+        for old_key in evicted:
+            await asyncio.to_thread(self._remove, old_key)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "entries": len(self._index),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "directory": self.directory,
+        }
+
+
+class TieredMediaCache(MediaCache):
+    """Memory LRU in front of the disk tier; disk hits are promoted to memory"""
+    name = "tiered"
+
+    def __init__(self, memory: MemoryLRUCache, disk: DiskCache):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    async def _get(self, key: str) -> Optional[CachedMedia]:
+        value = await self.memory.get(key)
+        if value is None:
+            value = await self.disk.get(key)
+            if value is not None:
+                await self.memory.put(key, value)
+        return value
+
+    async def _put(self, key: str, value: CachedMedia) -> None:
+        await self.memory.put(key, value)
+        await self.disk.put(key, value)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+def build_media_cache(backend: str, memory_max_bytes: int, disk_max_bytes: int, disk_directory: str) -> MediaCache:
+    """Create the cache selected by MEDIA_CACHE_BACKEND (none, memory, disk or tiered)"""
+    backend = (backend or "none").lower()
+    if backend == "memory":
+        return MemoryLRUCache(memory_max_bytes)
+    if backend == "disk":
+        return DiskCache(disk_directory, disk_max_bytes)
+    if backend == "tiered":
+        return TieredMediaCache(MemoryLRUCache(memory_max_bytes), DiskCache(disk_directory, disk_max_bytes))
+    if backend != "none":
+        logger.warning(f"⚠️ Unknown MEDIA_CACHE_BACKEND '{backend}', media cache disabled")
+    return NullMediaCache()
@@ -0,0 +1,154 @@
+"""
+Doctor Reception System - Pipeline Metrics
+Per-stage latency histograms, byte counters, in-flight gauges and error counters,
+exposed in Prometheus text format, plus an optional per-request timing breakdown.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Stages: download, mime_detection, stream_transcode (download piped through ffmpeg),
+# transcode, silence_removal, chunk_planning, transcribe, image_resize, files_upload, gemini, total
+STAGE_SECONDS = Histogram(
+    "doctor_recep_stage_seconds",
+    "Time spent in each summary pipeline stage",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+STAGE_IN_FLIGHT = Gauge("doctor_recep_stage_in_flight", "Operations currently in each pipeline stage", ["stage"])
+STAGE_ERRORS = Counter("doctor_recep_stage_errors_total", "Failures by pipeline stage", ["stage"])
+BYTES_DOWNLOADED = Counter("doctor_recep_bytes_downloaded_total", "Bytes downloaded from media storage")
+BYTES_SENT_TO_MODEL = Counter(
+    "doctor_recep_bytes_sent_to_model_total",
+    "Converted media bytes handed to Gemini",
+    ["kind", "transport"],
+)
+AUDIO_COMPACTION_RATIO = Histogram(
+    "doctor_recep_audio_compaction_ratio",
+    "Original / compacted audio duration after silence removal",
+    buckets=(1, 1.1, 1.25, 1.5, 2, 3, 5, 10),
+)
+SUMMARY_REQUESTS = Counter(
+    "doctor_recep_summary_requests_total",
+    "Summary requests by endpoint and outcome",
+    ["endpoint", "outcome"],
+)
+
+FILE_TASKS_CANCELLED = Counter(
+    "doctor_recep_file_tasks_cancelled_total",
+    "Downloads/conversions cancelled because a required file failed or the request deadline passed",
+)
+
+_request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+_current_file: ContextVar[Optional[str]] = ContextVar("current_file", default=None)
+
+
+def start_request_timings() -> dict:
+    """Begin collecting a timing breakdown for the current request (and tasks it spawns)"""
+    timings = {"stages": {}, "files": {}, "details": {}}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def file_scope(identifier: str) -> Iterator[None]:
+    """Attribute stages timed inside this block to one input file"""
+    token = _current_file.set(identifier)
+    try:
+        yield
+    finally:
+        _current_file.reset(token)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time a pipeline stage: histogram, in-flight gauge, error counter and request breakdown"""
+    STAGE_IN_FLIGHT.labels(stage).inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_IN_FLIGHT.labels(stage).dec()
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            identifier = _current_file.get()
+            bucket = timings["files"].setdefault(identifier, {}) if identifier else timings["stages"]
+            bucket[f"{stage}_ms"] = round(bucket.get(f"{stage}_ms", 0.0) + elapsed * 1000, 2)
+
+
+def record_file_detail(name: str, value) -> None:
+    """Attach a non-timing fact (e.g. audio compaction stats) to the current file of the current request"""
+    timings = _request_timings.get()
+    identifier = _current_file.get()
+    if timings is not None and identifier:
+        timings["details"].setdefault(identifier, {})[name] = value
+
+
+def copy_file_timings(timings: Optional[dict], source_identifier: str, identifier: str) -> None:
+    """Copy one file's stages and details from ``timings`` (work shared between requests,
+    timed in its own breakdown) into the current request under ``identifier``"""
+    current = _request_timings.get()
+    if current is None or timings is None or current is timings:
+        return
+    for section in ("files", "details"):
+        if source_identifier in timings[section]:
+            current[section][identifier] = dict(timings[section][source_identifier])
+
+
+def request_file_details(name: str) -> dict:
+    """{file identifier: value} recorded under ``name`` for the current request"""
+    timings = _request_timings.get()
+    if timings is None:
+        return {}
+    return {identifier: details[name] for identifier, details in timings["details"].items() if name in details}
+
+
+def timing_breakdown(timings: dict) -> dict:
+    """Request-level stages plus per-file stages, in milliseconds"""
+    return {**timings["stages"], "files": timings["files"]}
+
+
+class StatsCollector:
+    """Exports the numeric fields of existing stats() dicts as Prometheus gauges"""
+
+    def __init__(self):
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def register(self, prefix: str, stats: Callable[[], dict]):
+        self._sources[prefix] = stats
+
+    def collect(self):
+        for prefix, stats in self._sources.items():
+            for name, value in _flatten(stats()):
+                yield GaugeMetricFamily(f"doctor_recep_{prefix}_{name}", f"{prefix} {name.replace('_', ' ')}", value=value)
+
+
+def _flatten(stats: dict, prefix: str = "") -> Iterator[tuple[str, float]]:
+    for key, value in stats.items():
+        # Per-host and other keyed breakdowns would explode label cardinality; skip them.
+        if isinstance(value, bool) or not isinstance(value, (int, float, dict)) or key == "hosts":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        else:
+            yield name, float(value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Prometheus exposition body and content type"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
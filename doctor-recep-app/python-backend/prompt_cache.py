@@ -0,0 +1,243 @@
+"""
+Doctor Reception System - Prompt Cache
+Memoizes the rendered summary prompt per template configuration and, optionally,
+registers it as Gemini cached content so repeat requests send only the media
+plus a cache reference.
+"""
+
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from gemini_calls import GeminiRequest
+from startup import lazy_module
+
+genai_errors = lazy_module("google.genai.errors")
+types = lazy_module("google.genai.types")
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean a cached-content reference is no longer usable (expired,
+# deleted or created for another model); the call is retried with the prompt inline.
+STALE_CACHE_STATUS_CODES = {400, 403, 404}
+
+
+def prompt_key(template_config, submitted_by: str) -> str:
+    """Stable hash of everything the rendered prompt depends on"""
+    config_json = template_config.model_dump_json() if template_config is not None else ""
+    return hashlib.sha256(f"{config_json}\0{submitted_by}".encode()).hexdigest()
+
+
+class PromptCache:
+    """Bounded LRU of rendered prompts keyed on ``prompt_key``.
+
+    With ``context_cache`` enabled each prompt is also created as Gemini cached
+    content per model on first use. Handles are refreshed (TTL extended) when
+    they are used within ``refresh_margin`` seconds of expiring, recreated if they
+    expired, dropped when the call reports them stale and deleted when their prompt
+    is evicted. The API has a minimum token count for cached content; a prompt it
+    rejects is sent inline and creation is not retried for ``retry_after_failure``
+    seconds. Concurrent requests for the same prompt share one create call.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[Any, str], str],
+        max_entries: int,
+        context_cache: bool = False,
+        ttl: int = 3600,
+        refresh_margin: int = 600,
+        retry_after_failure: int = 3600,
+        create_timeout: float = 10.0,
+    ):
+        self.render = render
+        self.max_entries = max(max_entries, 1)
+        self.context_cache = context_cache
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after_failure = retry_after_failure
+        self.create_timeout = create_timeout
+        self._prompts: "OrderedDict[str, str]" = OrderedDict()
+        # (prompt key, model) -> {"name", "expires_at"}; name is None after a failed create
+        self._handles: dict[tuple[str, str], dict] = {}
+        self._creates_in_flight: dict[tuple[str, str], asyncio.Future] = {}
+        self._background: set[asyncio.Task] = set()
+        self._client = None
+        self._stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "cache_creates": 0, "cache_create_errors": 0,
+            "cache_refreshes": 0, "cache_hits": 0, "cache_invalidations": 0, "cache_deletes": 0,
+        }
+
+    def get(self, template_config, submitted_by: str) -> tuple[str, str]:
+        """(key, prompt text) for this template, rendering it on a miss"""
+        key = prompt_key(template_config, submitted_by)
+        prompt = self._prompts.get(key)
+        if prompt is not None:
+            self._prompts.move_to_end(key)
+            self._stats["hits"] += 1
+            return key, prompt
+        self._stats["misses"] += 1
+        prompt = self.render(template_config, submitted_by)
+        self._prompts[key] = prompt
+        while len(self._prompts) > self.max_entries:
+            evicted, _ = self._prompts.popitem(last=False)
+            self._stats["evictions"] += 1
+            self._forget(evicted)
+        return key, prompt
+
+    def request(self, key: str, prompt: str, parts: list) -> GeminiRequest:
+        """A GeminiRequest for ``parts`` that references the cached prompt where it can"""
+        return CachedPromptRequest(self, key, prompt, parts)
+
+    async def cached_content(self, client, key: str, prompt: str, model: str) -> Optional[str]:
+        """Name of a live cached content holding ``prompt`` for ``model``, or None"""
+        if not self.context_cache:
+            return None
+        self._client = client or self._client
+        handle_key = (key, model)
+        entry = self._handles.get(handle_key)
+        now = time.time()
+        if entry is not None and entry["name"] is None and entry["expires_at"] > now:
+            return None  # creation failed recently
+        if entry is not None and entry["name"] is not None and entry["expires_at"] > now:
+            if entry["expires_at"] - now < self.refresh_margin:
+                await self._refresh(client, handle_key, entry)
+            if handle_key in self._handles:
+                self._stats["cache_hits"] += 1
+                return entry["name"]
+
+        in_flight = self._creates_in_flight.get(handle_key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(self._create(client, handle_key, prompt))
+            self._creates_in_flight[handle_key] = in_flight
+            in_flight.add_done_callback(lambda _: self._creates_in_flight.pop(handle_key, None))
+        return await asyncio.shield(in_flight)
+
+    async def _create(self, client, handle_key: tuple[str, str], prompt: str) -> Optional[str]:
+        key, model = handle_key
+        try:
+            cached = await asyncio.wait_for(
+                client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        contents=[types.Content(role="user", parts=[types.Part.from_text(prompt)])],
+                        ttl=f"{self.ttl}s",
+                        display_name=f"summary-prompt-{key[:16]}",
+                    ),
+                ),
+                timeout=self.create_timeout,
+            )
+        except Exception as e:
+            self._stats["cache_create_errors"] += 1
+            self._handles[handle_key] = {"name": None, "expires_at": time.time() + self.retry_after_failure}
+            logger.warning(f"⚠️ Could not cache summary prompt for {model}, sending it inline: {str(e) or type(e).__name__}")
+            return None
+        self._stats["cache_creates"] += 1
+        self._handles[handle_key] = {"name": cached.name, "expires_at": self._expires_at(cached)}
+        logger.info(f"🗂️ Cached summary prompt {key[:12]} for {model} as {cached.name}")
+        return cached.name
+
+    async def _refresh(self, client, handle_key: tuple[str, str], entry: dict):
+        try:
+            cached = await asyncio.wait_for(
+                client.aio.caches.update(name=entry["name"], config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s")),
+                timeout=self.create_timeout,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to refresh cached prompt {entry['name']}: {str(e) or type(e).__name__}")
+            self._handles.pop(handle_key, None)
+            return
+        entry["expires_at"] = self._expires_at(cached)
+        self._stats["cache_refreshes"] += 1
+
+    def _expires_at(self, cached) -> float:
+        expires_at = time.time() + self.ttl
+        if getattr(cached, "expire_time", None):
+            expires_at = min(expires_at, cached.expire_time.timestamp())
+        return expires_at
+
+    def invalidate(self, key: str, model: str) -> bool:
+        """Drop the handle for ``key`` on ``model``; True if there was a live one"""
+        entry = self._handles.pop((key, model), None)
+        if entry is None or entry["name"] is None:
+            return False
+        self._stats["cache_invalidations"] += 1
+        logger.warning(f"⚠️ Cached prompt {entry['name']} is no longer usable, sending the prompt inline")
+        self._delete_later(entry["name"])
+        return True
+
+    def _forget(self, key: str):
+        """Drop every model's handle for an evicted prompt and delete them remotely"""
+        for handle_key in [k for k in self._handles if k[0] == key]:
+            entry = self._handles.pop(handle_key)
+            if entry["name"] is not None:
+                self._delete_later(entry["name"])
+
+    def _delete_later(self, name: str):
+        try:
+            task = asyncio.get_running_loop().create_task(self._delete(name))
+        except RuntimeError:
+            return  # no loop; the cache expires on its own
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _delete(self, name: str):
+        if self._client is None:
+            return
+        try:
+            await self._client.aio.caches.delete(name=name)
+            self._stats["cache_deletes"] += 1
+        except Exception as e:
+            # Cached content expires after its TTL anyway, so a failed delete is not fatal.
+            logger.warning(f"⚠️ Failed to delete cached prompt {name}: {str(e) or type(e).__name__}")
+
+    async def stop(self):
+        """Delete all live cached content so storage stops being billed"""
+        names = [entry["name"] for entry in self._handles.values() if entry["name"] is not None]
+        self._handles.clear()
+        await asyncio.gather(*(self._delete(name) for name in names), *self._background, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "entries": len(self._prompts),
+            "max_entries": self.max_entries,
+            "context_cache": self.context_cache,
+            "live_cached_contents": sum(1 for entry in self._handles.values() if entry["name"] is not None),
+        }
+
+
+class CachedPromptRequest(GeminiRequest):
+    """Summary call that sends a cached-content reference instead of the prompt when one exists"""
+
+    def __init__(self, cache: PromptCache, key: str, prompt: str, parts: list):
+        super().__init__([prompt, *parts])
+        self.cache = cache
+        self.key = key
+        self.prompt = prompt
+        self.parts = parts
+        self._using_cache: set[str] = set()
+        self._inline_only: set[str] = set()
+
+    async def prepare(self, client, model: str) -> tuple[Any, Any]:
+        name = None
+        if model not in self._inline_only:
+            name = await self.cache.cached_content(client, self.key, self.prompt, model)
+        if name is None:
+            self._using_cache.discard(model)
+            return self.contents, None
+        self._using_cache.add(model)
+        return self.parts, types.GenerateContentConfig(cached_content=name)
+
+    async def on_failure(self, model: str, error: Exception) -> bool:
+        if model not in self._using_cache or not isinstance(error, genai_errors.APIError):
+            return False
+        if error.code not in STALE_CACHE_STATUS_CODES:
+            return False
+        # Retry once with the prompt inline; if that fails too the error is not the cache's.
+        self._inline_only.add(model)
+        self.cache.invalidate(self.key, model)
+        return True
@@ -0,0 +1,137 @@
+"""
+Doctor Reception System - Rate Limiting
+Async token buckets used to keep Gemini calls under a requests-per-minute budget,
+including an adaptive bucket that backs off when the API answers 429.
+"""
+
+import time
+import asyncio
+from typing import Optional
+
+
+class TokenBucket:
+    """Async token bucket refilling ``rate_per_minute`` tokens, bursting up to ``burst``.
+
+    A rate of 0 disables limiting. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._stats = {"acquired": 0, "throttled": 0, "wait_seconds_total": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_minute > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_minute / 60)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) * 60 / self.rate_per_minute
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        self._stats["acquired"] += 1
+        if not self.enabled:
+            return
+        started = time.monotonic()
+        async with self._lock:
+            delay = self._delay()
+            if delay > 0:
+                self._stats["throttled"] += 1
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self._delay()
+            self._tokens -= 1
+        self._stats["wait_seconds_total"] += time.monotonic() - started
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        if not self.enabled:
+            self._stats["acquired"] += 1
+            return True
+        if self._lock.locked() or self._delay() > 0:
+            return False
+        self._tokens -= 1
+        self._stats["acquired"] += 1
+        return True
+
+    def stats(self) -> dict:
+        if self.enabled:
+            self._refill()
+        return {
+            "rate_per_minute": round(self.rate_per_minute, 2),
+            "burst": self.burst,
+            "tokens": round(self._tokens, 2),
+            "acquired": self._stats["acquired"],
+            "throttled": self._stats["throttled"],
+            "wait_seconds_total": round(self._stats["wait_seconds_total"], 3),
+        }
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """Token bucket whose rate adapts to quota errors (AIMD).
+
+    Each 429 halves the rate (at most once per ``cooldown`` seconds, so one burst
+    of rejected calls counts once) down to ``min_rate_per_minute`` and honours the
+    server's Retry-After by pausing all callers. Each success adds back 1/``recovery_steps``
+    of the configured rate until it is reached again.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int = 1,
+        min_rate_per_minute: float = 1,
+        recovery_steps: int = 50,
+        cooldown: float = 1.0,
+    ):
+        super().__init__(rate_per_minute, burst)
+        self.max_rate_per_minute = rate_per_minute
+        self.min_rate_per_minute = min(min_rate_per_minute, rate_per_minute)
+        self.recovery_steps = max(recovery_steps, 1)
+        self.cooldown = cooldown
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._stats.update(rate_decreases=0)
+
+    def _delay(self) -> float:
+        pause = self._paused_until - time.monotonic()
+        return max(pause, super()._delay())
+
+    def on_success(self):
+        if self.enabled and self.rate_per_minute < self.max_rate_per_minute:
+            self._refill()
+            self.rate_per_minute = min(
+                self.max_rate_per_minute,
+                self.rate_per_minute + self.max_rate_per_minute / self.recovery_steps,
+            )
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now - self._last_decrease >= self.cooldown:
+            self._refill()
+            self.rate_per_minute = max(self.min_rate_per_minute, self.rate_per_minute / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_decrease = now
+            self._stats["rate_decreases"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "max_rate_per_minute": self.max_rate_per_minute,
+            "rate_decreases": self._stats["rate_decreases"],
+            "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 2),
+        }
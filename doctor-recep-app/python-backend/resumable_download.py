@@ -0,0 +1,263 @@
+"""
+Doctor Reception System - Resumable Downloads
+Media bodies that resume from the last byte received when the connection drops,
+whole-object downloads split into parallel byte ranges, a size cap enforced
+while streaming, and checks that the bytes received match Content-Length /
+Content-Range, the object's ETag and (when storage sends one) its MD5.
+"""
+
+import re
+import base64
+import asyncio
+import hashlib
+import logging
+from contextlib import AbstractAsyncContextManager, AsyncExitStack
+from typing import AsyncIterator, Callable, NamedTuple, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# opener(url, headers=None, reuse_slot=False) -> async context manager yielding a streamed response
+StreamOpener = Callable[..., AbstractAsyncContextManager[httpx.Response]]
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadTooLargeError(Exception):
+    """The object is larger than the configured download limit"""
+
+
+class DownloadIntegrityError(Exception):
+    """The bytes received do not match what the server declared, or the object changed mid-download"""
+
+
+class Download(NamedTuple):
+    content: bytes
+    headers: httpx.Headers
+    http_version: str
+    ranges: int
+    resumes: int
+
+
+def parse_content_range(value: Optional[str]) -> Optional[tuple[int, int, Optional[int]]]:
+    """``"bytes 0-99/1234"`` -> (0, 99, 1234); the total is None when the server sends ``*``"""
+    match = _CONTENT_RANGE.fullmatch((value or "").strip())
+    if match is None:
+        return None
+    first, last, total = match.groups()
+    return int(first), int(last), None if total == "*" else int(total)
+
+
+def validator(headers: httpx.Headers) -> Optional[str]:
+    """Strong ETag, else Last-Modified, for If-Range; weak ETags cannot be used there"""
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("last-modified")
+
+
+def expected_md5(headers: httpx.Headers) -> Optional[str]:
+    """Base64 MD5 of the whole object from GCS's x-goog-hash or Content-MD5"""
+    for value in headers.get_list("x-goog-hash"):
+        for item in value.split(","):
+            name, _, digest = item.strip().partition("=")
+            if name == "md5":
+                return digest
+    return headers.get("content-md5")
+
+
+class ResumableBody:
+    """Body of one streamed GET (or byte range of one) that survives dropped connections.
+
+    If the server accepts ranges and sent a validator, a transport error or a body
+    that ends early is resumed with ``Range: bytes=<next byte>-`` and ``If-Range``,
+    up to ``max_resumes`` times; a resume answered with anything but the expected
+    206 means the object changed and raises DownloadIntegrityError. ``max_bytes``
+    (0 = no limit) is checked against the declared object size before reading and
+    against the bytes received while streaming. At the end the byte count must
+    match the declared length and, for whole objects, the MD5 storage sent.
+    """
+
+    def __init__(
+        self,
+        opener: StreamOpener,
+        url: str,
+        response: httpx.Response,
+        max_bytes: int = 0,
+        max_resumes: int = 3,
+        verify_checksum: bool = True,
+    ):
+        self.opener = opener
+        self.url = url
+        self.headers = response.headers
+        self.http_version = response.http_version
+        self.max_bytes = max_bytes
+        self.max_resumes = max_resumes
+        self.received = 0
+        self.resumes = 0
+        self._response = response
+        self._stack: Optional[AsyncExitStack] = None
+        # Lengths refer to the bytes on the wire; a compressed body cannot be checked or resumed by offset.
+        self.encoded = response.headers.get("content-encoding", "identity").lower() not in ("", "identity")
+        self.validator = validator(response.headers)
+
+        content_length = response.headers.get("content-length")
+        if response.status_code == 206:
+            content_range = parse_content_range(response.headers.get("content-range"))
+            if content_range is None:
+                raise DownloadIntegrityError(f"Unparseable Content-Range from {url}: {response.headers.get('content-range')}")
+            self.start = content_range[0]
+            self.length: Optional[int] = content_range[1] - content_range[0] + 1
+            self.total = content_range[2]
+        else:
+            self.start = 0
+            self.length = int(content_length) if content_length and content_length.isdigit() and not self.encoded else None
+            self.total = self.length
+        accepts_ranges = response.status_code == 206 or response.headers.get("accept-ranges", "").lower() == "bytes"
+        self.resumable = accepts_ranges and self.validator is not None and not self.encoded
+
+        # Storage sends the whole object's MD5, so it applies to a 200 or to a 206 that happens to cover everything
+        whole_object = response.status_code == 200 or (self.start == 0 and self.total is not None and self.length == self.total)
+        md5 = expected_md5(response.headers) if verify_checksum and whole_object and not self.encoded else None
+        self._expected_md5 = md5
+        self._md5 = hashlib.md5() if md5 else None
+
+        declared = self.total if self.total is not None else (self.start + self.length if self.length is not None else None)
+        if self.max_bytes and declared is not None and declared > self.max_bytes:
+            raise DownloadTooLargeError(f"{url} is {declared} bytes, over the {self.max_bytes} byte download limit")
+
+    @property
+    def num_bytes_downloaded(self) -> int:
+        return self.received
+
+    async def aiter_bytes(self, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        response = self._response
+        while True:
+            error: Optional[Exception] = None
+            try:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    self.received += len(chunk)
+                    if self.max_bytes and self.start + self.received > self.max_bytes:
+                        raise DownloadTooLargeError(f"{self.url} exceeded the {self.max_bytes} byte download limit")
+                    if self._md5 is not None:
+                        self._md5.update(chunk)
+                    yield chunk
+            except httpx.TransportError as e:
+                error = e
+            else:
+                if self.length is None or self.received >= self.length:
+                    break
+            if not self.resumable or self.resumes >= self.max_resumes:
+                if error is not None:
+                    raise error
+                break  # short body; _verify reports it
+            self.resumes += 1
+            reason = (str(error) or type(error).__name__) if error is not None else "body ended early"
+            logger.warning(f"🔁 Download of {self.url} interrupted after {self.received} bytes ({reason}), resuming")
+            response = await self._reopen()
+        self._verify()
+
+    async def aread(self) -> bytes:
+        return b"".join([chunk async for chunk in self.aiter_bytes()])
+
+    async def _reopen(self) -> httpx.Response:
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = AsyncExitStack()
+        offset = self.start + self.received
+        last = str(self.start + self.length - 1) if self.length is not None else ""
+        # The interrupted response still holds the per-host slot, so the resume reuses it.
+        response = await self._stack.enter_async_context(
+            self.opener(self.url, headers={"Range": f"bytes={offset}-{last}", "If-Range": self.validator}, reuse_slot=True)
+        )
+        content_range = parse_content_range(response.headers.get("content-range"))
+        if response.status_code != 206 or content_range is None or content_range[0] != offset:
+            raise DownloadIntegrityError(f"{self.url} changed during download (resume answered {response.status_code})")
+        if validator(response.headers) != self.validator:
+            raise DownloadIntegrityError(f"{self.url} changed during download (validator differs)")
+        return response
+
+    def _verify(self):
+        if self.length is not None and self.received != self.length:
+            raise DownloadIntegrityError(f"Received {self.received} of {self.length} bytes from {self.url}")
+        if self._md5 is not None and base64.b64encode(self._md5.digest()).decode() != self._expected_md5:
+            raise DownloadIntegrityError(f"MD5 of {self.url} does not match the checksum storage sent")
+
+    async def aclose(self):
+        if self._stack is not None:
+            await self._stack.aclose()
+            self._stack = None
+
+
+def _md5_digest(data: bytes) -> bytes:
+    return hashlib.md5(data).digest()
+
+
+async def fetch_object(
+    opener: StreamOpener,
+    url: str,
+    part_bytes: int = 0,
+    concurrency: int = 4,
+    **body_options,
+) -> Download:
+    """Download a whole object, in parallel ``part_bytes`` ranges when it is larger than that.
+
+    The first request asks for the first part; a 206 reveals the object size and
+    the rest is fetched ``concurrency`` ranges at a time with ``If-Range`` pinned
+    to the first response's validator, so parts of two versions are never mixed.
+    Servers that ignore Range answer 200 and the object arrives in one response.
+    ``part_bytes`` 0 always downloads in one response. The assembled object is
+    checked against the MD5 storage sent, as a single response would be.
+    """
+    headers = {"Range": f"bytes=0-{part_bytes - 1}"} if part_bytes > 0 else None
+    async with opener(url, headers=headers) as response:
+        if response.status_code != 416:
+            response.raise_for_status()
+            first = ResumableBody(opener, url, response, **body_options)
+            try:
+                head = await first.aread()
+            finally:
+                await first.aclose()
+    if response.status_code == 416:
+        # Empty objects have no satisfiable range
+        return await fetch_object(opener, url, 0, concurrency, **body_options)
+    if response.status_code != 206 or first.total is None or first.total <= len(head):
+        return Download(head, first.headers, first.http_version, 1, first.resumes)
+
+    total = first.total
+    ranges = [(start, min(start + part_bytes, total) - 1) for start in range(len(head), total, part_bytes)]
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def fetch_range(first_byte: int, last_byte: int) -> tuple[bytes, int]:
+        range_headers = {"Range": f"bytes={first_byte}-{last_byte}"}
+        if first.validator:
+            range_headers["If-Range"] = first.validator
+        async with semaphore, opener(url, headers=range_headers) as range_response:
+            range_response.raise_for_status()
+            if range_response.status_code != 206 or validator(range_response.headers) != first.validator:
+                raise DownloadIntegrityError(f"{url} changed during download")
+            body = ResumableBody(opener, url, range_response, **body_options)
+            if body.start != first_byte or body.total != total:
+                raise DownloadIntegrityError(f"Range response for {url} does not match the request")
+            try:
+                return await body.aread(), body.resumes
+            finally:
+                await body.aclose()
+
+    tasks = [asyncio.ensure_future(fetch_range(first_byte, last_byte)) for first_byte, last_byte in ranges]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    content = b"".join([head, *(data for data, _ in results)])
+    if len(content) != total:
+        raise DownloadIntegrityError(f"Received {len(content)} of {total} bytes from {url}")
+    md5 = expected_md5(first.headers) if body_options.get("verify_checksum", True) and not first.encoded else None
+    if md5 is not None and base64.b64encode(await asyncio.to_thread(_md5_digest, content)).decode() != md5:
+        raise DownloadIntegrityError(f"MD5 of {url} does not match the checksum storage sent")
+    resumes = first.resumes + sum(part_resumes for _, part_resumes in results)
+    return Download(content, first.headers, first.http_version, len(ranges) + 1, resumes)
@@ -0,0 +1,51 @@
+"""
+Doctor Reception System - Production Server
+Runs the app under uvicorn with one worker process per CPU the container may use
+(WEB_CONCURRENCY overrides), so CPU-bound work in one request (JSON, base64,
+prompt building) does not stall the others. Each worker imports main, starts
+serving and warms up in the background; see startup.py. Concurrency budgets
+(Gemini rate, ffmpeg slots, image workers, memory cache) are split across the
+workers in main.py, and the summary job queue is shared through SQLite.
+
+Usage:
+    python serve.py
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+from startup import available_cpus
+from structured_logging import configure_logging, parse_sample_rates
+
+
+def main():
+    load_dotenv()
+    workers = max(int(os.getenv("WEB_CONCURRENCY") or available_cpus()), 1)
+    # Read by the workers to split their budgets
+    os.environ["SERVER_WORKERS"] = str(workers)
+    if workers > 1:
+        # An in-memory queue would strand jobs in the worker that accepted them
+        os.environ.setdefault("JOB_QUEUE_BACKEND", "sqlite")
+
+    log_level = os.getenv("LOG_LEVEL", "INFO")
+    configure_logging(log_level, os.getenv("LOG_FORMAT", "json"), parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "")))
+
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8080")),
+        workers=workers,
+        log_level=log_level.lower(),
+        log_config=None,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        # Cloud Run sends SIGTERM and allows 10 s before SIGKILL
+        timeout_graceful_shutdown=float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "8")),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Doctor Reception System - Startup
+Lazy stand-ins for heavy modules (the Gemini SDK, ffmpeg-python, PIL, NumPy), so
+a worker can import the app and answer /health before they are loaded; the CPU
+count the container is actually allowed to use, for sizing workers and pools;
+and import / cold-start timings. Only the standard library is imported here, so
+serve.py can use it before the app is loaded.
+"""
+
+import os
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterator, Optional
+
+_IMPORTED_AT = time.monotonic()
+_import_seconds: dict[str, float] = {}
+_steps: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+class LazyModule(ModuleType):
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        module = self._lazy_module
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(self.__name__)
+            with _lock:
+                _import_seconds.setdefault(self.__name__, round(time.perf_counter() - started, 4))
+            self._lazy_module = module
+        return module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name: str, lazy: bool = True) -> ModuleType:
+    """``name`` as a module imported on first use, or imported right away when ``lazy`` is False"""
+    module = LazyModule(name)
+    if not lazy:
+        module._load()
+    return module
+
+
+def load_modules(*modules: ModuleType):
+    """Import lazy modules now (startup warm-up); already loaded ones are skipped"""
+    for module in modules:
+        if isinstance(module, LazyModule):
+            module._load()
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: the cgroup CPU quota (what Cloud Run allocates), else the affinity mask"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2: "<quota> <period>" or "max <period>"
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as g:
+                limit, period = int(f.read()), int(g.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(int(quota + 0.5), 1))
+    return max(cpus, 1)
+
+
+def process_age() -> float:
+    """Seconds since this process started (from /proc where available, else since this module loaded)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks after boot; the command name may contain spaces.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+def record_step(name: str, seconds: float):
+    with _lock:
+        _steps[name] = round(seconds, 4)
+
+
+@contextmanager
+def timed_step(name: str) -> Iterator[None]:
+    """Record how long a startup step took (seconds) under ``name``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_step(name, time.perf_counter() - started)
+
+
+def startup_timings() -> dict:
+    with _lock:
+        return {**_steps, "module_imports": dict(_import_seconds)}
@@ -0,0 +1,203 @@
+"""
+Doctor Reception System - Structured Logging
+Log records are handed to a queue and formatted and written to stdout by a
+listener thread, so logging never blocks the event loop on I/O. Records carry the
+id of the request that produced them, can be rendered as one JSON object per line
+(which Cloud Logging parses into structured entries) and can be sampled per
+pipeline stage so chatty INFO lines stay affordable under load.
+"""
+
+import sys
+import json
+import uuid
+import zlib
+import atexit
+import queue
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+from typing import Optional, TextIO
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+# Loggers uvicorn configures with its own stream handlers
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.access")
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "taskName"}
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def set_request_id(request_id: Optional[str]) -> Token:
+    """Tag log records from the current context (and tasks it spawns) with ``request_id``"""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token: Token):
+    _request_id.reset(token)
+
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """``"download=0.1,httpx=0"`` -> {"download": 0.1, "httpx": 0.0}; malformed entries are ignored"""
+    rates = {}
+    for item in value.split(","):
+        stage, _, rate = item.partition("=")
+        try:
+            rates[stage.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request id and drops sampled-out ones.
+
+    Records logged with ``extra={"stage": ...}`` below WARNING are kept at that
+    stage's rate in ``sample_rates`` (default ``default_rate``); other records
+    are kept at the rate listed for their logger name, if any. The decision is a
+    hash of request id and stage, so a sampled request keeps all its lines for the
+    stage rather than a random subset. Warnings and errors are always kept.
+    """
+
+    def __init__(self, sample_rates: Optional[dict[str, float]] = None, default_rate: float = 1.0):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.default_rate = default_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = _request_id.get()
+        record.request_id = request_id or "-"
+        if record.levelno >= logging.WARNING:
+            return True
+        stage = getattr(record, "stage", None)
+        if stage is None:
+            # Untagged records (e.g. httpx's per-request lines) can be sampled by logger name
+            stage = record.name
+            rate = self.sample_rates.get(stage, 1.0)
+        else:
+            rate = self.sample_rates.get(stage, self.default_rate)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        if request_id is None:
+            return random.random() < rate
+        return zlib.crc32(f"{request_id}:{stage}".encode()) / 2**32 < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the field names Cloud Logging recognises"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", "-")
+        if request_id != "-":
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats every record before enqueueing it, which is most of
+    the cost of a log call. Only the message arguments are resolved here, since
+    they may be mutated after the call returns; tracebacks and the JSON/text
+    rendering happen on the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _Listener(logging.handlers.QueueListener):
+    def stop(self):
+        # Safe to call twice (at shutdown and again at exit)
+        if self._thread is not None:
+            super().stop()
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    sample_rates: Optional[dict[str, float]] = None,
+    default_rate: float = 1.0,
+    stream: TextIO = sys.stdout,
+) -> logging.handlers.QueueListener:
+    """Route the root and uvicorn loggers through a queue to ``stream``.
+
+    ``fmt`` is "json" or "text". Returns the started listener; it is stopped (and
+    the queue flushed) at interpreter exit.
+    """
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(sample_rates, default_rate))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = [queue_handler]
+        uvicorn_logger.propagate = False
+
+    listener = _Listener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class RequestIdMiddleware:
+    """ASGI middleware that gives each HTTP request an id for log correlation.
+
+    Uses the caller's ``X-Request-ID``, else the trace id from Cloud Run's
+    ``X-Cloud-Trace-Context``, else a new uuid, and echoes it back in the
+    ``X-Request-ID`` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1").strip()[:128]
+        if not request_id:
+            request_id = headers.get(b"x-cloud-trace-context", b"").decode("latin-1").split("/", 1)[0].strip()[:128]
+        request_id = request_id or uuid.uuid4().hex
+        header = (b"x-request-id", request_id.encode("latin-1"))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), header]
+            await send(message)
+
+        token = set_request_id(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            reset_request_id(token)
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python-backend'))
+
+from gemini_calls import GeminiCaller, GeminiUnavailableError
+from rate_limit import AdaptiveTokenBucket
+
+# Test GeminiCaller.stream against a stalling stream: the per-attempt timeout must
+# cut the wait for a chunk short so the attempt is retried or falls back
+
+
+def make_caller(models, max_attempts, attempt_timeout=0.2, deadline=10):
+    limiter = AdaptiveTokenBucket(rate_per_minute=0, burst=1)
+    return GeminiCaller(models, limiter, max_attempts, base_delay=0, max_delay=0, deadline=deadline, attempt_timeout=attempt_timeout)
+
+
+def stalling_stream(stalled_attempts, stall_after_chunks=0):
+    """open_stream fake that stops sending after ``stall_after_chunks`` on its first ``stalled_attempts`` calls"""
+    calls = []
+
+    async def open_stream(client, contents, model, config):
+        calls.append(model)
+        for index in range(3):
+            if len(calls) <= stalled_attempts and index == stall_after_chunks:
+                await asyncio.sleep(3600)
+            yield f'chunk {index} from {model}'
+
+    return open_stream, calls
+
+
+async def collect(caller, open_stream):
+    return [chunk async for chunk in caller.stream(None, 'prompt', open_stream)]
+
+
+def test_stalled_first_chunk_is_retried():
+    caller = make_caller(['primary', 'fallback'], max_attempts=2)
+    open_stream, calls = stalling_stream(stalled_attempts=1)
+    started = time.monotonic()
+    chunks = asyncio.run(collect(caller, open_stream))
+    assert time.monotonic() - started < 2, 'stalled attempt was not timed out'
+    assert calls == ['primary', 'primary']
+    assert [model for model, _ in chunks] == ['primary'] * 3
+    assert caller.stats()['retries'] == 1
+
+
+def test_stalled_model_falls_back():
+    caller = make_caller(['primary', 'fallback'], max_attempts=1)
+    open_stream, calls = stalling_stream(stalled_attempts=1)
+    chunks = asyncio.run(collect(caller, open_stream))
+    assert calls == ['primary', 'fallback']
+    assert [model for model, _ in chunks] == ['fallback'] * 3
+    assert caller.stats()['fallbacks'] == 1
+
+
+def test_every_attempt_stalled_gives_up():
+    caller = make_caller(['primary', 'fallback'], max_attempts=2)
+    open_stream, calls = stalling_stream(stalled_attempts=4)
+    try:
+        asyncio.run(collect(caller, open_stream))
+    except GeminiUnavailableError:
+        pass
+    else:
+        raise AssertionError('expected GeminiUnavailableError')
+    assert calls == ['primary', 'primary', 'fallback', 'fallback']
+
+
+def test_stall_after_output_is_raised():
+    caller = make_caller(['primary', 'fallback'], max_attempts=2)
+    open_stream, calls = stalling_stream(stalled_attempts=1, stall_after_chunks=1)
+    received = []
+
+    async def run():
+        async for chunk in caller.stream(None, 'prompt', open_stream):
+            received.append(chunk)
+
+    started = time.monotonic()
+    try:
+        asyncio.run(run())
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError('expected TimeoutError')
+    assert time.monotonic() - started < 2, 'stalled gap between chunks was not timed out'
+    # Text already reached the caller, so the stream is not replayed
+    assert calls == ['primary']
+    assert received == [('primary', 'chunk 0 from primary')]
+
+
+if __name__ == '__main__':
+    test_stalled_first_chunk_is_retried()
+    test_stalled_model_falls_back()
+    test_every_attempt_stalled_gives_up()
+    test_stall_after_output_is_raised()
+    print('All stream timeout tests passed')